@@ -0,0 +1,117 @@
+"""
+Cache of the verified API keys.
+
+Verifying an API key takes a DB lookup and a deliberately slow hash of the key, and the account and user
+of the key are loaded with 2 more queries. Once a key is verified, the API key (with its permissions and
+rate limit), the account and the user are stored in the django cache (redis) for API_KEY_CACHE_TTL seconds.
+
+The entries are stored under the prefix of the key (its public part), along with a fast digest (sha256)
+of the full key: a key is only authenticated from the cache if its digest matches. Keying the entries by
+prefix allows deleting them when the API key is edited or deleted, without knowing the key.
+"""
+
+import hashlib
+import hmac
+from typing import NamedTuple, Optional
+
+import api_logging as logging
+from account.models import Account, AccountAPIKey
+from django.conf import settings
+from django.contrib.auth.models import AbstractBaseUser
+from django.core.cache import cache
+
+log = logging.getLogger(__name__)
+
+
+class VerifiedApiKey(NamedTuple):
+    digest: str
+    api_key: AccountAPIKey
+    account: Account
+    user: AbstractBaseUser
+
+
+def get_api_key_digest(key: str) -> str:
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+def get_api_key_cache_key(prefix: str) -> str:
+    return f"verified_api_key:{prefix}"
+
+
+def _get_prefix(key: str) -> str:
+    prefix, _, _ = key.partition(".")
+    return prefix
+
+
+def _match(entry: Optional[VerifiedApiKey], key: str) -> Optional[VerifiedApiKey]:
+    if entry and hmac.compare_digest(entry.digest, get_api_key_digest(key)):
+        return entry
+    return None
+
+
+def get_verified_api_key(key: str) -> Optional[VerifiedApiKey]:
+    """
+    Return the cached verification of `key`, or None if the key needs to be verified
+    """
+    if not settings.API_KEY_CACHE_TTL:
+        return None
+
+    try:
+        entry = cache.get(get_api_key_cache_key(_get_prefix(key)))
+    except Exception:
+        log.warning("Failed to read the verified API key from cache", exc_info=True)
+        return None
+
+    return _match(entry, key)
+
+
+async def aget_verified_api_key(key: str) -> Optional[VerifiedApiKey]:
+    if not settings.API_KEY_CACHE_TTL:
+        return None
+
+    try:
+        entry = await cache.aget(get_api_key_cache_key(_get_prefix(key)))
+    except Exception:
+        log.warning("Failed to read the verified API key from cache", exc_info=True)
+        return None
+
+    return _match(entry, key)
+
+
+def set_verified_api_key(
+    key: str, api_key: AccountAPIKey, account: Account, user: AbstractBaseUser
+):
+    if not settings.API_KEY_CACHE_TTL:
+        return
+
+    try:
+        cache.set(
+            get_api_key_cache_key(api_key.prefix),
+            VerifiedApiKey(get_api_key_digest(key), api_key, account, user),
+            settings.API_KEY_CACHE_TTL,
+        )
+    except Exception:
+        log.warning("Failed to store the verified API key in cache", exc_info=True)
+
+
+async def aset_verified_api_key(
+    key: str, api_key: AccountAPIKey, account: Account, user: AbstractBaseUser
+):
+    if not settings.API_KEY_CACHE_TTL:
+        return
+
+    try:
+        await cache.aset(
+            get_api_key_cache_key(api_key.prefix),
+            VerifiedApiKey(get_api_key_digest(key), api_key, account, user),
+            settings.API_KEY_CACHE_TTL,
+        )
+    except Exception:
+        log.warning("Failed to store the verified API key in cache", exc_info=True)
+
+
+def invalidate_verified_api_key(prefix: str):
+    try:
+        cache.delete(get_api_key_cache_key(prefix))
+    except Exception:
+        log.error("Failed to delete the verified API key from cache", exc_info=True)
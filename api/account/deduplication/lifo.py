@@ -1,115 +1,54 @@
 import copy
-from typing import Tuple
+from datetime import datetime
+from typing import Dict, Set, Tuple
 
 import api_logging as logging
 from account.models import Community
-from django.conf import settings
-from django.db import IntegrityError
-from registry.models import Event, HashScorerLink, Stamp
+from asgiref.sync import sync_to_async
+from django.db import connection
+from registry.models import Event, HashScorerLink
 from registry.utils import get_utc_time
 
 log = logging.getLogger(__name__)
 
 
-class HashScorerLinkIntegrityError(Exception):
-    def __init__(self, message):
-        self.message = message or "Issue saving hash scorer links"
-        super().__init__(self.message)
+CLAIM_HASHES_SQL = """
+INSERT INTO {table} (hash, community_id, address, expires_at)
+VALUES {values}
+ON CONFLICT (hash, community_id) DO UPDATE
+SET address = EXCLUDED.address, expires_at = EXCLUDED.expires_at
+WHERE {table}.address = EXCLUDED.address OR {table}.expires_at <= %s
+RETURNING hash
+"""
 
 
 async def alifo(
     community: Community, lifo_passport: dict, address: str
-) -> Tuple[dict, list | None]:
-    tries_remaining = 5
-    while True:
-        try:
-            return await arun_lifo_dedup(community, lifo_passport, address)
-        except HashScorerLinkIntegrityError:
-            tries_remaining -= 1
-            # If we get integrity errors from trying to create
-            # unique hash links, then we had 2 competing requests
-            # and the other one won, so we'll just try again
-            # and there should be additional deduplication
-            if tries_remaining <= 0:
-                raise
-
-
-async def arun_lifo_dedup(
-    community: Community, lifo_passport: dict, address: str
 ) -> Tuple[dict, list | None]:
     deduped_passport = copy.deepcopy(lifo_passport)
     deduped_passport["stamps"] = []
 
-    now = get_utc_time()
     if "stamps" in lifo_passport:
-        stamp_hashes = [
-            stamp["credential"]["credentialSubject"]["hash"]
+        # The expiration date of each hash, if a hash is duplicated in the passport
+        # the last stamp determines the expiration date
+        hash_expirations = {
+            stamp["credential"]["credentialSubject"]["hash"]: stamp["credential"][
+                "expirationDate"
+            ]
             for stamp in lifo_passport["stamps"]
-        ]
+        }
 
-        existing_hash_links = HashScorerLink.objects.filter(
-            hash__in=stamp_hashes, community=community
+        claimed_hashes = await aclaim_hashes(
+            community, address, hash_expirations, get_utc_time()
         )
 
-        this_users_hash_links, clashing_hashes, forfeited_hash_links = [], [], []
-        async for hash_link in existing_hash_links:
-            if hash_link.address == address:
-                # Already claimed by this user,
-                this_users_hash_links.append(hash_link)
-            elif hash_link.expires_at > now:
-                # Already claimed by another user,
-                clashing_hashes.append(hash_link.hash)
-            else:
-                # Already claimed by another user, but
-                # it's expired so we'll give it to this user
-                forfeited_hash_links.append(hash_link)
-
-        hash_links_to_create = []
-        hash_links_to_update = []
         clashing_stamps = []
-
         for stamp in lifo_passport["stamps"]:
-            hash = stamp["credential"]["credentialSubject"]["hash"]
-            expires_at = stamp["credential"]["expirationDate"]
-
-            if hash not in clashing_hashes:
+            if stamp["credential"]["credentialSubject"]["hash"] in claimed_hashes:
                 deduped_passport["stamps"].append(copy.deepcopy(stamp))
-
-                done = False
-
-                for hash_link in this_users_hash_links:
-                    if hash_link.hash == hash:
-                        done = True
-                        if hash_link.expires_at != expires_at:
-                            hash_link.expires_at = expires_at
-                            hash_links_to_update.append(hash_link)
-                        break
-
-                if not done:
-                    for hash_link in forfeited_hash_links:
-                        if hash_link.hash == hash:
-                            done = True
-                            hash_link.address = address
-                            hash_link.expires_at = expires_at
-                            hash_links_to_update.append(hash_link)
-                            break
-
-                if not done:
-                    hash_links_to_create.append(
-                        HashScorerLink(
-                            hash=hash,
-                            address=address,
-                            community=community,
-                            expires_at=stamp["credential"]["expirationDate"],
-                        )
-                    )
             else:
                 clashing_stamps.append(stamp)
 
-        await save_hash_links(
-            hash_links_to_create, hash_links_to_update, address, community
-        )
-
         if clashing_stamps:
             await Event.objects.abulk_create(
                 [
@@ -132,33 +71,45 @@ async def arun_lifo_dedup(
     return (deduped_passport, None)
 
 
-async def save_hash_links(
-    hash_links_to_create: list[HashScorerLink],
-    hash_links_to_update: list[HashScorerLink],
-    address: str,
+def claim_hashes(
     community: Community,
-):
-    if hash_links_to_create or hash_links_to_update:
-        try:
-            # Could have IntegrityError if there are conflicting requests
-            # running concurrently
-            if hash_links_to_create:
-                await HashScorerLink.objects.abulk_create(hash_links_to_create)
-
-            if hash_links_to_update:
-                await HashScorerLink.objects.abulk_update(
-                    hash_links_to_update, fields=["expires_at", "address"]
-                )
-        except IntegrityError:
-            raise HashScorerLinkIntegrityError("Failed to save HashScorerLinks")
-
-        # After updating, double check that there was not a conflicting
-        # request that tried to update the same object
-        updated_hashes = [hash_link.hash for hash_link in hash_links_to_update]
-        created_hashes = [hash_link.hash for hash_link in hash_links_to_create]
-        if await HashScorerLink.objects.filter(
-            address=address,
-            community=community,
-            hash__in=(updated_hashes + created_hashes),
-        ).acount() != len(hash_links_to_update) + len(hash_links_to_create):
-            raise HashScorerLinkIntegrityError("Unexpected number of HashScorerLinks")
+    address: str,
+    hash_expirations: Dict[str, str | datetime],
+    now: datetime,
+) -> Set[str]:
+    """
+    Claim the hashes for `address` in the community, in a single atomic upsert of the HashScorerLinks.
+    A hash is claimed if it is free, if it is already owned by this address (its expiration date
+    is updated) or if the link of the other owner has expired.
+    Concurrent claims for the same hash are serialized by the unique (hash, community) constraint.
+    The rows are locked in the order of the hashes, so that concurrent claims of overlapping hashes
+    cannot deadlock.
+
+    Returns the hashes that have been claimed, the other hashes are owned by other addresses.
+    """
+    if not hash_expirations:
+        return set()
+
+    ops = connection.ops
+    # Prepare the address as the ORM does (EthAddressField stores the addresses in lowercase),
+    # otherwise the links of a mixed-case address would not be found to be owned by it
+    address = HashScorerLink._meta.get_field("address").get_prep_value(address)
+    params = []
+    for hash, expires_at in sorted(hash_expirations.items()):
+        if isinstance(expires_at, str):
+            expires_at = datetime.fromisoformat(expires_at)
+        params.extend(
+            [hash, community.pk, address, ops.adapt_datetimefield_value(expires_at)]
+        )
+    params.append(ops.adapt_datetimefield_value(now))
+
+    sql = CLAIM_HASHES_SQL.format(
+        table=ops.quote_name(HashScorerLink._meta.db_table),
+        values=", ".join(["(%s, %s, %s, %s)"] * len(hash_expirations)),
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return {row[0] for row in cursor.fetchall()}
+
+
+aclaim_hashes = sync_to_async(claim_hashes)
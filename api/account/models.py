@@ -7,7 +7,9 @@ from typing import Optional, Type
 
 import api_logging as logging
 from django.conf import settings
-from django.db import models
+from django.db import models, transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 from rest_framework_api_key.models import AbstractAPIKey
 from scorer_weighted.models import BinaryWeightedScorer, Scorer, WeightedScorer
 
@@ -145,6 +147,16 @@ class AccountAPIKey(AbstractAPIKey):
         return str(RateLimits(self.rate_limit))
 
 
+@receiver(post_save, sender=AccountAPIKey)
+@receiver(post_delete, sender=AccountAPIKey)
+def api_key_updated(sender, instance, **kwargs):
+    from .api_key_cache import invalidate_verified_api_key
+
+    # The permissions, rate limit or revocation of the key may have changed. Invalidate once
+    # the change is committed, otherwise a concurrent request could cache the previous row again
+    transaction.on_commit(lambda: invalidate_verified_api_key(instance.prefix))
+
+
 class AccountAPIKeyAnalytics(models.Model):
     api_key = models.ForeignKey(
         AccountAPIKey, on_delete=models.CASCADE, related_name="analytics"
@@ -268,3 +280,28 @@ class Community(models.Model):
             return await WeightedScorer.objects.aget(scorer_ptr_id=scorer.id)
         elif scorer.type == Scorer.Type.WEIGHTED_BINARY:
             return await BinaryWeightedScorer.objects.aget(scorer_ptr_id=scorer.id)
+
+
+@receiver(post_save, sender=Community)
+def community_updated(sender, instance, **kwargs):
+    from .scorer_cache import invalidate_compiled_scorers
+
+    # Invalidate once the change is visible to the other processes, which would
+    # otherwise cache the old rows under the new version
+    transaction.on_commit(lambda: invalidate_compiled_scorers([instance.pk]))
+
+
+@receiver(post_save, sender=Scorer)
+@receiver(post_save, sender=WeightedScorer)
+@receiver(post_save, sender=BinaryWeightedScorer)
+def scorer_updated(sender, instance, created, **kwargs):
+    from .scorer_cache import invalidate_compiled_scorers
+
+    if created:
+        # A new scorer is not yet used by any community
+        return
+
+    community_ids = list(
+        Community.objects.filter(scorer_id=instance.pk).values_list("id", flat=True)
+    )
+    transaction.on_commit(lambda: invalidate_compiled_scorers(community_ids))
@@ -0,0 +1,144 @@
+"""
+Process-local cache of "compiled" scorers.
+
+A compiled scorer bundles the community, its concrete scorer and the scorer weights parsed to Decimal.
+Entries are validated against a version stamp that is stored in the django cache (redis) for every
+community, so that a change to a community or its scorer done by any process invalidates the entries
+in all processes.
+"""
+
+import time
+import uuid
+from decimal import Decimal
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+import api_logging as logging
+from django.conf import settings
+from django.core.cache import cache
+from scorer_weighted.models import ScoreData, Scorer
+
+log = logging.getLogger(__name__)
+
+# Compiled scorers, keyed by (account_id, scorer_id), where scorer_id is the
+# id or external id used in the API request
+_compiled_scorers: Dict[Tuple[int, str], "CompiledScorer"] = {}
+
+
+class CompiledScorer:
+    def __init__(self, community, scorer: Scorer, version: Optional[str]):
+        self.community = community
+        self.scorer = scorer
+        self.version = version
+        self.weights: Dict[str, Decimal] = {
+            provider: Decimal(weight)
+            for provider, weight in (scorer.weights or {}).items()
+        }
+        self.compiled_at = time.monotonic()
+
+    def compute_score(self, providers: List[str]) -> ScoreData:
+        return self.scorer.compute_score_for_providers(providers, weights=self.weights)
+
+    def __repr__(self):
+        return f"CompiledScorer(community_id={self.community.pk}, scorer={self.scorer}, version={self.version})"
+
+
+def get_scorer_version_key(community_id: int) -> str:
+    return f"scorer_version:{community_id}"
+
+
+async def aget_scorer_version(community_id: int) -> str:
+    """
+    Return the version stamp of the community, creating it if it is missing
+    """
+    version_key = get_scorer_version_key(community_id)
+    version = await cache.aget(version_key)
+    if version is None:
+        # Concurrent processes agree on the first version that is added
+        await cache.aadd(version_key, uuid.uuid4().hex, timeout=None)
+        version = await cache.aget(version_key)
+    return version
+
+
+async def acompile_scorer(community, version: Optional[str] = None) -> CompiledScorer:
+    scorer = await community.aget_scorer()
+    return CompiledScorer(community, scorer, version)
+
+
+async def aget_compiled_scorer(
+    scorer_id: int | str,
+    account,
+    aload_community: Callable[..., Awaitable],
+) -> CompiledScorer:
+    """
+    Return the compiled scorer for the `scorer_id` (id or external id of the community) of `account`.
+    `aload_community(scorer_id, account)` is used to load the community from the DB on a cache miss.
+    If the version stamps cannot be read from the django cache, the compiled scorer is not cached.
+    """
+    key = (account.pk, str(scorer_id))
+    compiled_scorer = _compiled_scorers.get(key)
+
+    if (
+        compiled_scorer
+        and time.monotonic() - compiled_scorer.compiled_at
+        < settings.COMPILED_SCORER_CACHE_TTL
+    ):
+        try:
+            version = await cache.aget(
+                get_scorer_version_key(compiled_scorer.community.pk)
+            )
+            # A missing version (e.g. evicted from redis) is not a hit: the scorer
+            # may have been invalidated since
+            if version is not None and version == compiled_scorer.version:
+                return compiled_scorer
+        except Exception:
+            log.warning("Failed to read the scorer version from cache", exc_info=True)
+
+    community = await aload_community(scorer_id, account)
+
+    cacheable = settings.COMPILED_SCORER_CACHE_TTL > 0
+    version = None
+    if cacheable:
+        try:
+            # Read the version before loading the scorer, so that a concurrent
+            # update will invalidate what we are about to load
+            version = await aget_scorer_version(community.pk)
+        except Exception:
+            log.warning("Failed to read the scorer version from cache", exc_info=True)
+            cacheable = False
+
+    compiled_scorer = await acompile_scorer(community, version)
+
+    if cacheable:
+        _compiled_scorers[key] = compiled_scorer
+    else:
+        _compiled_scorers.pop(key, None)
+
+    return compiled_scorer
+
+
+def invalidate_compiled_scorers(community_ids: Iterable[int]):
+    """
+    Invalidate the compiled scorers of the communities, in this and in all other processes
+    """
+    community_ids = set(community_ids)
+    if not community_ids:
+        return
+
+    for key, compiled_scorer in list(_compiled_scorers.items()):
+        if compiled_scorer.community.pk in community_ids:
+            _compiled_scorers.pop(key, None)
+
+    try:
+        cache.set_many(
+            {
+                get_scorer_version_key(community_id): uuid.uuid4().hex
+                for community_id in community_ids
+            },
+            timeout=None,
+        )
+    except Exception:
+        log.error("Failed to update the scorer versions in cache", exc_info=True)
+
+
+def clear_compiled_scorers():
+    _compiled_scorers.clear()
@@ -1,6 +1,7 @@
 # pylint: disable=unused-import
 from scorer.test.conftest import (
     access_token,
+    api_analytics_in_request,
     scorer_account,
     scorer_community,
     scorer_user,
@@ -0,0 +1,139 @@
+from datetime import timedelta
+from unittest.mock import patch
+
+import pytest
+from account.api_key_cache import get_api_key_cache_key, get_verified_api_key
+from account.models import AccountAPIKey
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.test import RequestFactory
+from django.utils import timezone
+from registry.api.utils import ApiKey, aapi_key
+from registry.exceptions import Unauthorized
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def api_key_cache(settings):
+    settings.CACHES = {
+        "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+    }
+    settings.API_KEY_CACHE_TTL = 60
+    # The local memory caches are shared within the process
+    cache.clear()
+
+
+@pytest.fixture
+def api_key(scorer_account):
+    return AccountAPIKey.objects.create_key(
+        account=scorer_account, name="Token", rate_limit="3/30seconds"
+    )
+
+
+def authenticate(key):
+    request = RequestFactory().get("/", HTTP_X_API_KEY=key)
+    account = ApiKey().authenticate(request, key)
+    return request, account
+
+
+def aauthenticate(key):
+    request = RequestFactory().get("/", HTTP_X_API_KEY=key)
+    account = async_to_sync(aapi_key)(request)
+    return request, account
+
+
+class TestApiKeyCache:
+    @pytest.mark.parametrize("authenticate_key", [authenticate, aauthenticate])
+    def test_verified_key_is_cached(
+        self,
+        api_key_cache,
+        api_key,
+        scorer_account,
+        authenticate_key,
+        django_assert_num_queries,
+    ):
+        model, key = api_key
+        authenticate_key(key)
+
+        with patch.object(
+            AccountAPIKey, "is_valid", side_effect=AssertionError
+        ), django_assert_num_queries(0):
+            request, account = authenticate_key(key)
+
+        assert account == scorer_account
+        assert request.user == scorer_account.user
+        assert request.api_key.id == model.id
+        assert request.api_key.rate_limit == "3/30seconds"
+        assert request.api_key.read_scores
+
+    @pytest.mark.parametrize("authenticate_key", [authenticate, aauthenticate])
+    def test_wrong_secret_is_not_authenticated_from_cache(
+        self, api_key_cache, api_key, authenticate_key
+    ):
+        _, key = api_key
+        authenticate_key(key)
+
+        with pytest.raises(Unauthorized):
+            authenticate_key(key[:-1] + ("a" if key[-1] != "a" else "b"))
+
+    @pytest.mark.parametrize("authenticate_key", [authenticate, aauthenticate])
+    def test_revoked_key_is_invalidated(
+        self,
+        api_key_cache,
+        api_key,
+        authenticate_key,
+        django_capture_on_commit_callbacks,
+    ):
+        model, key = api_key
+        authenticate_key(key)
+
+        with django_capture_on_commit_callbacks(execute=True):
+            model.revoked = True
+            model.save()
+
+            # Concurrent requests still read the key until the revocation is committed
+            authenticate_key(key)
+
+        with pytest.raises(Unauthorized):
+            authenticate_key(key)
+
+    def test_edited_key_is_invalidated(
+        self, api_key_cache, api_key, django_capture_on_commit_callbacks
+    ):
+        model, key = api_key
+        authenticate(key)
+
+        with django_capture_on_commit_callbacks(execute=True):
+            model.read_scores = False
+            model.save()
+
+        request, _ = authenticate(key)
+        assert not request.api_key.read_scores
+
+    def test_deleted_key_is_invalidated(
+        self, api_key_cache, api_key, django_capture_on_commit_callbacks
+    ):
+        model, key = api_key
+        authenticate(key)
+
+        with django_capture_on_commit_callbacks(execute=True):
+            model.delete()
+
+        with pytest.raises(Unauthorized):
+            authenticate(key)
+
+    @pytest.mark.parametrize("authenticate_key", [authenticate, aauthenticate])
+    def test_expired_key_is_rejected_from_cache(
+        self, api_key_cache, api_key, authenticate_key
+    ):
+        model, key = api_key
+        authenticate_key(key)
+
+        # The key expires while it is cached
+        cached_key = get_verified_api_key(key)
+        cached_key.api_key.expiry_date = timezone.now() - timedelta(seconds=1)
+        cache.set(get_api_key_cache_key(model.prefix), cached_key)
+
+        with pytest.raises(Unauthorized):
+            authenticate_key(key)
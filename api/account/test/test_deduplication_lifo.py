@@ -1,14 +1,16 @@
-from unittest import mock
+from datetime import datetime, timezone
 
 from account.deduplication import Rules
-from account.deduplication.lifo import HashScorerLinkIntegrityError, alifo
+from account.deduplication.lifo import alifo
 from account.models import Account, Community
 from asgiref.sync import async_to_sync
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.db import connection
 from django.test import TransactionTestCase
+from django.test.utils import CaptureQueriesContext
 from ninja_jwt.schema import RefreshToken
-from registry.models import HashScorerLink, Passport, Stamp
+from registry.models import Event, HashScorerLink, Passport, Stamp
 from scorer_weighted.models import Scorer, WeightedScorer
 
 User = get_user_model()
@@ -165,34 +167,125 @@ class LifoDeduplicationTestCase(TransactionTestCase):
         # no stamps
         self.assertEqual(len(deduped_passport["stamps"]), 0)
 
-    def test_retry_on_clash(self):
+    def test_duplicate_hashes_are_claimed_once(self):
         """
-        This tests functionality that causes the deduplication method to retry
-        when there is a collision with another deduplication happening at the
-        same time. It's not possible to test this directly, so instead we're
-        sending in a payload with two stamps with the same credential, which
-        wouldn't make it past the previous validation step in the real flow.
+        Two stamps with the same hash in the passport (which wouldn't make it past the
+        previous validation step in the real flow) are claimed with a single link.
         """
-
         passport = Passport.objects.create(
             address="0xaddress_1", community=self.community1
         )
 
-        call_count = 0
-
-        def increment_call_count(*args, **kwargs):
-            nonlocal call_count
-            call_count += 1
-            return HashScorerLink.objects.none()
-
-        with mock.patch(
-            "account.deduplication.lifo.HashScorerLink.objects.filter",
-            side_effect=increment_call_count,
-        ):
-            with self.assertRaises(HashScorerLinkIntegrityError):
-                async_to_sync(alifo)(
-                    passport.community,
-                    {"stamps": [credential, credential]},
-                    passport.address,
-                )
-        self.assertEqual(call_count, 5)
+        deduped_passport, _ = async_to_sync(alifo)(
+            passport.community,
+            {"stamps": [credential, credential]},
+            passport.address,
+        )
+
+        self.assertEqual(len(deduped_passport["stamps"]), 2)
+        link = HashScorerLink.objects.get(hash="test_hash", community=self.community1)
+        self.assertEqual(link.address, passport.address)
+
+    def test_claim_updates_expiration_of_own_hash(self):
+        HashScorerLink.objects.create(
+            hash="test_hash",
+            address="0xaddress_1",
+            community=self.community1,
+            expires_at=datetime(2098, 1, 1, tzinfo=timezone.utc),
+        )
+
+        deduped_passport, _ = async_to_sync(alifo)(
+            self.community1, {"stamps": [credential]}, "0xaddress_1"
+        )
+
+        self.assertEqual(len(deduped_passport["stamps"]), 1)
+        link = HashScorerLink.objects.get(hash="test_hash", community=self.community1)
+        self.assertEqual(
+            link.expires_at,
+            datetime(2099, 2, 21, 15, 30, 51, 720000, tzinfo=timezone.utc),
+        )
+
+    def test_own_hash_is_claimed_by_mixed_case_address(self):
+        HashScorerLink.objects.create(
+            hash="test_hash",
+            address="0xAddress_1",
+            community=self.community1,
+            expires_at=datetime(2098, 1, 1, tzinfo=timezone.utc),
+        )
+
+        deduped_passport, _ = async_to_sync(alifo)(
+            self.community1, {"stamps": [credential]}, "0xAddress_1"
+        )
+
+        self.assertEqual(len(deduped_passport["stamps"]), 1)
+        link = HashScorerLink.objects.get(hash="test_hash", community=self.community1)
+        self.assertEqual(link.address, "0xaddress_1")
+
+    def test_hashes_are_claimed_in_order(self):
+        """
+        The rows are locked in the same order by concurrent claims of overlapping hashes
+        """
+        stamps = [
+            {
+                "credential": {
+                    "credentialSubject": {"hash": hash, "provider": "test_provider"},
+                    "expirationDate": "2099-02-21T15:30:51.720Z",
+                },
+            }
+            for hash in ["hash_c", "hash_a", "hash_b"]
+        ]
+
+        with CaptureQueriesContext(connection) as queries:
+            async_to_sync(alifo)(self.community1, {"stamps": stamps}, "0xaddress_1")
+
+        (upsert,) = [
+            q["sql"] for q in queries.captured_queries if "ON CONFLICT" in q["sql"]
+        ]
+        self.assertLess(upsert.index("hash_a"), upsert.index("hash_b"))
+        self.assertLess(upsert.index("hash_b"), upsert.index("hash_c"))
+
+    def test_expired_hash_is_claimed_from_other_address(self):
+        HashScorerLink.objects.create(
+            hash="test_hash",
+            address="0xaddress_2",
+            community=self.community1,
+            expires_at=datetime(2020, 1, 1, tzinfo=timezone.utc),
+        )
+
+        deduped_passport, _ = async_to_sync(alifo)(
+            self.community1, {"stamps": [credential]}, "0xaddress_1"
+        )
+
+        self.assertEqual(len(deduped_passport["stamps"]), 1)
+        link = HashScorerLink.objects.get(hash="test_hash", community=self.community1)
+        self.assertEqual(link.address, "0xaddress_1")
+
+    def test_hash_of_other_address_is_not_claimed(self):
+        HashScorerLink.objects.create(
+            hash="test_hash",
+            address="0xaddress_2",
+            community=self.community1,
+            expires_at=datetime(2099, 1, 1, tzinfo=timezone.utc),
+        )
+
+        with CaptureQueriesContext(connection) as queries:
+            deduped_passport, _ = async_to_sync(alifo)(
+                self.community1, {"stamps": [credential]}, "0xaddress_1"
+            )
+
+        self.assertEqual(len(deduped_passport["stamps"]), 0)
+        link = HashScorerLink.objects.get(hash="test_hash", community=self.community1)
+        self.assertEqual(link.address, "0xaddress_2")
+        self.assertEqual(
+            Event.objects.filter(
+                action=Event.Action.LIFO_DEDUPLICATION, address="0xaddress_1"
+            ).count(),
+            1,
+        )
+        # 1 upsert of the links and 1 insert of the deduplication events
+        statements = [
+            q["sql"]
+            for q in queries.captured_queries
+            if q["sql"] not in ("BEGIN", "COMMIT")
+        ]
+        self.assertEqual(len(statements), 2)
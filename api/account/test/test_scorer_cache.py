@@ -0,0 +1,144 @@
+from unittest.mock import AsyncMock
+
+import pytest
+from account.models import Community
+from account.scorer_cache import (
+    aget_compiled_scorer,
+    clear_compiled_scorers,
+    invalidate_compiled_scorers,
+)
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.core.management import call_command
+from scorer_weighted.models import WeightedScorer
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture(autouse=True)
+def clear_caches(settings):
+    settings.CACHES = {
+        "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+    }
+    settings.COMPILED_SCORER_CACHE_TTL = 300
+    cache.clear()
+    clear_compiled_scorers()
+    yield
+    clear_compiled_scorers()
+
+
+@pytest.fixture
+def aload_community():
+    async def aload(scorer_id, account):
+        return await Community.objects.aget(pk=scorer_id, account=account)
+
+    return AsyncMock(side_effect=aload)
+
+
+class TestCompiledScorerCache:
+    def test_compiled_scorer_is_reused(
+        self, scorer_community, scorer_account, aload_community
+    ):
+        first = async_to_sync(aget_compiled_scorer)(
+            scorer_community.pk, scorer_account, aload_community
+        )
+        second = async_to_sync(aget_compiled_scorer)(
+            scorer_community.pk, scorer_account, aload_community
+        )
+
+        assert first is second
+        assert aload_community.call_count == 1
+        assert first.community.pk == scorer_community.pk
+        assert isinstance(first.scorer, WeightedScorer)
+
+    def test_scorer_save_invalidates_compiled_scorer(
+        self,
+        scorer_community,
+        scorer_account,
+        aload_community,
+        django_capture_on_commit_callbacks,
+    ):
+        first = async_to_sync(aget_compiled_scorer)(
+            scorer_community.pk, scorer_account, aload_community
+        )
+
+        with django_capture_on_commit_callbacks(execute=True):
+            scorer = WeightedScorer.objects.get(pk=scorer_community.scorer_id)
+            scorer.weights = {"Google": 5}
+            scorer.save()
+
+            # Other processes would read the old scorer until the transaction is committed
+            assert (
+                async_to_sync(aget_compiled_scorer)(
+                    scorer_community.pk, scorer_account, aload_community
+                )
+                is first
+            )
+
+        second = async_to_sync(aget_compiled_scorer)(
+            scorer_community.pk, scorer_account, aload_community
+        )
+
+        assert first is not second
+        assert aload_community.call_count == 2
+        assert second.compute_score(["Google"]).score == 5
+
+    def test_version_change_in_other_process_invalidates_compiled_scorer(
+        self, scorer_community, scorer_account, aload_community
+    ):
+        async_to_sync(aget_compiled_scorer)(
+            scorer_community.pk, scorer_account, aload_community
+        )
+
+        # Simulate another process invalidating the scorer: only the version in the
+        # django cache changes, the local entry is left in place
+        invalidate_compiled_scorers([scorer_community.pk])
+        async_to_sync(aget_compiled_scorer)(
+            scorer_community.pk, scorer_account, aload_community
+        )
+
+        assert aload_community.call_count == 2
+
+    def test_missing_version_is_not_a_hit(
+        self, scorer_community, scorer_account, aload_community
+    ):
+        first = async_to_sync(aget_compiled_scorer)(
+            scorer_community.pk, scorer_account, aload_community
+        )
+        assert first.version is not None
+
+        # The version was evicted from the cache
+        cache.clear()
+        second = async_to_sync(aget_compiled_scorer)(
+            scorer_community.pk, scorer_account, aload_community
+        )
+
+        assert first is not second
+        assert aload_community.call_count == 2
+        assert second.version is not None
+
+    def test_cache_is_disabled_with_zero_ttl(
+        self, settings, scorer_community, scorer_account, aload_community
+    ):
+        settings.COMPILED_SCORER_CACHE_TTL = 0
+        for _ in range(2):
+            async_to_sync(aget_compiled_scorer)(
+                scorer_community.pk, scorer_account, aload_community
+            )
+
+        assert aload_community.call_count == 2
+
+    def test_update_scorers_invalidates_compiled_scorers(
+        self, scorer_community, scorer_account, aload_community
+    ):
+        async_to_sync(aget_compiled_scorer)(
+            scorer_community.pk, scorer_account, aload_community
+        )
+
+        call_command("recalculate_scores", "--only-weights", "True")
+        compiled_scorer = async_to_sync(aget_compiled_scorer)(
+            scorer_community.pk, scorer_account, aload_community
+        )
+
+        assert aload_community.call_count == 2
+        assert compiled_scorer.version is not None
@@ -1,6 +1,23 @@
+from logging import DEBUG, ERROR, INFO, WARNING
+
 from django.conf import settings
 
 if settings.LOGGING_STRATEGY in ("structlog_json", "structlog_flatline"):
     from structlog import *
+
+    def log_with_fields(logger, level: int, event: str, **fields):
+        """Log `event` with structured fields (key-value pairs of the structlog event)"""
+        logger.log(level, event, **fields)
+
 else:
     from logging import *
+
+    def log_with_fields(logger, level: int, event: str, **fields):
+        """Log `event` with structured fields (record attributes, also appended to the message)"""
+        logger.log(
+            level,
+            "%s %s",
+            event,
+            " ".join(f"{key}={value}" for key, value in fields.items()),
+            extra=fields,
+        )
@@ -1,5 +1,6 @@
 import pytest
 from scorer.test.conftest import (
+    api_analytics_in_request,
     passport_holder_addresses,
     scorer_account,
     scorer_api_key,
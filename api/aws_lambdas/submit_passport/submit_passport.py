@@ -13,7 +13,7 @@ from registry.api.v1 import (
     SubmitPassportPayload,
     ahandle_submit_passport,
 )
-from registry.api.utils import save_api_key_analytics
+from registry.tasks import save_api_key_analytics
 
 # Now this script or any imported module can use any part of Django it needs.
 # from myapp import models
@@ -1,4 +1,5 @@
 from scorer.test.conftest import (
+    api_analytics_in_request,
     passport_holder_addresses,
     scorer_account,
     scorer_api_key,
@@ -1,4 +1,5 @@
 from scorer.test.conftest import (
+    api_analytics_in_request,
     scorer_account,
     scorer_community,
     scorer_community_with_binary_scorer,
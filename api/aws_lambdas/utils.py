@@ -66,8 +66,9 @@ from aws_lambdas.exceptions import InvalidRequest
 from django.http import HttpRequest
 from django_ratelimit.exceptions import Ratelimited
 from ninja_jwt.exceptions import InvalidToken
-from registry.api.utils import ApiKey, check_rate_limit, save_api_key_analytics
+from registry.api.utils import ApiKey, check_rate_limit
 from registry.exceptions import NotFoundApiException, Unauthorized
+from registry.tasks import save_api_key_analytics
 from structlog.contextvars import bind_contextvars
 
 RESPONSE_HEADERS = {
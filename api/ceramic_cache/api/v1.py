@@ -9,6 +9,7 @@ from asgiref.sync import async_to_sync
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import AbstractUser
+from django.db import connection
 from django.http import HttpRequest
 from django.shortcuts import get_object_or_404
 from ninja import Router
@@ -35,6 +36,8 @@ from ..exceptions import (
     TooManyStampsException,
 )
 from ..models import CeramicCache
+from ..passport_cache import get_current_stamps, invalidate_passport_cache
+from ..tasks import schedule_rescore
 from ..utils import validate_dag_jws_payload, verify_jws
 from .schema import (
     AccessTokenResponse,
@@ -158,9 +161,13 @@ def handle_add_stamps(
 
     CeramicCache.objects.bulk_create(new_stamp_objects)
 
-    updated_passport_state = CeramicCache.objects.filter(
-        address=address, type=CeramicCache.StampType.V1, deleted_at__isnull=True
-    )
+    invalidate_passport_cache([address])
+
+    updated_passport_state = [
+        stamp
+        for stamp in get_current_stamps(address)
+        if stamp.type == CeramicCache.StampType.V1
+    ]
 
     return GetStampsWithScoreResponse(
         success=True,
@@ -173,7 +180,7 @@ def handle_add_stamps(
             )
             for stamp in updated_passport_state
         ],
-        score=get_detailed_score_response_for_address(address),
+        score=get_score_response_for_stamps_update(address),
     )
 
 
@@ -229,9 +236,13 @@ def handle_patch_stamps(
     if new_stamp_objects:
         CeramicCache.objects.bulk_create(new_stamp_objects)
 
-    updated_passport_state = CeramicCache.objects.filter(
-        address=address, type=CeramicCache.StampType.V1, deleted_at__isnull=True
-    )
+    invalidate_passport_cache([address])
+
+    updated_passport_state = [
+        stamp
+        for stamp in get_current_stamps(address)
+        if stamp.type == CeramicCache.StampType.V1
+    ]
 
     return GetStampsWithScoreResponse(
         success=True,
@@ -244,7 +255,7 @@ def handle_patch_stamps(
             )
             for stamp in updated_passport_state
         ],
-        score=get_detailed_score_response_for_address(address),
+        score=get_score_response_for_stamps_update(address),
     )
 
 
@@ -259,51 +270,89 @@ def update_compose_db_status(request, payload: List[ComposeDBStatusPayload]):
         raise e
 
 
+UPDATE_COMPOSE_DB_STATUS_SQL = """
+WITH status_updates (id, compose_db_save_status, compose_db_stream_id) AS (
+    VALUES {values}
+)
+UPDATE {table}
+SET updated_at = %s,
+    compose_db_save_status = status_updates.compose_db_save_status,
+    compose_db_stream_id = COALESCE(
+        status_updates.compose_db_stream_id, {table}.compose_db_stream_id
+    )
+FROM status_updates
+WHERE {table}.id = status_updates.id
+    AND {table}.address = %s
+    AND {table}.deleted_at IS NULL
+    AND {table}.compose_db_save_status = %s
+    AND {table}.type = %s
+RETURNING {table}.id
+"""
+
+
 def handle_update_compose_db_status(
     address: str, payload: List[ComposeDBStatusPayload]
 ):
     if len(payload) > settings.MAX_BULK_CACHE_SIZE:
         raise TooManyStampsException()
 
-    now = get_utc_time()
+    updated_ids = update_compose_db_statuses(address, payload, get_utc_time())
 
-    stamp_objects = CeramicCache.objects.filter(
-        address=address,
-        id__in=[stamp.id for stamp in payload],
-        deleted_at__isnull=True,
-        compose_db_save_status=CeramicCache.ComposeDBSaveStatus.PENDING,
-        type=CeramicCache.StampType.V1,
-    )
+    # The updated_at of the stamps has changed
+    invalidate_passport_cache([address])
 
-    pending_status_updates = payload.copy()
-    for stamp_object in stamp_objects:
-        for idx, status_update in enumerate(pending_status_updates):
-            if str(stamp_object.pk) == str(status_update.id):
-                stamp_object.updated_at = now
-                stamp_object.compose_db_save_status = (
-                    status_update.compose_db_save_status
-                )
+    return {
+        "updated": updated_ids,
+    }
 
-                if status_update.compose_db_stream_id:
-                    stamp_object.compose_db_stream_id = (
-                        status_update.compose_db_stream_id
-                    )
 
-                pending_status_updates.pop(idx)
-                break
+def update_compose_db_statuses(
+    address: str, payload: List[ComposeDBStatusPayload], now: datetime
+) -> List[int]:
+    """
+    Update the compose db status (and stream id, if set) of the pending V1 stamps of the address
+    in a single statement, joining the stamps with the list of status updates.
+    If an id is repeated in the payload, the first status update is applied.
 
-    CeramicCache.objects.bulk_update(
-        stamp_objects,
+    Returns the ids of the updated stamps.
+    """
+    status_updates = {}
+    for status_update in payload:
+        status_updates.setdefault(
+            int(status_update.id),
+            (
+                CeramicCache.ComposeDBSaveStatus(
+                    status_update.compose_db_save_status
+                ).value,
+                status_update.compose_db_stream_id or None,
+            ),
+        )
+
+    if not status_updates:
+        return []
+
+    params = []
+    for stamp_id, (
+        compose_db_save_status,
+        compose_db_stream_id,
+    ) in status_updates.items():
+        params.extend([stamp_id, compose_db_save_status, compose_db_stream_id])
+    params.extend(
         [
-            "updated_at",
-            "compose_db_save_status",
-            "compose_db_stream_id",
-        ],
+            connection.ops.adapt_datetimefield_value(now),
+            address.lower(),
+            CeramicCache.ComposeDBSaveStatus.PENDING.value,
+            CeramicCache.StampType.V1.value,
+        ]
     )
 
-    return {
-        "updated": [stamp_object.pk for stamp_object in stamp_objects],
-    }
+    sql = UPDATE_COMPOSE_DB_STATUS_SQL.format(
+        table=connection.ops.quote_name(CeramicCache._meta.db_table),
+        values=", ".join(["(%s, %s, %s)"] * len(status_updates)),
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [row[0] for row in cursor.fetchall()]
 
 
 @router.delete("stamps/bulk", response=GetStampResponse, auth=JWTDidAuth())
@@ -333,9 +382,9 @@ def handle_delete_stamps(
     now = get_utc_time()
     stamps.update(deleted_at=now, updated_at=now)
 
-    updated_passport_state = CeramicCache.objects.filter(
-        address=address, deleted_at__isnull=True
-    )
+    invalidate_passport_cache([address])
+
+    updated_passport_state = get_current_stamps(address)
 
     return GetStampsWithScoreResponse(
         success=True,
@@ -348,7 +397,7 @@ def handle_delete_stamps(
             )
             for stamp in updated_passport_state
         ],
-        score=get_detailed_score_response_for_address(address),
+        score=get_score_response_for_stamps_update(address),
     )
 
 
@@ -370,9 +419,11 @@ def get_stamps(request, address):
 
 
 def handle_get_stamps(address):
-    stamps = CeramicCache.objects.filter(
-        address=address, type=CeramicCache.StampType.V1, deleted_at__isnull=True
-    )
+    stamps = [
+        stamp
+        for stamp in get_current_stamps(address)
+        if stamp.type == CeramicCache.StampType.V1
+    ]
 
     scorer_id = settings.CERAMIC_CACHE_SCORER_ID
     if (
@@ -509,3 +560,48 @@ def get_detailed_score_response_for_address(address: str) -> DetailedScoreRespon
     score = async_to_sync(ahandle_submit_passport)(submit_passport_payload, account)
 
     return score
+
+
+def get_score_response_for_stamps_update(address: str) -> DetailedScoreResponse:
+    """
+    Rescore the address after its stamps have been changed. With CERAMIC_CACHE_DEFERRED_RESCORING,
+    the rescore is only queued and the current score is returned with the PROCESSING status.
+    """
+    if not settings.CERAMIC_CACHE_DEFERRED_RESCORING:
+        return get_detailed_score_response_for_address(address)
+
+    scorer_id = settings.CERAMIC_CACHE_SCORER_ID
+    if not scorer_id:
+        raise InternalServerException("Scorer ID not set")
+
+    try:
+        schedule_rescore(address)
+    except Exception:
+        log.error(
+            "Failed to queue the rescore of address '%s', rescoring inline",
+            address,
+            exc_info=True,
+        )
+        return get_detailed_score_response_for_address(address)
+
+    score = (
+        Score.objects.select_related("passport")
+        .filter(passport__address=address.lower(), passport__community_id=scorer_id)
+        .first()
+    )
+    if score is None:
+        return DetailedScoreResponse(
+            address=address.lower(),
+            score=None,
+            status=Score.Status.PROCESSING,
+            last_score_timestamp=None,
+            evidence=None,
+            error=None,
+            stamp_scores={},
+        )
+
+    # The rescore is queued, the score is PROCESSING until it has run.
+    # The status is updated without saving the score, so that no SCORE_UPDATE event is recorded
+    Score.objects.filter(pk=score.pk).update(status=Score.Status.PROCESSING)
+    score.status = Score.Status.PROCESSING
+    return DetailedScoreResponse.from_orm(score)
@@ -0,0 +1,159 @@
+"""
+Helpers to stream data exports to S3, without writing them to a local file first.
+
+`S3MultipartWriter` is a binary file-like object that uploads what is written to it in parts
+of a multipart upload, and `compressed_stream` compresses what is written to it on the fly.
+"""
+
+import gzip
+from contextlib import contextmanager
+from typing import BinaryIO, Dict, Iterator, List, Optional
+
+import boto3
+from django.conf import settings
+
+# S3 requires all the parts of a multipart upload (except the last one) to be at least 5 MiB
+MULTIPART_PART_SIZE = 16 * 1024 * 1024
+
+COMPRESSION_EXTENSIONS = {
+    "gzip": ".gz",
+    "zstd": ".zst",
+    "none": "",
+}
+
+
+def get_s3_client():
+    return boto3.client(
+        "s3",
+        aws_access_key_id=settings.S3_DATA_AWS_SECRET_KEY_ID,
+        aws_secret_access_key=settings.S3_DATA_AWS_SECRET_ACCESS_KEY,
+        endpoint_url=settings.S3_ENDPOINT_URL,
+    )
+
+
+class S3MultipartWriter:
+    """
+    Write-only binary stream to an S3 object.
+
+    The data is buffered and uploaded in parts of `part_size` bytes. The multipart upload is only
+    started when the first part is full, smaller objects are uploaded with a single `put_object`.
+    When used as a context manager, the upload is aborted if an exception is raised.
+    """
+
+    def __init__(
+        self,
+        s3_client,
+        bucket: str,
+        key: str,
+        extra_args: Optional[Dict] = None,
+        part_size: int = MULTIPART_PART_SIZE,
+    ):
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.key = key
+        self.extra_args = extra_args or {}
+        self.part_size = part_size
+        self.upload_id: Optional[str] = None
+        self.parts: List[Dict] = []
+        self.buffer = bytearray()
+        self.bytes_written = 0
+        self.closed = False
+
+    def writable(self) -> bool:
+        return True
+
+    def readable(self) -> bool:
+        return False
+
+    def seekable(self) -> bool:
+        return False
+
+    def write(self, data: bytes) -> int:
+        self.buffer += data
+        self.bytes_written += len(data)
+        while len(self.buffer) >= self.part_size:
+            self._upload_part(bytes(self.buffer[: self.part_size]))
+            del self.buffer[: self.part_size]
+        return len(data)
+
+    def flush(self):
+        # Parts are only uploaded once they are full
+        pass
+
+    def _upload_part(self, data: bytes):
+        if self.upload_id is None:
+            response = self.s3_client.create_multipart_upload(
+                Bucket=self.bucket, Key=self.key, **self.extra_args
+            )
+            self.upload_id = response["UploadId"]
+
+        part_number = len(self.parts) + 1
+        response = self.s3_client.upload_part(
+            Bucket=self.bucket,
+            Key=self.key,
+            UploadId=self.upload_id,
+            PartNumber=part_number,
+            Body=data,
+        )
+        self.parts.append({"ETag": response["ETag"], "PartNumber": part_number})
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+
+        if self.upload_id is None:
+            self.s3_client.put_object(
+                Bucket=self.bucket,
+                Key=self.key,
+                Body=bytes(self.buffer),
+                **self.extra_args,
+            )
+        else:
+            if self.buffer:
+                self._upload_part(bytes(self.buffer))
+            self.s3_client.complete_multipart_upload(
+                Bucket=self.bucket,
+                Key=self.key,
+                UploadId=self.upload_id,
+                MultipartUpload={"Parts": self.parts},
+            )
+        self.buffer = bytearray()
+
+    def abort(self):
+        self.closed = True
+        self.buffer = bytearray()
+        if self.upload_id is not None:
+            self.s3_client.abort_multipart_upload(
+                Bucket=self.bucket, Key=self.key, UploadId=self.upload_id
+            )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+@contextmanager
+def compressed_stream(fileobj: BinaryIO, compression: str) -> Iterator[BinaryIO]:
+    """
+    Compress the data written to the returned stream with `compression` (one of COMPRESSION_EXTENSIONS)
+    and write it to `fileobj`. `fileobj` is not closed.
+    """
+    if compression == "gzip":
+        with gzip.GzipFile(fileobj=fileobj, mode="wb", compresslevel=6) as stream:
+            yield stream
+    elif compression == "zstd":
+        # Only imported by the zstd compressed exports
+        import zstandard
+
+        with zstandard.ZstdCompressor().stream_writer(fileobj, closefd=False) as stream:
+            yield stream
+    elif compression == "none":
+        yield fileobj
+    else:
+        raise ValueError(f"Unsupported compression '{compression}'")
@@ -1,92 +1,247 @@
 import datetime
-import json
-import os
-
-import boto3
+import io
+import multiprocessing
+from collections import deque
+from typing import BinaryIO, Callable, List, Optional, Tuple
+
+from ceramic_cache.export import (
+    COMPRESSION_EXTENSIONS,
+    S3MultipartWriter,
+    compressed_stream,
+    get_s3_client,
+)
 from ceramic_cache.models import CeramicCache, StampExports
 from django.conf import settings
 from django.core.management.base import BaseCommand
-from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Max, Min, Q, TextField
+from django.db.models.functions import Cast
 from django.utils import timezone
 from tqdm import tqdm
 
-s3 = boto3.client(
-    "s3",
-    aws_access_key_id=settings.S3_DATA_AWS_SECRET_KEY_ID,
-    aws_secret_access_key=settings.S3_DATA_AWS_SECRET_ACCESS_KEY,
-)
+# The range to export is split in this many segments per worker process. Having more segments
+# than workers evens out the load when the updates are not evenly distributed over time.
+SEGMENTS_PER_WORKER = 8
+
+
+def write_stamps(
+    stream: BinaryIO,
+    database: str,
+    lower: datetime.datetime,
+    upper: datetime.datetime,
+    chunk_size: int,
+    progress: Optional[Callable[[int], None]] = None,
+) -> int:
+    """
+    Write the stamps updated in (lower, upper] to the stream as JSON lines, ordered by (updated_at, id).
+    The rows are read in pages, using the (updated_at, id) of the last row as keyset cursor, so that
+    no row is skipped when several rows share the same updated_at.
+
+    Returns the number of stamps written.
+    """
+    query = (
+        CeramicCache.objects.using(database)
+        .filter(updated_at__lte=upper)
+        .order_by("updated_at", "id")
+        # Read the stamp as JSON text, so that it does not need to be parsed and serialized again
+        .annotate(stamp_json=Cast("stamp", output_field=TextField()))
+        .values_list("updated_at", "id", "stamp_json")
+    )
+
+    page_query = query.filter(updated_at__gt=lower)
+    total = 0
+    while True:
+        rows = list(page_query[:chunk_size])
+        if not rows:
+            break
+
+        stream.write(
+            "".join(f'{{"stamp": {stamp_json}}}\n' for _, _, stamp_json in rows).encode(
+                "utf-8"
+            )
+        )
+        total += len(rows)
+        if progress:
+            progress(len(rows))
+
+        if len(rows) < chunk_size:
+            break
+
+        last_updated_at, last_id, _ = rows[-1]
+        page_query = query.filter(updated_at__gte=last_updated_at).filter(
+            Q(updated_at__gt=last_updated_at) | Q(id__gt=last_id)
+        )
+
+    return total
+
+
+def export_segment(
+    database: str,
+    lower: datetime.datetime,
+    upper: datetime.datetime,
+    chunk_size: int,
+    compression: str,
+) -> Tuple[bytes, int]:
+    """
+    Export the stamps updated in (lower, upper] as a standalone compressed member (gzip member or
+    zstd frame). The members of consecutive segments can be concatenated into a single file.
+    """
+    buffer = io.BytesIO()
+    with compressed_stream(buffer, compression) as stream:
+        total = write_stamps(stream, database, lower, upper, chunk_size)
+    return buffer.getvalue(), total
+
+
+def split_range(
+    lower: datetime.datetime, upper: datetime.datetime, num_segments: int
+) -> List[Tuple[datetime.datetime, datetime.datetime]]:
+    step = (upper - lower) / num_segments
+    bounds = [lower + step * i for i in range(1, num_segments)]
+    return list(zip([lower, *bounds], [*bounds, upper]))
 
 
 class Command(BaseCommand):
     help = "Weekly data dump of new Stamp data since the last dump."
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=5000,
+            help="Number of stamps read from the DB per query",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="""Number of worker processes. With more than 1 worker, the range of the export is split in
+            segments that are read and compressed in parallel, and are uploaded in order.""",
+        )
+        parser.add_argument(
+            "--compression",
+            choices=list(COMPRESSION_EXTENSIONS),
+            default="gzip",
+            help="Compression of the dump file",
+        )
+        parser.add_argument(
+            "--database",
+            default="read_replica_0",
+            help="The database to read the stamps from",
+        )
+
     def handle(self, *args, **options):
-        print("Starting dump_stamp_data.py")
+        chunk_size = options["chunk_size"]
+        workers = options["workers"]
+        compression = options["compression"]
+        database = options["database"]
+
+        self.stdout.write("Starting dump_stamp_data.py")
 
         latest_export = StampExports.objects.order_by("-last_export_ts").first()
 
-        if not latest_export:
-            print("No previous exports found. Exporting all data.")
-            latest_export = StampExports(
-                last_export_ts=datetime.date.fromisoformat("1970-01-01")
-            )
+        if latest_export:
+            lower = latest_export.last_export_ts
+        else:
+            self.stdout.write("No previous exports found. Exporting all data.")
+            lower = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
 
-        print(f"Getting Stamps updated since {latest_export.last_export_ts}")
+        self.stdout.write(f"Getting Stamps updated since {lower}")
 
-        query = (
-            CeramicCache.objects.values("stamp", "updated_at")
-            .order_by("updated_at")
-            .using("read_replica_0")
+        # Fix the upper bound of the export, the stamps updated while exporting
+        # will be part of the next export
+        bounds = (
+            CeramicCache.objects.using(database)
+            .filter(updated_at__gt=lower)
+            .aggregate(first=Min("updated_at"), last=Max("updated_at"))
         )
+        upper = bounds["last"] or lower
 
         # Generate the dump file name
-        file_name = f'stamps_{latest_export.last_export_ts.strftime("%Y%m%d_%H%M%S")}_{timezone.now().strftime("%Y%m%d_%H%M%S")}.jsonl'
-
-        last_updated_at = latest_export.last_export_ts
-        chunk_size = 1000
-
-        try:
-            # Write serialized data to the file
-            with open(file_name, "w") as f:
-                with tqdm(
-                    unit="items", unit_scale=None, desc="Exporting stamps"
-                ) as progress_bar:
-                    has_more = True
-                    while has_more:
-                        objects = list(
-                            query.filter(updated_at__gt=last_updated_at)[:chunk_size]
-                        )
-                        if objects:
-                            num_objects = len(objects)
-                            progress_bar.update(num_objects)
-
-                            for cache_obj in objects:
-                                f.write(
-                                    json.dumps({"stamp": cache_obj["stamp"]}) + "\n"
-                                )
-
-                            last_updated_at = cache_obj["updated_at"]
-
-                            # If we get less than the chunk size, we've reached the end
-                            # No need to keep querying which could result in querying forever
-                            if num_objects < chunk_size:
-                                has_more = False
-                        else:
-                            has_more = False
-
-        finally:
-            self.stdout.write(
-                self.style.SUCCESS(f'Last stamp updated at "{last_updated_at}"')
-            )
-
-        # Upload to S3 bucket
-        s3.upload_file(file_name, settings.S3_WEEKLY_BACKUP_BUCKET_NAME, file_name)
-
-        # Delete local file after upload
-        os.remove(file_name)
-
-        StampExports.objects.create(
-            last_export_ts=last_updated_at, stamp_total=progress_bar.n
+        file_name = f'stamps_{lower.strftime("%Y%m%d_%H%M%S")}_{timezone.now().strftime("%Y%m%d_%H%M%S")}.jsonl{COMPRESSION_EXTENSIONS[compression]}'
+
+        with tqdm(
+            unit="items", unit_scale=None, desc="Exporting stamps"
+        ) as progress_bar, S3MultipartWriter(
+            get_s3_client(), settings.S3_WEEKLY_BACKUP_BUCKET_NAME, file_name
+        ) as writer:
+            if workers > 1 and bounds["first"]:
+                # Start the first segment just before the first stamp, the range before that is empty
+                first_segment_lower = max(
+                    lower, bounds["first"] - datetime.timedelta(microseconds=1)
+                )
+                segments = split_range(
+                    first_segment_lower, upper, workers * SEGMENTS_PER_WORKER
+                )
+                stamp_total = self.export_segments(
+                    writer,
+                    segments,
+                    workers,
+                    database,
+                    chunk_size,
+                    compression,
+                    progress_bar,
+                )
+            else:
+                with compressed_stream(writer, compression) as stream:
+                    stamp_total = write_stamps(
+                        stream,
+                        database,
+                        lower,
+                        upper,
+                        chunk_size,
+                        progress=progress_bar.update,
+                    )
+
+        self.stdout.write(self.style.SUCCESS(f'Last stamp updated at "{upper}"'))
+
+        export = StampExports.objects.create(stamp_total=stamp_total)
+        # last_export_ts is set to now on creation (auto_now_add), but it must be the upper
+        # bound of this export, for the next export to include the stamps updated since then
+        StampExports.objects.filter(pk=export.pk).update(last_export_ts=upper)
+
+        self.stdout.write(
+            f"Data dump completed and uploaded to S3 as {file_name} ({stamp_total} stamps)"
         )
 
-        print(f"Data dump completed and uploaded to S3 as {file_name}")
+    def export_segments(
+        self,
+        writer: S3MultipartWriter,
+        segments: List[Tuple[datetime.datetime, datetime.datetime]],
+        workers: int,
+        database: str,
+        chunk_size: int,
+        compression: str,
+        progress_bar: tqdm,
+    ) -> int:
+        """
+        Export the segments in worker processes, and write them to `writer` in order.
+        Only a bounded number of segments is exported ahead of the one being uploaded.
+        """
+        # The DB connections must not be shared with the forked worker processes
+        connections.close_all()
+
+        stamp_total = 0
+        with multiprocessing.Pool(workers) as pool:
+            pending = deque()
+
+            def write_next_segment():
+                nonlocal stamp_total
+                data, total = pending.popleft().get()
+                writer.write(data)
+                stamp_total += total
+                progress_bar.update(total)
+
+            for lower, upper in segments:
+                pending.append(
+                    pool.apply_async(
+                        export_segment,
+                        (database, lower, upper, chunk_size, compression),
+                    )
+                )
+                if len(pending) >= 2 * workers:
+                    write_next_segment()
+
+            while pending:
+                write_next_segment()
+
+        return stamp_total
@@ -1,18 +1,29 @@
 import datetime
+import io
 import json
 import os
 import traceback
+from functools import partial
+from itertools import islice
+from typing import Any, BinaryIO, Callable, List, Optional, Tuple
 from urllib.parse import urlparse
 
-import boto3
+from ceramic_cache.export import (
+    COMPRESSION_EXTENSIONS,
+    S3MultipartWriter,
+    compressed_stream,
+    get_s3_client,
+)
 from django.apps import apps
-from django.conf import settings
 from django.core.management.base import BaseCommand
 from django.core.serializers.json import DjangoJSONEncoder
 from django.core.serializers.python import Serializer as PythonSerializer
 from django.db import DEFAULT_DB_ALIAS
 from tqdm import tqdm
 
+# Number of rows fetched at once from the DB cursor by the fast serializer
+FAST_EXPORT_CHUNK_SIZE = 2000
+
 
 class ProgressBar:
     def __init__(self, progress_output, object_count, *args, **kwargs):
@@ -174,7 +185,7 @@ def export_data(model_config, file, database, batch_size=None):
             queryset = model.objects.using(database).order_by("id")
             if select_related:
                 queryset = queryset.select_related(*select_related)
-            if "query_filter" in model_config:
+            if "filter" in model_config:
                 queryset = queryset.filter(**model_config["filter"])
 
             serializer.serialize(
@@ -201,6 +212,138 @@ def export_data(model_config, file, database, batch_size=None):
                 has_more_records = serializer.last_id != 0
 
 
+def get_json_dumps() -> Callable[[Any], bytes]:
+    """
+    Return a function serializing an object to compact JSON (UTF-8 encoded).
+
+    orjson is used if it is installed, the standard json module otherwise. Both format
+    the values not supported by JSON (datetimes, decimals, ...) like DjangoJSONEncoder.
+    """
+    encoder = DjangoJSONEncoder(separators=(",", ":"), ensure_ascii=False)
+    try:
+        # orjson is an optional dependency, it is only used to speed up the export
+        import orjson
+    except ImportError:
+        return lambda obj: encoder.encode(obj).encode("utf-8")
+
+    return partial(
+        orjson.dumps, default=encoder.default, option=orjson.OPT_PASSTHROUGH_DATETIME
+    )
+
+
+def get_row_layout(
+    model, select_related: Optional[List[str]]
+) -> Optional[Tuple[List[str], Callable[[tuple], dict]]]:
+    """
+    Return the lookups to query with `values_list` and the function building the exported object
+    from a row, for objects with the same structure as the ones of `Serializer`: the serializable
+    fields, the fields of the objects of `select_related` nested under the name of the foreign key,
+    and the `id`.
+
+    Returns None if the model (or a related model) has many-to-many fields, these can't be read with
+    a single query.
+    """
+    concrete_model = model._meta.concrete_model
+    if any(field.serialize for field in concrete_model._meta.local_many_to_many):
+        return None
+
+    lookups = []
+    # (key, index of the value) for values, (key, index of the foreign key, nested layout) for related objects
+    layout = []
+    for field in concrete_model._meta.local_fields:
+        if not field.serialize:
+            continue
+
+        if field.remote_field is None or field.name not in (select_related or []):
+            layout.append((field.name, len(lookups), None))
+            lookups.append(field.attname)
+            continue
+
+        related_model = field.remote_field.model._meta.concrete_model
+        if any(f.serialize for f in related_model._meta.local_many_to_many):
+            return None
+
+        nested_layout = []
+        for related_field in related_model._meta.local_fields:
+            if related_field.serialize:
+                nested_layout.append((related_field.name, len(lookups)))
+                lookups.append(f"{field.name}__{related_field.attname}")
+        layout.append((field.name, len(lookups), nested_layout))
+        lookups.append(field.attname)
+
+    layout.append(("id", len(lookups), None))
+    lookups.append(concrete_model._meta.pk.attname)
+
+    if all(nested is None for _, _, nested in layout):
+        keys = [key for key, _, _ in layout]
+        return lookups, lambda row: dict(zip(keys, row))
+
+    def build_row(row: tuple) -> dict:
+        obj = {}
+        for key, index, nested in layout:
+            if nested is None:
+                obj[key] = row[index]
+            elif row[index] is None:
+                obj[key] = None
+            else:
+                obj[key] = {
+                    nested_key: row[nested_index] for nested_key, nested_index in nested
+                }
+        return obj
+
+    return lookups, build_row
+
+
+def export_data_fast(
+    model_config, stream: BinaryIO, database, batch_size=None
+) -> Optional[int]:
+    """
+    Export the objects of the model as JSON lines to the binary `stream`, reading them with a
+    `values_list` query (with joins for `select_related`) instead of loading model instances.
+
+    Returns the number of objects exported, or None if the model can't be exported this way.
+    """
+    select_related = model_config.get("select_related")
+    model = apps.get_model(model_config["name"])
+    row_layout = get_row_layout(model, select_related)
+    if row_layout is None:
+        return None
+
+    lookups, build_row = row_layout
+    dumps = get_json_dumps()
+    queryset = (
+        model.objects.using(database)
+        .order_by("id")
+        .filter(**model_config.get("filter", {}))
+        .values_list(*lookups)
+    )
+
+    def write_rows(rows) -> Any:
+        stream.write(b"".join([dumps(build_row(row)) + b"\n" for row in rows]))
+        progress_bar.update(len(rows))
+        return rows[-1][-1]
+
+    total = 0
+    with tqdm(
+        unit="records",
+        unit_scale=True,
+        desc=f"Exporting records of {model_config['name']}",
+    ) as progress_bar:
+        if batch_size is None:
+            iterator = queryset.iterator(chunk_size=FAST_EXPORT_CHUNK_SIZE)
+            while rows := list(islice(iterator, FAST_EXPORT_CHUNK_SIZE)):
+                write_rows(rows)
+                total += len(rows)
+        else:
+            last_id = 0
+            while rows := list(queryset.filter(id__gt=last_id)[:batch_size]):
+                # The id is the last value of the rows
+                last_id = write_rows(rows)
+                total += len(rows)
+
+    return total
+
+
 class Command(BaseCommand):
     help = """Dump data to JSONL files on S3 directly.
 
@@ -246,6 +389,21 @@ class Command(BaseCommand):
             help="Nominates a specific database to dump fixtures from. "
             'Defaults to the "default" database.',
         )
+        parser.add_argument(
+            "--serializer",
+            choices=["fast", "django"],
+            default="fast",
+            help="""`fast` reads the objects as rows (joining the `select_related` tables) and serializes them
+            with a fast JSON encoder, `django` uses the django serializer framework. Both write the same objects,
+            the `django` serializer is always used for models with many-to-many fields.""",
+        )
+        parser.add_argument(
+            "--compression",
+            choices=list(COMPRESSION_EXTENSIONS),
+            default="none",
+            help="""Compression of the dump files, the extension of the compression is added to the file names.
+            zstd requires the `zstandard` package""",
+        )
         parser.add_argument(
             "--summary-extra-args",
             default="{}",
@@ -263,19 +421,19 @@ class Command(BaseCommand):
         s3_uri = options["s3_uri"]
         database = options["database"]
         summary_extra_args = json.loads(options["summary_extra_args"])
+        serializer = options["serializer"]
+        compression = options["compression"]
         self.stdout.write("-" * 40)
         self.stdout.write(f"batch_size          : {batch_size}")
         self.stdout.write(f"config              : {config}")
         self.stdout.write(f"s3_uri              : {s3_uri}")
         self.stdout.write(f"database            : {database}")
         self.stdout.write(f"summary_extra_args  : {summary_extra_args}")
+        self.stdout.write(f"serializer          : {serializer}")
+        self.stdout.write(f"compression         : {compression}")
         self.stdout.write("-" * 40)
 
-        s3 = boto3.client(
-            "s3",
-            aws_access_key_id=settings.S3_DATA_AWS_SECRET_KEY_ID,
-            aws_secret_access_key=settings.S3_DATA_AWS_SECRET_ACCESS_KEY,
-        )
+        s3 = get_s3_client()
         # Parse the S3 URI to extract bucket and key
         parsed_uri = urlparse(s3_uri)
         s3_bucket_name = parsed_uri.netloc
@@ -298,39 +456,50 @@ class Command(BaseCommand):
                     f"{model._meta.db_table}.jsonl"
                     if "filename" not in model_config
                     else model_config["filename"]
-                )
+                ) + COMPRESSION_EXTENSIONS[compression]
 
                 s3_key = f"{s3_folder}/{file_name}"
 
                 # chunk_size = 1000
 
                 try:
-                    # Write serialized data to the file
-                    self.stdout.write(f"Serializing to file: {file_name}")
-                    with open(file_name, "w", encoding="utf-8") as file:
-                        export_data(
-                            model_config, file, batch_size=batch_size, database=database
-                        )
-
-                    model_summary[
-                        "start_s3_upload"
-                    ] = datetime.datetime.now().isoformat()
+                    # The serialized data is streamed to the S3 bucket
                     self.stdout.write(
-                        f"Uploading to s3, bucket='{s3_bucket_name}', key='{s3_key}'"
+                        f"Serializing to s3, bucket='{s3_bucket_name}', key='{s3_key}'"
                     )
-
-                    # Upload to S3 bucket
-                    s3.upload_file(
-                        file_name,
+                    model_summary["start_s3_upload"] = (
+                        datetime.datetime.now().isoformat()
+                    )
+                    with S3MultipartWriter(
+                        s3,
                         s3_bucket_name,
                         s3_key,
-                        ExtraArgs=model_config.get("extra-args", {}),
-                    )
+                        model_config.get("extra-args", {}),
+                    ) as writer, compressed_stream(writer, compression) as stream:
+                        exported = None
+                        if serializer == "fast":
+                            exported = export_data_fast(
+                                model_config,
+                                stream,
+                                batch_size=batch_size,
+                                database=database,
+                            )
+                        if exported is None:
+                            file = io.TextIOWrapper(
+                                stream, encoding="utf-8", write_through=True
+                            )
+                            export_data(
+                                model_config,
+                                file,
+                                batch_size=batch_size,
+                                database=database,
+                            )
+                            # The stream is closed by compressed_stream / the S3 writer
+                            file.detach()
+
                     model_summary["finished_at"] = datetime.datetime.now().isoformat()
                     model_summary["s3_key"] = s3_key
                     model_summary["s3_bucket_name"] = s3_bucket_name
-
-                    os.remove(file_name)
                 except Exception as e:
                     self.stderr.write(self.style.ERROR(f"ERROR: {e}"))
                     self.stderr.write(traceback.format_exc())
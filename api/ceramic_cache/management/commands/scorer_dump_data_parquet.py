@@ -1,34 +1,63 @@
 import json
+import multiprocessing
+import os
 import traceback
-from pprint import pprint
+from typing import Dict, List, Optional, Tuple
 from urllib.parse import urlparse
 
-import boto3
 import pyarrow as pa
 import pyarrow.parquet as pq
-from ceramic_cache.models import CeramicCache
+from ceramic_cache.export import S3MultipartWriter, get_s3_client
+from ceramic_cache.models import ParquetExports
+from ceramic_cache.parquet_export import copy_to_parquet, pa_schema_map
 from django.apps import apps
-from django.conf import settings
 from django.core.management.base import BaseCommand
-from django.db import DEFAULT_DB_ALIAS, connection
-from registry.models import Passport
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models import Max, Q
+from django.utils import timezone
 from tqdm import tqdm
 
-# The following mapping will map django field types to pyarrow types
-pa_schema_map = {
-    "AutoField": {"pa_type": pa.int64()},
-    "BigAutoField": {"pa_type": pa.int64()},
-    # "ForeignKey": {"pa_type": pa.int64()},
-    # "OneToOneField": {"pa_type": pa.int64()},
-    "CharField": {"pa_type": pa.string()},
-    "JSONField": {"pa_type": pa.string(), "map_value": str},
-    "DateTimeField": {"pa_type": pa.timestamp("ms")},
-    "IntegerField": {"pa_type": pa.int64()},
-    "BooleanField": {"pa_type": pa.bool_()},
-    "DecimalField": {"pa_type": pa.decimal256(18, 9)},
+# The command run by the worker processes, they are forked from the process running the command
+_worker_command: Optional["Command"] = None
+
+
+def export_model_in_worker(
+    model_label: str,
+) -> Tuple[str, Optional[Dict], Optional[str]]:
+    """
+    Export the model in a worker process, returns the model label, the manifest entry of
+    incremental exports and the error (if any)
+    """
+    command = _worker_command
+    # The S3 client of the parent process must not be shared with the worker process
+    command.s3 = get_s3_client()
+    try:
+        return model_label, command.export(apps.get_model(model_label)), None
+    except Exception:
+        return model_label, None, traceback.format_exc()
+
+
+# The field used as high-water mark by the incremental exports of the models that track their changes
+# in a field other than `updated_at`
+WATERMARK_FIELDS = {
+    "registry.Score": "last_score_timestamp",
 }
 
 
+def get_watermark_field(model) -> Tuple[str, bool]:
+    """
+    Return the field used as high-water mark by incremental exports and whether it tracks changed rows:
+    the field in WATERMARK_FIELDS or `updated_at` for the models that have it (new and changed rows are
+    exported), the primary key otherwise (new rows only)
+    """
+    if model._meta.label in WATERMARK_FIELDS:
+        return WATERMARK_FIELDS[model._meta.label], True
+    if any(field.name == "updated_at" for field in model._meta.fields):
+        return "updated_at", True
+    return model._meta.pk.name, False
+
+
 class Command(BaseCommand):
     help = "Export data from a django model to a parquet file"
 
@@ -62,16 +91,56 @@ class Command(BaseCommand):
             help="""JSON object, that contains extra args for the files uploaded to S3.
             This will be passed in as the `ExtraArgs` parameter to boto3's upload_file method.""",
         )
+        parser.add_argument(
+            "--engine",
+            choices=["auto", "copy", "orm"],
+            default="auto",
+            help="""How the data is read. `copy` streams each table with PostgreSQL's COPY and parses it with
+            the Arrow CSV reader, `orm` reads the records in batches of --batch-size with the django ORM.
+            `auto` uses `copy` for PostgreSQL databases and `orm` otherwise.""",
+        )
+        parser.add_argument(
+            "--row-group-size",
+            type=int,
+            default=250000,
+            help="Number of rows per Parquet row group (copy engine only)",
+        )
+        parser.add_argument(
+            "--compression",
+            type=str,
+            default="snappy",
+            help="Parquet compression codec, for example snappy, zstd or gzip (copy engine only)",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="Number of models exported in parallel, each one in its own process",
+        )
+        parser.add_argument(
+            "--incremental",
+            action="store_true",
+            help="""Only export the rows added (or updated, for models with an `updated_at` field or a field
+            listed in WATERMARK_FIELDS) since the previous incremental export. The rows of each model are
+            written as a new partition of a dataset partitioned by date (`<table>/export_date=YYYY-MM-DD/`),
+            and a manifest listing the partitions written by the run is uploaded to `_manifests/`. Models that
+            do not track their changes are flagged with `"changes_tracked": false` in the manifest.
+            The high-water marks are stored in ParquetExports.""",
+        )
 
     def get_pa_schema(self, model):
         schema = pa.schema(
             [
                 # We need to take into consideration that for relation fields, we actually need the `fieldname + "_id"`
-                (field.name, self.map_to_pa_schema_field(field.get_internal_type()))
-                if not field.is_relation
-                else (
-                    f"{field.name}_id",
-                    self.map_to_pa_schema_field(field.target_field.get_internal_type()),
+                (
+                    (field.name, self.map_to_pa_schema_field(field.get_internal_type()))
+                    if not field.is_relation
+                    else (
+                        f"{field.name}_id",
+                        self.map_to_pa_schema_field(
+                            field.target_field.get_internal_type()
+                        ),
+                    )
                 )
                 for field in model._meta.fields
             ]
@@ -89,8 +158,9 @@ class Command(BaseCommand):
         )
         return pa.string()
 
-    def get_data(self, model, last_id):
-        q = model.objects.using(self.database).all().order_by("id")
+    def get_data(self, queryset, last_id):
+        model = queryset.model
+        q = queryset.order_by("id")
 
         if last_id:
             q = q.filter(id__gt=last_id)
@@ -106,11 +176,181 @@ class Command(BaseCommand):
 
         return (self.get_pa_schema(model), data)
 
-    def export_data_for_model(self, model, s3_folder, s3_bucket_name, extra_args):
-        schema, data = self.get_data(model, None)
-        # Define the output Parquet file
+    def export(self, model) -> Optional[Dict]:
+        if self.incremental:
+            return self.export_model_delta(model)
+        self.export_model(model)
+        return None
+
+    def export_model(self, model, queryset=None, s3_key=None) -> int:
+        """
+        Export the rows of `queryset` (all the rows of the model by default) to `s3_key`
+        (`<table>.parquet` in the S3 folder by default). Returns the number of rows exported.
+        """
+        if queryset is None:
+            queryset = model.objects.using(self.database).all()
+        if s3_key is None:
+            s3_key = f"{self.s3_folder}/{model._meta.db_table}.parquet"
+
+        if self.engine == "copy":
+            return self.export_data_for_model_with_copy(
+                queryset, s3_key, self.s3_bucket_name, self.extra_args
+            )
+        return self.export_data_for_model(
+            queryset, s3_key, self.s3_bucket_name, self.extra_args
+        )
+
+    def export_model_delta(self, model) -> Dict:
+        """
+        Export the rows of the model above the high-water mark of its previous incremental export
+        as a new partition of the dataset of the model. Returns the manifest entry of the partition.
+        """
         table_name = model._meta.db_table
-        output_file = f"{table_name}.parquet"
+        pk_name = model._meta.pk.name
+        watermark_field, changes_tracked = get_watermark_field(model)
+
+        previous_export = (
+            ParquetExports.objects.filter(model_label=model._meta.label)
+            .order_by("-id")
+            .first()
+        )
+        queryset = model.objects.using(self.database).all()
+
+        if changes_tracked:
+            # The rows are ordered by (watermark_field, pk), the pk breaks the ties of rows changed
+            # at the same time
+            lower = getattr(previous_export, "last_updated_at", None)
+            lower_id = getattr(previous_export, "last_id", None)
+            if lower is not None:
+                condition = Q(**{f"{watermark_field}__gt": lower})
+                if lower_id is not None:
+                    condition |= Q(
+                        **{watermark_field: lower, f"{pk_name}__gt": lower_id}
+                    )
+                queryset = queryset.filter(condition)
+        else:
+            self.stdout.write(
+                self.style.WARNING(
+                    f"EXPORT - '{model._meta.label}' does not track changes, only the new rows are exported"
+                )
+            )
+            lower = getattr(previous_export, "last_id", None)
+            lower_id = lower
+            if lower is not None:
+                queryset = queryset.filter(**{f"{pk_name}__gt": lower})
+
+        # Fix the upper bound of the export, the rows added while exporting will be part of the next export
+        upper = queryset.aggregate(upper=Max(watermark_field))["upper"]
+        upper_id = upper
+        if changes_tracked and upper is not None:
+            upper_id = queryset.filter(**{watermark_field: upper}).aggregate(
+                upper_id=Max(pk_name)
+            )["upper_id"]
+
+        entry = {
+            "model": model._meta.label,
+            "table": table_name,
+            "watermark_field": watermark_field,
+            "changes_tracked": changes_tracked,
+            "from": lower,
+            "from_id": lower_id,
+            "to": upper if upper is not None else lower,
+            "to_id": upper_id if upper is not None else lower_id,
+            "rows": 0,
+            "s3_key": None,
+        }
+        if upper is None:
+            return entry
+
+        s3_key = (
+            f"{self.s3_folder}/{table_name}/export_date={self.export_ts:%Y-%m-%d}/"
+            f"{table_name}_{self.export_ts:%Y%m%d_%H%M%S}.parquet"
+        )
+        condition = Q(**{f"{watermark_field}__lte": upper})
+        if changes_tracked:
+            condition = Q(**{f"{watermark_field}__lt": upper}) | Q(
+                **{watermark_field: upper, f"{pk_name}__lte": upper_id}
+            )
+        entry["rows"] = self.export_model(model, queryset.filter(condition), s3_key)
+        if entry["rows"]:
+            entry["s3_key"] = s3_key
+        return entry
+
+    def save_delta_export(self, entries: List[Dict]):
+        """
+        Upload the manifest of the incremental export, and record the high-water marks of the models.
+        The high-water marks are only moved once the manifest is uploaded, if the export fails
+        the same rows are exported again by the next run.
+        """
+        manifest_key = (
+            f"{self.s3_folder}/_manifests/{self.export_ts:%Y%m%d_%H%M%S}.json"
+        )
+        manifest = {
+            "export_ts": self.export_ts,
+            "database": self.database,
+            "partitions": sorted(entries, key=lambda entry: entry["model"]),
+        }
+        self.s3.put_object(
+            Bucket=self.s3_bucket_name,
+            Key=manifest_key,
+            Body=json.dumps(manifest, cls=DjangoJSONEncoder, indent=2).encode("utf-8"),
+            **(self.extra_args or {}),
+        )
+
+        ParquetExports.objects.bulk_create(
+            [
+                ParquetExports(
+                    model_label=entry["model"],
+                    last_id=entry["to_id"],
+                    last_updated_at=entry["to"] if entry["changes_tracked"] else None,
+                    row_total=entry["rows"],
+                    s3_key=entry["s3_key"] or "",
+                )
+                for entry in entries
+                if entry["rows"]
+            ]
+        )
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"EXPORT - Manifest uploaded to '{self.s3_bucket_name}/{manifest_key}'"
+            )
+        )
+
+    def export_data_for_model_with_copy(
+        self, queryset, s3_key, s3_bucket_name, extra_args
+    ) -> int:
+        table_name = queryset.model._meta.db_table
+
+        # The Parquet file is streamed to S3 while it is written
+        with tqdm(
+            unit="records",
+            unit_scale=True,
+            desc=f"Exporting records of {table_name}",
+        ) as progress_bar, S3MultipartWriter(
+            self.s3, s3_bucket_name, s3_key, extra_args
+        ) as writer:
+            total = copy_to_parquet(
+                queryset,
+                writer,
+                self.row_group_size,
+                self.compression,
+                progress=progress_bar.update,
+            )
+
+        self.stdout.write(
+            self.style.SUCCESS(f"EXPORT - Data uploaded to '{s3_bucket_name}/{s3_key}'")
+        )
+        return total
+
+    def export_data_for_model(
+        self, queryset, s3_key, s3_bucket_name, extra_args
+    ) -> int:
+        schema, data = self.get_data(queryset, None)
+        # Define the output Parquet file
+        table_name = queryset.model._meta.db_table
+        output_file = os.path.basename(s3_key)
+        total = 0
 
         # Export data for the model
         with tqdm(
@@ -119,6 +359,7 @@ class Command(BaseCommand):
             desc=f"Exporting records of {table_name}",
         ) as progress_bar:
             if data:
+                total += len(data)
                 progress_bar.update(len(data))
                 with pq.ParquetWriter(output_file, schema) as writer:
                     batch = pa.RecordBatch.from_pylist(data, schema=schema)
@@ -128,9 +369,10 @@ class Command(BaseCommand):
                     last_id = data[-1]["id"]
 
                     while has_more:
-                        _, data = self.get_data(model, last_id)
+                        _, data = self.get_data(queryset, last_id)
 
                         if data:
+                            total += len(data)
                             progress_bar.update(len(data))
                             has_more = True
                             last_id = data[-1]["id"]
@@ -145,15 +387,14 @@ class Command(BaseCommand):
                     self.style.SUCCESS(f"EXPORT - Data exported to '{output_file}'")
                 )
 
-                s3_key = f"{s3_folder}/{output_file}"
-
                 # Upload to S3 bucket
                 self.s3.upload_file(
                     output_file,
                     s3_bucket_name,
                     s3_key,
-                    ExtraArgs=extra_args,
+                    ExtraArgs=extra_args or {},
                 )
+                os.remove(output_file)
 
                 self.stdout.write(
                     self.style.SUCCESS(
@@ -161,35 +402,54 @@ class Command(BaseCommand):
                     )
                 )
 
-    def handle(self, *args, **options):
-        last_id = 0
-        has_more = True
+        return total
 
+    def handle(self, *args, **options):
         self.batch_size = options["batch_size"]
         self.s3_uri = options["s3_uri"]
         self.database = options["database"]
+        self.row_group_size = options["row_group_size"]
+        self.compression = options["compression"]
+        workers = options["workers"]
+        self.incremental = options["incremental"]
+        self.export_ts = timezone.now()
         apps_to_export = options["apps"].split(",") if options["apps"] else None
-        extra_args = (
-            json.parse(options["s3_extra_args"]) if options["s3_extra_args"] else None
+        self.extra_args = (
+            json.loads(options["s3_extra_args"]) if options["s3_extra_args"] else None
         )
+        self.engine = options["engine"]
+        if self.engine == "auto":
+            self.engine = (
+                "copy" if connections[self.database].vendor == "postgresql" else "orm"
+            )
 
         self.stdout.write(f"EXPORT - s3_uri      : '{self.s3_uri}'")
         self.stdout.write(f"EXPORT - batch_size  : '{self.batch_size}'")
         self.stdout.write(f"EXPORT - database    : '{self.database}'")
         self.stdout.write(f"EXPORT - apps        : '{apps_to_export}'")
+        self.stdout.write(f"EXPORT - engine      : '{self.engine}'")
+        self.stdout.write(f"EXPORT - workers     : '{workers}'")
+        self.stdout.write(f"EXPORT - incremental : '{self.incremental}'")
 
-        if not apps:
+        if not apps_to_export:
             return
 
         parsed_uri = urlparse(self.s3_uri)
-        s3_bucket_name = parsed_uri.netloc
-        s3_folder = parsed_uri.path.strip("/")
+        self.s3_bucket_name = parsed_uri.netloc
+        self.s3_folder = parsed_uri.path.strip("/")
 
-        self.s3 = boto3.client(
-            "s3",
-            aws_access_key_id=settings.S3_DATA_AWS_SECRET_KEY_ID,
-            aws_secret_access_key=settings.S3_DATA_AWS_SECRET_ACCESS_KEY,
-        )
+        if workers > 1:
+            entries = self.export_models_in_workers(apps_to_export, workers)
+        else:
+            entries = self.export_models(apps_to_export)
+
+        if self.incremental:
+            self.s3 = get_s3_client()
+            self.save_delta_export(entries)
+
+    def export_models(self, apps_to_export) -> List[Dict]:
+        self.s3 = get_s3_client()
+        entries = []
 
         for app_name in apps_to_export:
             self.stdout.write(f"EXPORT - START export data for app: '{app_name}'")
@@ -201,12 +461,9 @@ class Command(BaseCommand):
                     f"EXPORT - START export data for model: '{app_name}.{model._meta.model_name}'"
                 )
                 try:
-                    self.export_data_for_model(
-                        model,
-                        s3_folder,
-                        s3_bucket_name,
-                        extra_args,
-                    )
+                    entry = self.export(model)
+                    if entry:
+                        entries.append(entry)
 
                 except Exception as e:
                     self.stdout.write(
@@ -219,3 +476,41 @@ class Command(BaseCommand):
                 )
 
             self.stdout.write(f"EXPORT - END export data for app: '{app_name}'")
+
+        return entries
+
+    def export_models_in_workers(self, apps_to_export, workers) -> List[Dict]:
+        global _worker_command
+
+        model_labels = [
+            model._meta.label
+            for app_name in apps_to_export
+            for model in apps.get_app_config(app_name).get_models()
+        ]
+
+        # The DB connections must not be shared with the forked worker processes
+        connections.close_all()
+        _worker_command = self
+        entries = []
+        try:
+            with multiprocessing.get_context("fork").Pool(workers) as pool:
+                for model_label, entry, error in pool.imap_unordered(
+                    export_model_in_worker, model_labels
+                ):
+                    if error:
+                        self.stdout.write(
+                            self.style.ERROR(
+                                f"EXPORT - Error when exporting data for model: '{model_label}'"
+                            )
+                        )
+                        self.stdout.write(self.style.ERROR(error))
+                    else:
+                        if entry:
+                            entries.append(entry)
+                        self.stdout.write(
+                            f"EXPORT - END export data for model: '{model_label}'"
+                        )
+        finally:
+            _worker_command = None
+
+        return entries
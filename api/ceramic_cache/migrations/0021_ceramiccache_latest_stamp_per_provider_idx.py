@@ -0,0 +1,21 @@
+# Generated by Django 4.2.6 on 2026-10-18 05:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ceramic_cache", "0020_alter_ceramiccache_compose_db_save_status_and_more"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="ceramiccache",
+            index=models.Index(
+                condition=models.Q(("deleted_at__isnull", True)),
+                fields=["address", "provider", "-updated_at"],
+                name="latest_stamp_per_provider_idx",
+            ),
+        ),
+    ]
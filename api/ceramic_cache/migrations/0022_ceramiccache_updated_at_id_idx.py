@@ -0,0 +1,17 @@
+# Generated by Django 4.2.6 on 2026-10-18 05:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ceramic_cache", "0021_ceramiccache_latest_stamp_per_provider_idx"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="ceramiccache",
+            index=models.Index(fields=["updated_at", "id"], name="updated_at_id_idx"),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 4.2.6 on 2026-10-18 05:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ceramic_cache", "0022_ceramiccache_updated_at_id_idx"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ParquetExports",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("model_label", models.CharField(db_index=True, max_length=100)),
+                ("last_export_ts", models.DateTimeField(auto_now_add=True)),
+                (
+                    "last_id",
+                    models.BigIntegerField(
+                        blank=True,
+                        help_text="Highest id exported, for models exported by id",
+                        null=True,
+                    ),
+                ),
+                (
+                    "last_updated_at",
+                    models.DateTimeField(
+                        blank=True,
+                        help_text="Highest updated_at exported, for models exported by updated_at",
+                        null=True,
+                    ),
+                ),
+                ("row_total", models.IntegerField(default=0)),
+                ("s3_key", models.CharField(blank=True, default="", max_length=1024)),
+            ],
+        ),
+    ]
@@ -84,12 +84,45 @@ class CeramicCache(models.Model):
             ),
         ]
 
+        indexes = [
+            # Used to load the latest stamp per provider for an address (see `aget_passport`)
+            models.Index(
+                fields=["address", "provider", "-updated_at"],
+                name="latest_stamp_per_provider_idx",
+                condition=Q(deleted_at__isnull=True),
+            ),
+            # Keyset cursor of the incremental stamp exports (see `dump_stamp_data`)
+            models.Index(fields=["updated_at", "id"], name="updated_at_id_idx"),
+        ]
+
 
 class StampExports(models.Model):
     last_export_ts = models.DateTimeField(auto_now_add=True)
     stamp_total = models.IntegerField(default=0)
 
 
+class ParquetExports(models.Model):
+    """
+    One record per model and incremental Parquet export (see `scorer_dump_data_parquet --incremental`).
+    The latest record of a model is the high-water mark of the next export of that model.
+    """
+
+    model_label = models.CharField(max_length=100, db_index=True)
+    last_export_ts = models.DateTimeField(auto_now_add=True)
+    last_id = models.BigIntegerField(
+        null=True,
+        blank=True,
+        help_text="Highest id exported, for models exported by id",
+    )
+    last_updated_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text="Highest updated_at exported, for models exported by updated_at",
+    )
+    row_total = models.IntegerField(default=0)
+    s3_key = models.CharField(max_length=1024, blank=True, default="")
+
+
 class CeramicCacheLegacy(models.Model):
     address = EthAddressField(null=True, blank=False, max_length=100, db_index=True)
     provider = models.CharField(
@@ -0,0 +1,232 @@
+"""
+Parquet export engine for PostgreSQL.
+
+The rows of a queryset are streamed with `COPY (SELECT ...) TO STDOUT` in CSV format, parsed by the
+Arrow CSV reader and written as Parquet row groups. No Python object is created per row or per value.
+"""
+
+import os
+import threading
+from typing import BinaryIO, Callable, Dict, Optional
+
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+from django.db import connections, models
+from django.db.models import F, Func
+from django.db.models.functions import Cast
+
+# The following mapping will map django field types to pyarrow types
+pa_schema_map: Dict[str, Dict] = {
+    "AutoField": {"pa_type": pa.int64()},
+    "BigAutoField": {"pa_type": pa.int64()},
+    # "ForeignKey": {"pa_type": pa.int64()},
+    # "OneToOneField": {"pa_type": pa.int64()},
+    "CharField": {"pa_type": pa.string()},
+    "JSONField": {"pa_type": pa.string(), "map_value": str},
+    "DateTimeField": {"pa_type": pa.timestamp("ms")},
+    "IntegerField": {"pa_type": pa.int64()},
+    "BooleanField": {"pa_type": pa.bool_()},
+    "DecimalField": {"pa_type": pa.decimal256(18, 9)},
+}
+
+# Size of the blocks of CSV data parsed at once by the Arrow CSV reader
+CSV_BLOCK_SIZE = 8 * 1024 * 1024
+
+
+def get_field_type(field: models.Field) -> str:
+    """
+    Return the internal type of the field, or of the target field for relation fields
+    """
+    if field.is_relation:
+        return field.target_field.get_internal_type()
+    return field.get_internal_type()
+
+
+def get_pa_type(field: models.Field) -> pa.DataType:
+    """
+    Return the type of the column of the field. Unmapped field types are exported as strings.
+    Decimals keep the precision and scale of the field, the ones too large for decimal256 are exported as strings.
+    """
+    field_type = get_field_type(field)
+    if field_type == "DecimalField":
+        target_field = field.target_field if field.is_relation else field
+        if target_field.max_digits > 76:
+            return pa.string()
+        return pa.decimal256(target_field.max_digits, target_field.decimal_places)
+    return pa_schema_map.get(field_type, {"pa_type": pa.string()})["pa_type"]
+
+
+def get_pa_schema(model) -> pa.Schema:
+    """
+    Return the schema of the exported data: one column per concrete field. For relation fields
+    the column is the id of the related object (`fieldname + "_id"`).
+    """
+    return pa.schema(
+        [(field.attname, get_pa_type(field)) for field in model._meta.fields]
+    )
+
+
+def get_read_type(field: models.Field, pa_type: pa.DataType) -> pa.DataType:
+    """
+    Return the type used to parse the CSV column of the field. The CSV reader does not support decimal256
+    and timestamps with a precision lower than the one of the data, these are cast to the schema afterwards.
+    """
+    if pa.types.is_decimal(pa_type):
+        if pa_type.precision <= 38:
+            return pa.decimal128(pa_type.precision, pa_type.scale)
+        # Too large for decimal128, parsed from the text representation
+        return pa.string()
+    if get_field_type(field) == "DateTimeField":
+        return pa.timestamp("us")
+    return pa_type
+
+
+def get_copy_sql(queryset) -> str:
+    """
+    Return the COPY statement that outputs the rows of the queryset (ordered by pk) as CSV,
+    with one column per field of the model (see `get_pa_schema`)
+    """
+    columns = {}
+    for idx, field in enumerate(queryset.model._meta.fields):
+        expression = F(field.attname)
+        field_type = get_field_type(field)
+        if field_type == "DateTimeField":
+            # Output the timestamps in UTC, without time zone
+            expression = Func(
+                expression,
+                template="(%(expressions)s AT TIME ZONE 'UTC')",
+                output_field=models.DateTimeField(),
+            )
+        elif field_type == "JSONField":
+            expression = Cast(expression, output_field=models.TextField())
+        columns[f"column_{idx}"] = expression
+
+    queryset = queryset.annotate(**columns).order_by("pk").values_list(*columns)
+    sql, params = queryset.query.get_compiler(queryset.db).as_sql()
+    with connections[queryset.db].cursor() as cursor:
+        select = cursor.mogrify(sql, params).decode("utf-8")
+
+    return f"COPY ({select}) TO STDOUT WITH (FORMAT csv)"
+
+
+def copy_to_parquet(
+    queryset,
+    sink: BinaryIO,
+    row_group_size: int,
+    compression: str = "snappy",
+    progress: Optional[Callable[[int], None]] = None,
+) -> int:
+    """
+    Export the rows of the queryset to `sink` in Parquet format, in row groups of `row_group_size` rows.
+    The output of COPY is streamed through a pipe to the CSV reader, COPY runs in a separate thread.
+
+    Returns the number of rows exported.
+    """
+    schema = get_pa_schema(queryset.model)
+    read_schema = pa.schema(
+        [
+            (name, get_read_type(field, schema.field(name).type))
+            for name, field in zip(schema.names, queryset.model._meta.fields)
+        ]
+    )
+    copy_sql = get_copy_sql(queryset)
+
+    read_fd, write_fd = os.pipe()
+    copy_errors = []
+
+    with connections[queryset.db].cursor() as cursor:
+
+        def copy():
+            try:
+                with os.fdopen(write_fd, "wb") as pipe:
+                    cursor.copy_expert(copy_sql, pipe)
+            except Exception as e:
+                copy_errors.append(e)
+
+        copy_thread = threading.Thread(target=copy, name="copy-to-parquet")
+        copy_thread.start()
+        try:
+            # Closing the read end of the pipe on error stops the COPY
+            with os.fdopen(read_fd, "rb") as pipe:
+                total = write_row_groups(
+                    pipe,
+                    read_schema,
+                    schema,
+                    sink,
+                    row_group_size,
+                    compression,
+                    progress,
+                )
+        finally:
+            copy_thread.join()
+
+    if copy_errors:
+        raise copy_errors[0]
+
+    return total
+
+
+def write_row_groups(
+    csv_stream: BinaryIO,
+    read_schema: pa.Schema,
+    schema: pa.Schema,
+    sink: BinaryIO,
+    row_group_size: int,
+    compression: str,
+    progress: Optional[Callable[[int], None]] = None,
+) -> int:
+    total = 0
+    with pq.ParquetWriter(sink, schema, compression=compression) as writer:
+        # An empty CSV stream cannot be opened, the Parquet file only has the schema then
+        if not csv_stream.peek(1):
+            return total
+
+        reader = pa_csv.open_csv(
+            csv_stream,
+            read_options=pa_csv.ReadOptions(
+                column_names=read_schema.names, block_size=CSV_BLOCK_SIZE
+            ),
+            convert_options=pa_csv.ConvertOptions(
+                column_types=read_schema,
+                # Booleans are output as t / f by PostgreSQL
+                true_values=["t"],
+                false_values=["f"],
+                # NULL is output as an unquoted empty value, and an empty string as ""
+                strings_can_be_null=True,
+                quoted_strings_can_be_null=False,
+            ),
+        )
+
+        pending = []
+        pending_rows = 0
+        for batch in reader:
+            total += batch.num_rows
+            if progress:
+                progress(batch.num_rows)
+
+            pending.append(batch)
+            pending_rows += batch.num_rows
+            if pending_rows < row_group_size:
+                continue
+
+            # Write full row groups, and keep the remaining rows for the next one
+            table = pa.Table.from_batches(pending)
+            while table.num_rows >= row_group_size:
+                writer.write_table(
+                    table.slice(0, row_group_size).cast(schema, safe=False),
+                    row_group_size=row_group_size,
+                )
+                table = table.slice(row_group_size)
+            pending = table.to_batches()
+            pending_rows = table.num_rows
+
+        if pending_rows:
+            writer.write_table(
+                pa.Table.from_batches(pending, schema=read_schema).cast(
+                    schema, safe=False
+                ),
+                row_group_size=row_group_size,
+            )
+
+    return total
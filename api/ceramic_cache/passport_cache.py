@@ -0,0 +1,147 @@
+"""
+Read-through cache of the current (non-deleted) stamps of an address.
+
+The stamps are stored in the django cache (redis), keyed by the address and by a per-address
+version counter. The handlers writing to the ceramic cache increment the version of the address
+(see `invalidate_passport_cache`), so that the next read loads the stamps from the DB again.
+The entries of the previous versions are not deleted, they expire after PASSPORT_CACHE_TTL.
+
+If the django cache is not available, the stamps are loaded from the DB.
+"""
+
+import time
+from datetime import datetime
+from typing import Iterable, List, NamedTuple, Optional, Tuple
+
+import api_logging as logging
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import CeramicCache
+
+log = logging.getLogger(__name__)
+
+
+class CurrentStamp(NamedTuple):
+    pk: int
+    address: str
+    provider: str
+    stamp: dict
+    type: int
+    updated_at: datetime
+
+
+def get_passport_version_key(address: str) -> str:
+    return f"passport_version:{address}"
+
+
+def get_passport_key(address: str, version: int) -> str:
+    return f"passport:{address}:{version}"
+
+
+def load_current_stamps(address: str) -> List[CurrentStamp]:
+    """
+    Load the current stamps of the address from the DB, ordered by id
+    """
+    return [
+        CurrentStamp(*row)
+        for row in CeramicCache.objects.filter(address=address, deleted_at__isnull=True)
+        .order_by("id")
+        .values_list("id", "address", "provider", "stamp", "type", "updated_at")
+    ]
+
+
+def get_passport_version(address: str) -> Optional[int]:
+    key = get_passport_version_key(address)
+    version = cache.get(key)
+    if version is None:
+        # The counter starts from the current time, so that the entries cached for
+        # a counter that has been evicted are not used again
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def get_current_stamps(address: str) -> List[CurrentStamp]:
+    """
+    Return the current stamps of the address (ordered by id), from the cache if enabled
+    """
+    address = address.lower()
+    if not settings.PASSPORT_CACHE_TTL:
+        return load_current_stamps(address)
+
+    try:
+        version = get_passport_version(address)
+        stamps = (
+            cache.get(get_passport_key(address, version))
+            if version is not None
+            else None
+        )
+    except Exception:
+        log.warning("Failed to read the passport from cache", exc_info=True)
+        return load_current_stamps(address)
+
+    if stamps is None:
+        # The version has been read before loading the stamps, so that a concurrent
+        # write will invalidate what we are about to cache
+        stamps = load_current_stamps(address)
+        if version is not None:
+            try:
+                cache.set(
+                    get_passport_key(address, version),
+                    stamps,
+                    settings.PASSPORT_CACHE_TTL,
+                )
+            except Exception:
+                log.warning("Failed to write the passport to cache", exc_info=True)
+
+    return stamps
+
+
+aget_current_stamps = sync_to_async(get_current_stamps)
+
+
+def invalidate_passport_cache(addresses: Iterable[str]):
+    """
+    Invalidate the cached stamps of the addresses, to be called after their stamps have been changed
+    """
+    if not settings.PASSPORT_CACHE_TTL:
+        return
+
+    for address in {address.lower() for address in addresses}:
+        key = get_passport_version_key(address)
+        try:
+            try:
+                cache.incr(key)
+            except ValueError:
+                # The counter does not exist (yet)
+                cache.set(key, time.time_ns(), timeout=None)
+        except Exception:
+            log.error(
+                "Failed to invalidate the cached passport for '%s'",
+                address,
+                exc_info=True,
+            )
+
+
+def paginate_current_stamps(
+    stamps: List[CurrentStamp], direction: Optional[str], id_: Optional[int], limit: int
+) -> Tuple[List[CurrentStamp], bool, bool]:
+    """
+    Return a page of the stamps in descending id order (like the `/stamps/{address}` API),
+    and whether there are more stamps after and before this page
+    """
+    stamps = stamps[::-1]
+
+    if direction == "next":
+        page = [stamp for stamp in stamps if stamp.pk < id_][:limit]
+    elif direction == "prev":
+        page = [stamp for stamp in stamps if stamp.pk > id_][-limit:]
+    else:
+        page = stamps[:limit]
+
+    if not page:
+        return page, False, False
+
+    return page, page[-1].pk > stamps[-1].pk, page[0].pk < stamps[0].pk
@@ -0,0 +1,64 @@
+"""
+Deferred rescoring of the addresses whose stamps have been changed in the ceramic cache.
+
+When `CERAMIC_CACHE_DEFERRED_RESCORING` is enabled, the stamp write handlers do not rescore the
+passport inline. They queue the `rescore_passport` task on the celery broker instead, to run after
+`CERAMIC_CACHE_RESCORE_DEBOUNCE_SECONDS`.
+Each write stores a new debounce token for the address in redis, and a task only rescores the
+address if its token is still the latest one. A burst of writes for the same address (like the PATCH
+requests sent while claiming stamps), received by any process, is then coalesced into the rescore
+queued by the last write.
+"""
+
+import uuid
+
+import api_logging as logging
+from celery import shared_task
+from django.conf import settings
+from django.core.cache import cache
+
+log = logging.getLogger(__name__)
+
+# The debounce token outlives the countdown of the task, in case the workers are behind.
+# If it is missing anyway, the task rescores the address.
+RESCORE_DEBOUNCE_TIMEOUT = 60 * 60
+
+
+def get_rescore_debounce_key(address: str) -> str:
+    return f"ceramic_cache_rescore:{address.lower()}"
+
+
+def schedule_rescore(address: str):
+    """
+    Queue a rescore of `address`, superseding the rescores already queued for it.
+    Raises if the task could not be queued.
+    """
+    key = get_rescore_debounce_key(address)
+    token = uuid.uuid4().hex
+    cache.set(key, token, timeout=RESCORE_DEBOUNCE_TIMEOUT)
+    try:
+        rescore_passport.apply_async(
+            args=[address, token],
+            countdown=settings.CERAMIC_CACHE_RESCORE_DEBOUNCE_SECONDS,
+        )
+    except Exception:
+        # The rescores queued previously must not wait for this one
+        cache.delete(key)
+        raise
+
+
+@shared_task
+def rescore_passport(address: str, token: str):
+    try:
+        latest_token = cache.get(get_rescore_debounce_key(address))
+    except Exception:
+        log.warning("Failed to read the rescore debounce token", exc_info=True)
+        latest_token = None
+
+    if latest_token is not None and latest_token != token:
+        # A later write has queued another rescore
+        return
+
+    from .api.v1 import get_detailed_score_response_for_address
+
+    get_detailed_score_response_for_address(address)
@@ -1,6 +1,11 @@
+import shutil
+import uuid
+from pathlib import Path
+
 import pytest
 from django.conf import settings
 from scorer.test.conftest import (
+    api_analytics_in_request,
     api_key,
     sample_address,
     sample_provider,
@@ -32,6 +37,74 @@ def sample_stamps():
     ]
 
 
+class LocalS3:
+    """
+    Stand-in for the boto3 S3 client, implementing the calls used by the exports.
+    The objects are stored as files in `root`, so that they can be uploaded by worker processes too.
+    """
+
+    def __init__(self, root: Path):
+        self.root = root
+        self.uploads_root = root / ".multipart_uploads"
+        self.uploads_root.mkdir(parents=True, exist_ok=True)
+
+    def object_path(self, bucket, key) -> Path:
+        return self.root / "objects" / str(bucket) / key
+
+    @property
+    def objects(self):
+        objects = {}
+        for path in (self.root / "objects").rglob("*"):
+            if path.is_file():
+                bucket, *key = path.relative_to(self.root / "objects").parts
+                objects[(bucket, "/".join(key))] = path.read_bytes()
+        return objects
+
+    @property
+    def multipart_uploads(self):
+        return {path.name: path for path in self.uploads_root.iterdir()}
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        path = self.object_path(Bucket, Key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(bytes(Body))
+
+    def upload_file(self, Filename, Bucket, Key, ExtraArgs=None):
+        self.put_object(Bucket, Key, Path(Filename).read_bytes())
+
+    def delete_object(self, Bucket, Key):
+        self.object_path(Bucket, Key).unlink()
+
+    def create_multipart_upload(self, Bucket, Key, **kwargs):
+        upload_id = uuid.uuid4().hex
+        (self.uploads_root / upload_id).mkdir()
+        return {"UploadId": upload_id}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body):
+        (self.uploads_root / UploadId / str(PartNumber)).write_bytes(bytes(Body))
+        return {"ETag": f'"{UploadId}-{PartNumber}"'}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        upload_path = self.uploads_root / UploadId
+        self.put_object(
+            Bucket,
+            Key,
+            b"".join(
+                (upload_path / str(part["PartNumber"])).read_bytes()
+                for part in MultipartUpload["Parts"]
+            ),
+        )
+        shutil.rmtree(upload_path)
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId):
+        shutil.rmtree(self.uploads_root / UploadId)
+
+
+@pytest.fixture
+def local_s3(tmp_path):
+    return LocalS3(tmp_path / "s3")
+
+
 def pytest_configure():
     try:
         settings.CERAMIC_CACHE_API_KEY = "supersecret"
@@ -4,6 +4,7 @@ from datetime import datetime
 import pytest
 from ceramic_cache.api.v1 import get_address_from_did
 from ceramic_cache.models import CeramicCache
+from django.conf import settings
 from django.test import Client
 
 pytestmark = pytest.mark.django_db
@@ -386,3 +387,49 @@ class TestComposeDBBulkStampUpdates:
         assert (
             CeramicCache.objects.filter(compose_db_stream_id="stream-id-1").count() == 1
         )
+
+    def test_bulk_update_compose_db_status_in_one_statement(
+        self, sample_address, sample_token, django_assert_num_queries
+    ):
+        stamps = CeramicCache.objects.bulk_create(
+            [
+                CeramicCache(
+                    address=sample_address,
+                    provider=f"Provider{i}",
+                    stamp={"stamp": i},
+                    compose_db_save_status=CeramicCache.ComposeDBSaveStatus.PENDING,
+                )
+                for i in range(settings.MAX_BULK_CACHE_SIZE)
+            ]
+        )
+
+        bulk_payload = [
+            {
+                "id": stamp.id,
+                "compose_db_save_status": "saved",
+                "compose_db_stream_id": f"stream-id-{stamp.id}",
+            }
+            for stamp in stamps[:-1]
+        ]
+        # When an id is repeated, the first status update is applied
+        bulk_payload.append({"id": stamps[0].id, "compose_db_save_status": "failed"})
+
+        with django_assert_num_queries(1):
+            response = client.patch(
+                f"{self.base_url}/stamps/bulk/meta/compose-db",
+                json.dumps(bulk_payload),
+                content_type="application/json",
+                **{"HTTP_AUTHORIZATION": f"Bearer {sample_token}"},
+            )
+
+        assert response.status_code == 200
+        assert sorted(response.json()["updated"]) == [stamp.id for stamp in stamps[:-1]]
+
+        updated_stamps = CeramicCache.objects.filter(compose_db_save_status="saved")
+        assert updated_stamps.count() == len(stamps) - 1
+        for stamp in updated_stamps:
+            assert stamp.compose_db_stream_id == f"stream-id-{stamp.id}"
+        assert (
+            CeramicCache.objects.get(id=stamps[-1].id).compose_db_save_status
+            == CeramicCache.ComposeDBSaveStatus.PENDING
+        )
@@ -0,0 +1,154 @@
+import json
+from unittest.mock import patch
+
+import pytest
+from ceramic_cache.tasks import rescore_passport
+from django.core.cache import cache
+from django.test import Client
+from registry.api.schema import DetailedScoreResponse
+from registry.models import Passport, Score
+
+pytestmark = pytest.mark.django_db
+
+client = Client()
+
+
+@pytest.fixture
+def deferred_rescoring(settings):
+    settings.CERAMIC_CACHE_DEFERRED_RESCORING = True
+    settings.CERAMIC_CACHE_RESCORE_DEBOUNCE_SECONDS = 3
+    settings.CACHES = {
+        "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+    }
+    cache.clear()
+
+
+@pytest.fixture
+def apply_async():
+    with patch("ceramic_cache.tasks.rescore_passport.apply_async") as apply_async:
+        yield apply_async
+
+
+def run_queued_tasks(apply_async):
+    for call in apply_async.call_args_list:
+        rescore_passport(*call.kwargs["args"])
+
+
+class TestDeferredRescoring:
+    base_url = "/ceramic-cache"
+
+    def patch_stamps(self, sample_token, payload):
+        return client.patch(
+            f"{self.base_url}/stamps/bulk",
+            json.dumps(payload),
+            content_type="application/json",
+            **{"HTTP_AUTHORIZATION": f"Bearer {sample_token}"},
+        )
+
+    def test_writes_are_coalesced(
+        self,
+        deferred_rescoring,
+        apply_async,
+        sample_providers,
+        sample_address,
+        sample_stamps,
+        sample_token,
+        ui_scorer,
+    ):
+        with patch("ceramic_cache.api.v1.ahandle_submit_passport") as submit_passport:
+            for provider, stamp in zip(sample_providers, sample_stamps):
+                response = self.patch_stamps(
+                    sample_token, [{"provider": provider, "stamp": stamp}]
+                )
+
+                assert response.status_code == 200
+                assert response.json()["score"]["status"] == Score.Status.PROCESSING
+                assert response.json()["score"]["address"] == sample_address.lower()
+
+            assert len(response.json()["stamps"]) == len(sample_providers)
+            # Nothing is scored inline
+            submit_passport.assert_not_called()
+
+        assert apply_async.call_count == len(sample_providers)
+        assert apply_async.call_args.kwargs["countdown"] == 3
+
+        with patch(
+            "ceramic_cache.api.v1.get_detailed_score_response_for_address"
+        ) as rescore:
+            run_queued_tasks(apply_async)
+
+        # Only the task queued by the last write rescores the address
+        rescore.assert_called_once_with(sample_address.lower())
+
+    def test_existing_score_is_returned_as_processing(
+        self,
+        deferred_rescoring,
+        apply_async,
+        sample_providers,
+        sample_address,
+        sample_stamps,
+        sample_token,
+        ui_scorer,
+        scorer_community_with_binary_scorer,
+    ):
+        passport = Passport.objects.create(
+            address=sample_address.lower(),
+            community=scorer_community_with_binary_scorer,
+        )
+        Score.objects.create(passport=passport, score=1, status=Score.Status.DONE)
+
+        response = self.patch_stamps(
+            sample_token, [{"provider": sample_providers[0], "stamp": sample_stamps[0]}]
+        )
+
+        assert response.status_code == 200
+        score = response.json()["score"]
+        assert score["status"] == Score.Status.PROCESSING
+        assert score["score"] == "1.000000000"
+        assert Score.objects.get(passport=passport).status == Score.Status.PROCESSING
+        apply_async.assert_called_once()
+
+    def test_inline_rescore_if_task_cannot_be_queued(
+        self,
+        deferred_rescoring,
+        apply_async,
+        sample_providers,
+        sample_address,
+        sample_stamps,
+        sample_token,
+        ui_scorer,
+        scorer_community_with_binary_scorer,
+    ):
+        apply_async.side_effect = ConnectionError("The broker is down")
+        passport = Passport.objects.create(
+            address=sample_address.lower(),
+            community=scorer_community_with_binary_scorer,
+        )
+        score = Score.objects.create(
+            passport=passport, score=1, status=Score.Status.DONE
+        )
+
+        with patch(
+            "ceramic_cache.api.v1.get_detailed_score_response_for_address",
+            return_value=DetailedScoreResponse.from_orm(score),
+        ) as rescore:
+            response = self.patch_stamps(
+                sample_token,
+                [{"provider": sample_providers[0], "stamp": sample_stamps[0]}],
+            )
+
+        assert response.status_code == 200
+        rescore.assert_called_once_with(sample_address.lower())
+        # The score is not left in PROCESSING
+        assert Score.objects.get(passport=passport).status == Score.Status.DONE
+
+
+class TestRescorePassportTask:
+    def test_rescore_without_debounce_token(self, deferred_rescoring):
+        # e.g. the token has been evicted from the cache
+        with patch(
+            "ceramic_cache.api.v1.get_detailed_score_response_for_address"
+        ) as rescore:
+            rescore_passport("0x1", "token")
+
+        rescore.assert_called_once_with("0x1")
@@ -0,0 +1,128 @@
+import gzip
+import io
+import json
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+
+import pytest
+import zstandard
+from ceramic_cache.export import S3MultipartWriter
+from ceramic_cache.models import CeramicCache, StampExports
+from django.core.management import call_command
+
+pytestmark = pytest.mark.django_db
+
+bucket = "test-bucket"
+
+
+@pytest.fixture
+def dump_settings(settings, local_s3):
+    settings.S3_WEEKLY_BACKUP_BUCKET_NAME = bucket
+    with patch(
+        "ceramic_cache.management.commands.dump_stamp_data.get_s3_client",
+        return_value=local_s3,
+    ):
+        yield
+
+
+def create_stamps(providers, updated_at):
+    CeramicCache.objects.bulk_create(
+        [
+            CeramicCache(
+                address="0x123", provider=provider, stamp={"provider": provider}
+            )
+            for provider in providers
+        ]
+    )
+    # updated_at is set to now on save (auto_now)
+    CeramicCache.objects.filter(provider__in=providers).update(updated_at=updated_at)
+
+
+def read_dump(local_s3):
+    ((bucket_name, key), data) = local_s3.objects.popitem()
+    local_s3.delete_object(Bucket=bucket_name, Key=key)
+    assert bucket_name == bucket
+    assert key.endswith(".jsonl.gz")
+    return [json.loads(line) for line in gzip.decompress(data).splitlines()]
+
+
+class TestDumpStampData:
+    def test_export_with_shared_timestamps(self, dump_settings, local_s3):
+        updated_at = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        providers = [f"Provider{i}" for i in range(5)]
+        # More stamps than the chunk size share the same updated_at
+        create_stamps(providers, updated_at)
+
+        call_command("dump_stamp_data", chunk_size=2, database="default")
+
+        assert read_dump(local_s3) == [
+            {"stamp": {"provider": provider}} for provider in providers
+        ]
+        export = StampExports.objects.get()
+        assert export.last_export_ts == updated_at
+        assert export.stamp_total == 5
+
+        # Only the stamps updated since the last export are exported next time
+        create_stamps(["Updated"], updated_at + timedelta(seconds=1))
+
+        call_command("dump_stamp_data", chunk_size=2, database="default")
+
+        assert read_dump(local_s3) == [{"stamp": {"provider": "Updated"}}]
+        assert StampExports.objects.count() == 2
+
+    def test_zstd_compression(self, dump_settings, local_s3):
+        create_stamps(["Provider0"], datetime(2024, 1, 1, tzinfo=timezone.utc))
+
+        call_command("dump_stamp_data", compression="zstd", database="default")
+
+        ((_, key), data) = local_s3.objects.popitem()
+        assert key.endswith(".jsonl.zst")
+        lines = (
+            zstandard.ZstdDecompressor()
+            .stream_reader(io.BytesIO(data), read_across_frames=True)
+            .read()
+            .splitlines()
+        )
+        assert [json.loads(line) for line in lines] == [
+            {"stamp": {"provider": "Provider0"}}
+        ]
+
+    @pytest.mark.django_db(transaction=True)
+    def test_parallel_export(self, dump_settings, local_s3):
+        start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        for i in range(10):
+            create_stamps([f"Provider{i}"], start + timedelta(days=i))
+
+        call_command("dump_stamp_data", chunk_size=2, workers=2, database="default")
+
+        # The segments are written in order
+        assert read_dump(local_s3) == [
+            {"stamp": {"provider": f"Provider{i}"}} for i in range(10)
+        ]
+        assert StampExports.objects.get().stamp_total == 10
+
+
+class TestS3MultipartWriter:
+    def test_multipart_upload(self, local_s3):
+        with S3MultipartWriter(local_s3, bucket, "key", part_size=4) as writer:
+            writer.write(b"0123456789")
+
+        assert local_s3.objects[(bucket, "key")] == b"0123456789"
+        assert local_s3.multipart_uploads == {}
+
+    def test_small_object(self, local_s3):
+        with patch.object(local_s3, "create_multipart_upload") as create_upload:
+            with S3MultipartWriter(local_s3, bucket, "key", part_size=4) as writer:
+                writer.write(b"012")
+
+        create_upload.assert_not_called()
+        assert local_s3.objects[(bucket, "key")] == b"012"
+
+    def test_abort_on_error(self, local_s3):
+        with pytest.raises(ValueError):
+            with S3MultipartWriter(local_s3, bucket, "key", part_size=4) as writer:
+                writer.write(b"0123456789")
+                raise ValueError()
+
+        assert local_s3.objects == {}
+        assert local_s3.multipart_uploads == {}
@@ -0,0 +1,162 @@
+import json
+from unittest.mock import patch
+
+import pytest
+from ceramic_cache.models import CeramicCache
+from ceramic_cache.passport_cache import (
+    CurrentStamp,
+    get_current_stamps,
+    invalidate_passport_cache,
+    paginate_current_stamps,
+)
+from django.core.cache import cache
+from django.test import Client
+from reader.passport_reader import get_passport
+
+pytestmark = pytest.mark.django_db
+
+client = Client()
+
+
+@pytest.fixture
+def passport_cache(settings):
+    settings.CACHES = {
+        "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+    }
+    settings.PASSPORT_CACHE_TTL = 60
+    # The local memory caches are shared within the process
+    cache.clear()
+
+
+def create_stamp(address, provider, stamp, **kwargs):
+    return CeramicCache.objects.create(
+        address=address, provider=provider, stamp=stamp, **kwargs
+    )
+
+
+class TestPassportCache:
+    def test_reads_are_cached(
+        self, passport_cache, sample_address, django_assert_num_queries
+    ):
+        create_stamp(sample_address, "Google", {"stamp": 1})
+        create_stamp(
+            sample_address,
+            "Github",
+            {"stamp": 2},
+            deleted_at="2021-01-01T00:00:00.000Z",
+        )
+
+        with django_assert_num_queries(1):
+            stamps = get_current_stamps(sample_address)
+
+        with django_assert_num_queries(0):
+            assert get_current_stamps(sample_address.upper()) == stamps
+
+        assert [(s.provider, s.stamp) for s in stamps] == [("Google", {"stamp": 1})]
+
+    def test_invalidate(self, passport_cache, sample_address):
+        create_stamp(sample_address, "Google", {"stamp": 1})
+        get_current_stamps(sample_address)
+
+        create_stamp(sample_address, "Github", {"stamp": 2})
+        assert len(get_current_stamps(sample_address)) == 1
+
+        invalidate_passport_cache([sample_address])
+        assert len(get_current_stamps(sample_address)) == 2
+
+    def test_cache_failures_fall_back_to_db(self, passport_cache, sample_address):
+        create_stamp(sample_address, "Google", {"stamp": 1})
+
+        with patch(
+            "ceramic_cache.passport_cache.cache.get", side_effect=Exception("down")
+        ):
+            assert len(get_current_stamps(sample_address)) == 1
+
+    def test_latest_stamp_per_provider(self, passport_cache, sample_address):
+        create_stamp(
+            sample_address, "Google", {"stamp": 1}, type=CeramicCache.StampType.V1
+        )
+        create_stamp(
+            sample_address, "Google", {"stamp": 2}, type=CeramicCache.StampType.V2
+        )
+
+        assert get_passport(sample_address)["stamps"] == [
+            {"provider": "Google", "credential": {"stamp": 2}}
+        ]
+
+    def test_write_handlers_invalidate(
+        self,
+        passport_cache,
+        sample_providers,
+        sample_address,
+        sample_stamps,
+        sample_token,
+        ui_scorer,
+    ):
+        def get_stamps():
+            response = client.get(f"/ceramic-cache/stamp?address={sample_address}")
+            assert response.status_code == 200
+            return {s["provider"]: s["stamp"] for s in response.json()["stamps"]}
+
+        assert get_stamps() == {}
+
+        response = client.post(
+            "/ceramic-cache/stamps/bulk",
+            json.dumps(
+                [
+                    {"provider": provider, "stamp": stamp}
+                    for provider, stamp in zip(sample_providers, sample_stamps)
+                ]
+            ),
+            content_type="application/json",
+            HTTP_AUTHORIZATION=f"Bearer {sample_token}",
+        )
+        assert response.status_code == 201
+        assert get_stamps() == dict(zip(sample_providers, sample_stamps))
+
+        response = client.patch(
+            "/ceramic-cache/stamps/bulk",
+            json.dumps(
+                [
+                    {"provider": sample_providers[0], "stamp": {"updated": True}},
+                    {"provider": sample_providers[1]},
+                ]
+            ),
+            content_type="application/json",
+            HTTP_AUTHORIZATION=f"Bearer {sample_token}",
+        )
+        assert response.status_code == 200
+        assert get_stamps() == {
+            sample_providers[0]: {"updated": True},
+            sample_providers[2]: sample_stamps[2],
+        }
+
+        response = client.delete(
+            "/ceramic-cache/stamps/bulk",
+            json.dumps([{"provider": sample_providers[0]}]),
+            content_type="application/json",
+            HTTP_AUTHORIZATION=f"Bearer {sample_token}",
+        )
+        assert response.status_code == 200
+        assert get_stamps() == {sample_providers[2]: sample_stamps[2]}
+
+
+class TestPaginateCurrentStamps:
+    stamps = [
+        CurrentStamp(pk, "0x1", f"Provider{pk}", {}, 1, None) for pk in range(1, 6)
+    ]
+
+    def page(self, direction, id_, limit):
+        page, has_more, has_prev = paginate_current_stamps(
+            self.stamps, direction, id_, limit
+        )
+        return [stamp.pk for stamp in page], has_more, has_prev
+
+    def test_paginate(self):
+        assert self.page(None, None, 2) == ([5, 4], True, False)
+        assert self.page("next", 4, 2) == ([3, 2], True, True)
+        assert self.page("next", 2, 2) == ([1], False, True)
+        assert self.page("prev", 1, 2) == ([3, 2], True, True)
+        assert self.page("prev", 3, 2) == ([5, 4], True, False)
+        assert self.page(None, None, 10) == ([5, 4, 3, 2, 1], False, False)
+        assert self.page("next", 1, 2) == ([], False, False)
@@ -0,0 +1,108 @@
+import gzip
+import json
+from decimal import Decimal
+from unittest.mock import patch
+
+import pytest
+from ceramic_cache.models import CeramicCache
+from django.core.management import call_command
+from registry.models import Passport, Score
+
+pytestmark = pytest.mark.django_db
+
+bucket = "test-bucket"
+
+
+@pytest.fixture
+def dump_s3(local_s3, tmp_path, monkeypatch):
+    # The summary file is written to the working directory before being uploaded
+    monkeypatch.chdir(tmp_path)
+    with patch(
+        "ceramic_cache.management.commands.scorer_dump_data.get_s3_client",
+        return_value=local_s3,
+    ):
+        yield local_s3
+
+
+@pytest.fixture
+def scores(scorer_community_with_binary_scorer):
+    for i in range(3):
+        passport = Passport.objects.create(
+            address=f"0x{i}", community=scorer_community_with_binary_scorer
+        )
+        Score.objects.create(
+            passport=passport,
+            score=Decimal("1.000000001"),
+            status=Score.Status.DONE,
+            evidence={"rawScore": f"{i}.5", "threshold": "20.00000"},
+            stamp_scores={"Google": 1.5},
+        )
+    # Scores are only exported for the community in the filter
+    other_passport = Passport.objects.create(
+        address="0xother", community=scorer_community_with_binary_scorer
+    )
+    Score.objects.create(passport=other_passport)
+    return Score.objects.filter(passport__address__in=["0x0", "0x1", "0x2"])
+
+
+def dump(local_s3, config, **kwargs):
+    call_command(
+        "scorer_dump_data",
+        config=json.dumps(config),
+        s3_uri=f"s3://{bucket}/export",
+        **kwargs,
+    )
+    objects = {key: data for (_, key), data in local_s3.objects.items()}
+    assert "export/export_summary.json" in objects
+    return objects
+
+
+def read_jsonl(data):
+    return [json.loads(line) for line in data.splitlines()]
+
+
+class TestScorerDumpData:
+    @pytest.mark.parametrize("batch_size", [None, 2])
+    def test_fast_serializer_matches_django_serializer(
+        self, dump_s3, scores, batch_size
+    ):
+        community_id = scores[0].passport.community_id
+        config = [
+            {
+                "name": "registry.Score",
+                "filter": {"passport__address__in": ["0x0", "0x1", "0x2"]},
+                "select_related": ["passport"],
+                "filename": "scores.jsonl",
+            },
+        ]
+
+        fast = read_jsonl(
+            dump(dump_s3, config, batch_size=batch_size)["export/scores.jsonl"]
+        )
+        django = read_jsonl(
+            dump(dump_s3, config, batch_size=batch_size, serializer="django")[
+                "export/scores.jsonl"
+            ]
+        )
+
+        assert fast == django
+        assert [score["id"] for score in fast] == [score.id for score in scores]
+        assert fast[0]["passport"]["address"] == "0x0"
+        assert fast[0]["passport"]["community"] == community_id
+        assert fast[0]["score"] == "1.000000001"
+        assert fast[0]["evidence"] == {"rawScore": "0.5", "threshold": "20.00000"}
+
+    def test_compressed_dump(self, dump_s3):
+        CeramicCache.objects.create(
+            address="0x123", provider="Google", stamp={"provider": "Google"}
+        )
+
+        objects = dump(
+            dump_s3, [{"name": "ceramic_cache.CeramicCache"}], compression="gzip"
+        )
+
+        (stamp,) = read_jsonl(
+            gzip.decompress(objects["export/ceramic_cache_ceramiccache.jsonl.gz"])
+        )
+        assert stamp["provider"] == "Google"
+        assert stamp["stamp"] == {"provider": "Google"}
@@ -0,0 +1,260 @@
+import io
+import json
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from unittest.mock import patch
+
+import pyarrow.parquet as pq
+import pytest
+from ceramic_cache.models import CeramicCache, ParquetExports
+from django.core.management import call_command
+from registry.models import Passport, Score
+
+pytestmark = pytest.mark.django_db
+
+bucket = "test-bucket"
+
+
+@pytest.fixture
+def export_s3(local_s3):
+    with patch(
+        "ceramic_cache.management.commands.scorer_dump_data_parquet.get_s3_client",
+        return_value=local_s3,
+    ):
+        yield local_s3
+
+
+def read_parquet(local_s3, table_name):
+    data = local_s3.objects[(bucket, f"export/{table_name}.parquet")]
+    return pq.ParquetFile(io.BytesIO(data))
+
+
+def create_stamps(count):
+    CeramicCache.objects.bulk_create(
+        [
+            CeramicCache(
+                address="0x123",
+                provider=f"Provider{i}",
+                stamp={"provider": f"Provider{i}"},
+                deleted_at=datetime(2024, 1, 1, tzinfo=timezone.utc) if i else None,
+            )
+            for i in range(count)
+        ]
+    )
+
+
+class TestScorerDumpDataParquet:
+    def test_copy_engine(self, export_s3, scorer_community_with_binary_scorer):
+        create_stamps(5)
+        passport = Passport.objects.create(
+            address="0x123", community=scorer_community_with_binary_scorer
+        )
+        Score.objects.create(
+            passport=passport,
+            score=Decimal("1.000000001"),
+            evidence={"rawScore": "12.5"},
+            stamp_scores={"Google": 1.5},
+            error="",
+        )
+
+        call_command(
+            "scorer_dump_data_parquet",
+            apps="ceramic_cache,registry",
+            s3_uri=f"s3://{bucket}/export",
+            engine="copy",
+            row_group_size=2,
+        )
+
+        stamps_file = read_parquet(export_s3, CeramicCache._meta.db_table)
+        # 5 rows in row groups of 2 rows
+        assert stamps_file.num_row_groups == 3
+        stamps = stamps_file.read().to_pylist()
+        assert [s["id"] for s in stamps] == list(
+            CeramicCache.objects.order_by("id").values_list("id", flat=True)
+        )
+        assert stamps[0]["stamp"] == '{"provider": "Provider0"}'
+        assert stamps[0]["compose_db_stream_id"] == ""
+        assert stamps[0]["deleted_at"] is None
+        assert stamps[1]["deleted_at"] == datetime(2024, 1, 1)
+        assert stamps[0]["type"] == CeramicCache.StampType.V1
+
+        (score,) = read_parquet(export_s3, Score._meta.db_table).read().to_pylist()
+        assert score["passport_id"] == passport.id
+        assert score["score"] == Decimal("1.000000001")
+        assert score["evidence"] == '{"rawScore": "12.5"}'
+        # NULL and empty strings are told apart
+        assert score["status"] is None
+        assert score["error"] == ""
+
+        # Empty tables are exported with their schema only
+        events_file = read_parquet(export_s3, "registry_event")
+        assert events_file.metadata.num_rows == 0
+
+    @pytest.mark.django_db(transaction=True)
+    def test_parallel_copy_engine(self, export_s3):
+        create_stamps(3)
+
+        call_command(
+            "scorer_dump_data_parquet",
+            apps="ceramic_cache",
+            s3_uri=f"s3://{bucket}/export",
+            engine="copy",
+            workers=2,
+        )
+
+        stamps = read_parquet(export_s3, CeramicCache._meta.db_table).read()
+        assert stamps.column("provider").to_pylist() == [
+            f"Provider{i}" for i in range(3)
+        ]
+        assert (bucket, "export/ceramic_cache_stampexports.parquet") in (
+            export_s3.objects
+        )
+
+    def test_orm_engine(self, export_s3, tmp_path, monkeypatch):
+        # The ORM engine writes the Parquet file to the working directory before uploading it
+        monkeypatch.chdir(tmp_path)
+        create_stamps(3)
+
+        call_command(
+            "scorer_dump_data_parquet",
+            apps="ceramic_cache",
+            s3_uri=f"s3://{bucket}/export",
+            engine="orm",
+        )
+
+        stamps = read_parquet(export_s3, CeramicCache._meta.db_table).read()
+        assert stamps.column("provider").to_pylist() == [
+            f"Provider{i}" for i in range(3)
+        ]
+
+
+class TestIncrementalExport:
+    def export(self, export_ts, apps="ceramic_cache"):
+        with patch(
+            "ceramic_cache.management.commands.scorer_dump_data_parquet.timezone.now",
+            return_value=export_ts,
+        ):
+            call_command(
+                "scorer_dump_data_parquet",
+                apps=apps,
+                s3_uri=f"s3://{bucket}/export",
+                engine="copy",
+                incremental=True,
+            )
+
+        manifest = json.loads(
+            export_s3_objects(self.s3)[
+                f"export/_manifests/{export_ts:%Y%m%d_%H%M%S}.json"
+            ]
+        )
+        return {entry["model"]: entry for entry in manifest["partitions"]}
+
+    def read_partition(self, entry):
+        data = export_s3_objects(self.s3)[entry["s3_key"]]
+        return pq.read_table(io.BytesIO(data)).to_pylist()
+
+    def test_delta_partitions(self, export_s3):
+        self.s3 = export_s3
+        create_stamps(3)
+        updated_at = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        CeramicCache.objects.update(updated_at=updated_at)
+
+        first_export_ts = datetime(2024, 1, 2, tzinfo=timezone.utc)
+        partitions = self.export(first_export_ts)
+
+        stamps = partitions["ceramic_cache.CeramicCache"]
+        assert stamps["watermark_field"] == "updated_at"
+        assert stamps["from"] is None
+        assert stamps["rows"] == 3
+        assert stamps["s3_key"] == (
+            "export/ceramic_cache_ceramiccache/export_date=2024-01-02/"
+            "ceramic_cache_ceramiccache_20240102_000000.parquet"
+        )
+        assert len(self.read_partition(stamps)) == 3
+        # Nothing to export for the empty tables
+        assert partitions["ceramic_cache.StampExports"]["s3_key"] is None
+
+        (watermark,) = ParquetExports.objects.all()
+        assert watermark.model_label == "ceramic_cache.CeramicCache"
+        assert watermark.last_updated_at == updated_at
+        assert watermark.row_total == 3
+
+        # Only the new and updated stamps are part of the next partition
+        updated_stamp = CeramicCache.objects.order_by("id").first()
+        CeramicCache.objects.filter(pk=updated_stamp.pk).update(
+            updated_at=updated_at + timedelta(days=1)
+        )
+        new_stamp = CeramicCache.objects.create(address="0x123", provider="New")
+        partitions = self.export(first_export_ts + timedelta(days=1))
+
+        stamps = partitions["ceramic_cache.CeramicCache"]
+        assert stamps["rows"] == 2
+        assert "export_date=2024-01-03/" in stamps["s3_key"]
+        assert sorted(row["id"] for row in self.read_partition(stamps)) == sorted(
+            [updated_stamp.pk, new_stamp.pk]
+        )
+
+        # Models without updated_at are exported by id
+        watermarks = partitions["ceramic_cache.ParquetExports"]
+        assert watermarks["watermark_field"] == "id"
+        assert watermarks["changes_tracked"] is False
+        assert watermarks["rows"] == 1
+        assert watermarks["to"] == watermark.pk
+
+        # The partitions of the previous runs are kept
+        assert (
+            len(
+                [
+                    key
+                    for key in export_s3_objects(self.s3)
+                    if key.startswith("export/ceramic_cache_ceramiccache/")
+                ]
+            )
+            == 2
+        )
+
+    def test_rescored_scores_are_exported(
+        self, export_s3, scorer_community_with_binary_scorer
+    ):
+        self.s3 = export_s3
+        scored_at = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        scores = [
+            Score.objects.create(
+                passport=Passport.objects.create(
+                    address=f"0x{i}", community=scorer_community_with_binary_scorer
+                ),
+                score=Decimal("1"),
+                last_score_timestamp=scored_at,
+            )
+            for i in range(3)
+        ]
+
+        first_export_ts = datetime(2024, 1, 2, tzinfo=timezone.utc)
+        partitions = self.export(first_export_ts, apps="registry")
+
+        exported_scores = partitions["registry.Score"]
+        assert exported_scores["watermark_field"] == "last_score_timestamp"
+        assert exported_scores["changes_tracked"] is True
+        assert exported_scores["to"] == scored_at.isoformat().replace("+00:00", "Z")
+        assert exported_scores["to_id"] == scores[-1].pk
+        assert exported_scores["rows"] == 3
+
+        # A rescore updates the existing row, it is part of the next partition
+        Score.objects.filter(pk=scores[0].pk).update(
+            score=Decimal("0"), last_score_timestamp=scored_at + timedelta(days=1)
+        )
+        partitions = self.export(first_export_ts + timedelta(days=1), apps="registry")
+
+        exported_scores = partitions["registry.Score"]
+        assert exported_scores["rows"] == 1
+        (row,) = self.read_partition(exported_scores)
+        assert row["id"] == scores[0].pk
+        assert row["score"] == Decimal("0")
+
+        # Nothing changed since the previous export
+        partitions = self.export(first_export_ts + timedelta(days=2), apps="registry")
+        assert partitions["registry.Score"]["rows"] == 0
+
+
+def export_s3_objects(local_s3):
+    return {key: data for (_, key), data in local_s3.objects.items()}
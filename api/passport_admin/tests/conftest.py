@@ -1,4 +1,5 @@
 from scorer.test.conftest import (
+    api_analytics_in_request,
     api_key,
     sample_address,
     sample_provider,
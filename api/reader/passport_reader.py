@@ -4,6 +4,8 @@ from typing import Dict, List
 import api_logging as logging
 from asgiref.sync import async_to_sync
 from ceramic_cache.models import CeramicCache
+from ceramic_cache.passport_cache import aget_current_stamps
+from django.conf import settings
 
 log = logging.getLogger(__name__)
 
@@ -20,33 +22,34 @@ def get_did(address, network="1"):
 
 
 async def aget_passport(address: str = "") -> Dict:
-    db_stamp_list = CeramicCache.objects.filter(
-        address=address, deleted_at__isnull=True
+    if settings.PASSPORT_CACHE_TTL:
+        # Pick the latest stamp for each provider from the (cached) current stamps
+        latest_stamp_by_provider = {}
+        for stamp in sorted(
+            await aget_current_stamps(address), key=lambda s: (s.updated_at, s.pk)
+        ):
+            latest_stamp_by_provider[stamp.provider] = stamp
+
+        return {
+            "stamps": [
+                {"provider": stamp.provider, "credential": stamp.stamp}
+                for stamp in latest_stamp_by_provider.values()
+            ]
+        }
+
+    # Load only the latest stamp for each provider (DISTINCT ON provider), this
+    # query is backed by the `latest_stamp_per_provider_idx` partial index
+    latest_stamps = (
+        CeramicCache.objects.filter(address=address, deleted_at__isnull=True)
+        .order_by("provider", "-updated_at", "-id")
+        .distinct("provider")
+        .values_list("provider", "stamp")
     )
 
-    stamps_by_provider = dict()
-
-    async for stamp in db_stamp_list:
-        if stamp.provider not in stamps_by_provider:
-            stamps_by_provider[stamp.provider] = []
-
-        stamps_by_provider[stamp.provider].append(stamp)
-
-    latest_stamps = []
-
-    for provider in stamps_by_provider:
-        latest_date = None
-        latest_stamp = None
-        for stamp in stamps_by_provider[provider]:
-            if latest_date is None or stamp.updated_at > latest_date:
-                latest_date = stamp.updated_at
-                latest_stamp = stamp
-
-        latest_stamps.append(latest_stamp)
-
     return {
         "stamps": [
-            {"provider": s.provider, "credential": s.stamp} for s in latest_stamps
+            {"provider": provider, "credential": stamp}
+            async for provider, stamp in latest_stamps
         ]
     }
 
@@ -157,3 +157,31 @@ class TestGetStamps:
             )
             == 0
         )
+
+    @pytest.mark.django_db
+    def test_latest_stamp_per_provider(self, django_assert_num_queries):
+        """Make sure only the latest stamp is returned when a provider has multiple non-deleted stamps"""
+
+        address = "0x123test"
+        provider = sample_stamps[0]["credentialSubject"]["provider"]
+
+        old_stamp = CeramicCache.objects.create(
+            address=address,
+            provider=provider,
+            stamp=sample_stamps[0],
+            type=CeramicCache.StampType.V1,
+        )
+        new_stamp = CeramicCache.objects.create(
+            address=address,
+            provider=provider,
+            stamp=sample_stamps[1],
+            type=CeramicCache.StampType.V2,
+        )
+        assert new_stamp.updated_at > old_stamp.updated_at
+
+        with django_assert_num_queries(1):
+            passport = get_passport(address)
+
+        assert passport["stamps"] == [
+            {"provider": provider, "credential": sample_stamps[1]}
+        ]
@@ -0,0 +1,236 @@
+"""
+Buffered writer for the API key analytics.
+
+The analytics of the API calls are not written in the request. They are queued in-process and
+written by a background thread with `bulk_create`, once API_ANALYTICS_BATCH_SIZE records are
+queued or API_ANALYTICS_FLUSH_SECONDS after the first queued record, whichever comes first.
+
+- the queue is bounded to API_ANALYTICS_BUFFER_SIZE records: when the DB falls behind, the batches
+  grow up to API_ANALYTICS_BATCH_SIZE, and once the queue is full new records are dropped (and
+  counted) rather than slowing down the requests. Batches that fail to be written are dropped too.
+- the queued records are written when the process exits
+- a value of 0 for API_ANALYTICS_BUFFER_SIZE writes each record in the request
+
+Note that `created_at` is set when the batch is written, not when the request was served.
+"""
+
+import atexit
+import os
+import queue
+import threading
+import time
+from typing import List, Optional
+
+import api_logging as logging
+from account.models import AccountAPIKeyAnalytics
+from django.conf import settings
+from django.db import close_old_connections, connections
+
+log = logging.getLogger(__name__)
+
+# Queued to stop the writer thread
+_STOP = object()
+
+sensitive_headers_data = {
+    "X-Api-Key",
+    "Cookie",
+    "Authorization",
+    "x-api-key",
+    "cookie",
+    "authorization",
+}
+
+
+def clean_headers(headers) -> dict:
+    """
+    Return a copy of the headers of an API call, with the values of the sensitive headers masked
+    """
+    cleaned_headers = dict(headers)
+    for sensitive_field in sensitive_headers_data:
+        if sensitive_field in cleaned_headers:
+            cleaned_headers[sensitive_field] = "***"
+    return cleaned_headers
+
+
+def get_api_key_analytics(
+    api_key_id,
+    path,
+    path_segments,
+    query_params,
+    headers,
+    payload,
+    response,
+    response_skipped,
+    error,
+) -> Optional[AccountAPIKeyAnalytics]:
+    """
+    Return the (unsaved) analytics record of an API call, or None if the analytics are disabled
+    """
+    if settings.FF_API_ANALYTICS != "on":
+        return None
+
+    return AccountAPIKeyAnalytics(
+        api_key_id=api_key_id,
+        path=path,
+        path_segments=path_segments,
+        query_params=query_params,
+        payload=payload,
+        headers=clean_headers(headers),
+        response=response,
+        response_skipped=response_skipped,
+        error=error,
+    )
+
+
+class AnalyticsWriter:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pid: Optional[int] = None
+        self._queue: Optional[queue.Queue] = None
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+        self.dropped = 0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(settings.API_ANALYTICS_BUFFER_SIZE) and not self._closed
+
+    def save(self, record: AccountAPIKeyAnalytics):
+        if not self.enabled:
+            record.save()
+            return
+        self._put(record)
+
+    async def asave(self, record: AccountAPIKeyAnalytics):
+        if not self.enabled:
+            await record.asave()
+            return
+        # Queuing does not block, so this is safe to call from the event loop
+        self._put(record)
+
+    def _put(self, record: AccountAPIKeyAnalytics):
+        try:
+            self._get_queue().put_nowait(record)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+
+    def _get_queue(self) -> queue.Queue:
+        # The writer thread does not survive a fork, each process starts its own
+        pid = os.getpid()
+        if self._pid != pid:
+            with self._lock:
+                if self._pid != pid:
+                    self._queue = queue.Queue(
+                        maxsize=settings.API_ANALYTICS_BUFFER_SIZE
+                    )
+                    self._thread = threading.Thread(
+                        target=self._run,
+                        args=(self._queue,),
+                        name="api-analytics-writer",
+                        daemon=True,
+                    )
+                    self._thread.start()
+                    self._pid = pid
+        return self._queue
+
+    def _run(self, records: queue.Queue):
+        try:
+            stopped = False
+            while not stopped:
+                batch, stopped = self._next_batch(records)
+                self.flush(batch)
+        finally:
+            connections.close_all()
+
+    def _next_batch(self, records: queue.Queue):
+        """
+        Wait for the next batch: the records queued within API_ANALYTICS_FLUSH_SECONDS of the
+        first one, up to API_ANALYTICS_BATCH_SIZE records.
+        Returns the batch and whether the writer was stopped.
+        """
+        record = records.get()
+        if record is _STOP:
+            return [], True
+
+        batch = [record]
+        deadline = time.monotonic() + settings.API_ANALYTICS_FLUSH_SECONDS
+        while len(batch) < settings.API_ANALYTICS_BATCH_SIZE:
+            timeout = deadline - time.monotonic()
+            try:
+                # Keep draining without waiting once the deadline has passed (the DB is behind)
+                record = (
+                    records.get(timeout=timeout)
+                    if timeout > 0
+                    else records.get_nowait()
+                )
+            except queue.Empty:
+                break
+            if record is _STOP:
+                return batch, True
+            batch.append(record)
+
+        return batch, False
+
+    def flush(self, batch: List[AccountAPIKeyAnalytics]):
+        with self._lock:
+            dropped, self.dropped = self.dropped, 0
+        if dropped:
+            log.warning(
+                "Dropped %d API analytics records, the analytics queue is full", dropped
+            )
+
+        if not batch:
+            return
+
+        # Reconnect if the connection was lost or has exceeded CONN_MAX_AGE
+        close_old_connections()
+        try:
+            AccountAPIKeyAnalytics.objects.bulk_create(batch)
+        except Exception:
+            log.error(
+                "Failed to save %d API analytics records", len(batch), exc_info=True
+            )
+
+    def close(self):
+        """
+        Write the queued records and stop the writer thread.
+        Records saved after this are written in the request.
+        """
+        with self._lock:
+            self._closed = True
+            thread = self._thread if self._pid == os.getpid() else None
+            self._thread = None
+            self._pid = None
+
+        if thread is None:
+            return
+
+        timeout = settings.API_ANALYTICS_SHUTDOWN_TIMEOUT
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            log.error("Timed out stopping the API analytics writer")
+            return
+        thread.join(timeout)
+        if thread.is_alive():
+            log.error("Timed out writing the queued API analytics records")
+
+
+analytics_writer = AnalyticsWriter()
+atexit.register(analytics_writer.close)
+
+
+def record_api_key_usage(*args, **kwargs):
+    """
+    Queue the analytics of an API call. The arguments are those of `get_api_key_analytics`.
+    """
+    record = get_api_key_analytics(*args, **kwargs)
+    if record:
+        analytics_writer.save(record)
+
+
+async def arecord_api_key_usage(*args, **kwargs):
+    record = get_api_key_analytics(*args, **kwargs)
+    if record:
+        await analytics_writer.asave(record)
@@ -1,19 +1,25 @@
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional, Tuple
 
 import api_logging as logging
 
 # --- Deduplication Modules
 from account.models import Community
+from django.db.models import QuerySet
 from registry.api.schema import (
     CursorPaginatedHistoricalScoreResponse,
     DetailedScoreResponse,
     ErrorMessageResponse,
 )
-from registry.api.utils import ApiKey, check_rate_limit, with_read_db
-from registry.exceptions import InvalidLimitException, api_get_object_or_404
+from registry.api.utils import ApiKey, acheck_rate_limit, check_rate_limit, with_read_db
+from registry.exceptions import (
+    InvalidLimitException,
+    aapi_get_object_or_404,
+    api_get_object_or_404,
+)
 from registry.models import Event, Score
 from registry.utils import (
+    aget_cursor_tokens_for_results,
     decode_cursor,
     get_cursor_query_condition,
     get_cursor_tokens_for_results,
@@ -37,187 +43,86 @@ def get_score_history(
 
     community = api_get_object_or_404(Community, id=scorer_id, account=request.auth)
 
-    endpoint = "get_score_history"
-
     try:
-        base_query = with_read_db(Event).filter(
-            community__id=community.id, action=Event.Action.SCORE_UPDATE
+        cursor, created_at = get_history_cursor(token, created_at)
+        query, pagination_sort_fields = get_history_query(
+            community, address, created_at, cursor
         )
 
-        cursor = decode_cursor(token) if token else None
-
-        if cursor and "created_at" in cursor:
-            created_at = datetime.fromisoformat(cursor.get("created_at"))
-        elif created_at:
-            created_at = datetime.fromisoformat(created_at)
-        else:
-            created_at = None
-
-        # Scenario 2 - Snapshot for 1 addresses
-        # the user has passed in the address, but no created_at
-        # In this case only 1 result will be returned
-        if address and not created_at:
-            scores = base_query.filter(address=address).order_by("-created_at")
-
-            score_response = []
-            for score in scores:
-                score_data = DetailedScoreResponse(
-                    address=score.address,
-                    score=score.data["score"],
-                    status=Score.Status.DONE,
-                    last_score_timestamp=score.created_at.isoformat(),
-                    evidence=score.data["evidence"],
-                    # below aren't currently stored in the events table, but can be
-                    error=None,
-                    stamp_scores=None,
-                )
-
-                score_response.append(score_data)
-
-            response = CursorPaginatedHistoricalScoreResponse(
-                next=None, prev=None, items=score_response
-            )
-            return response
-
-        # Scenario 2 - Snapshot for 1 addresses and timestamp
-        # the user has passed in the created_at and address
-        # In this case only 1 result will be returned
-        if address and created_at:
-            score = (
-                base_query.filter(address=address, created_at__lte=created_at)
-                .order_by("-created_at")
-                .first()
-            )
-
-            if not score:
-                return CursorPaginatedHistoricalScoreResponse(
-                    next=None, prev=None, items=[]
-                )
-
-            score.created_at = score.created_at.isoformat()
-
-            score_data = DetailedScoreResponse(
-                address=address,
-                score=score.data["score"],
-                status=Score.Status.DONE,
-                last_score_timestamp=score.created_at,
-                evidence=score.data["evidence"],
-                # below aren't currently stored in the events table, but can be
-                error=None,
-                stamp_scores=None,
-            )
-
-            response = CursorPaginatedHistoricalScoreResponse(
-                next=None, prev=None, items=[score_data]
-            )
-            return response
-
-        # Scenario 3 - Snapshot for all addresses
-        # the user has passed in the created_at, but no address
-        elif created_at:
-            pagination_sort_fields = ["address"]
-            filter_condition, field_ordering = get_cursor_query_condition(
-                cursor, pagination_sort_fields
-            )
-
-            field_ordering.append("-created_at")
-            query = (
-                base_query.filter(filter_condition)
-                .order_by(*field_ordering)
-                .distinct("address")
+        if not pagination_sort_fields:
+            # The snapshot at a timestamp is returned for the address as requested
+            return get_history_response(
+                list(query), address=address if created_at else None
             )
 
-            scores = list(query[:limit])
-            for score in scores:
-                score.created_at = score.created_at.isoformat()
-
-            if cursor and cursor["d"] == "prev":
-                scores.reverse()
-
-            domain = request.build_absolute_uri("/")[:-1]
-
-            page_links = get_cursor_tokens_for_results(
-                query,
-                domain,
-                scores,
-                pagination_sort_fields,
-                limit,
-                [scorer_id],
-                endpoint,
-            )
+        scores = list(query[:limit])
+        if cursor and cursor["d"] == "prev":
+            scores.reverse()
+
+        page_links = get_cursor_tokens_for_results(
+            query,
+            request.build_absolute_uri("/")[:-1],
+            scores,
+            pagination_sort_fields,
+            limit,
+            [scorer_id],
+            "get_score_history",
+        )
+        return get_history_response(scores, page_links)
 
-            score_response = []
-            for score in scores:
-                score_data = DetailedScoreResponse(
-                    address=score.address,
-                    score=score.data["score"],
-                    status=Score.Status.DONE,
-                    last_score_timestamp=score.created_at,
-                    evidence=score.data["evidence"],
-                    # below aren't currently stored in the events table, but can be
-                    error=None,
-                    stamp_scores=None,
-                )
-
-                score_response.append(score_data)
-
-            response = CursorPaginatedHistoricalScoreResponse(
-                next=page_links["next"], prev=page_links["prev"], items=score_response
-            )
+    except Exception as e:
+        log.error(
+            "Error getting passport scores. scorer_id=%s",
+            scorer_id,
+            exc_info=True,
+        )
+        raise e
 
-            return response
-        # # Scenario 4 - Just return history ...
-        else:
-            pagination_sort_fields = ["id"]
-            filter_condition, field_ordering = get_cursor_query_condition(
-                cursor, pagination_sort_fields
-            )
 
-            field_ordering.insert(0, "address")
-            query = (
-                base_query.filter(filter_condition)
-                .order_by(*field_ordering)
-                .distinct("address")
-            )
+async def aget_score_history(
+    request,
+    scorer_id: int,
+    address: Optional[str] = None,
+    created_at: str = "",
+    token: str = None,
+    limit: int = 1000,
+) -> CursorPaginatedHistoricalScoreResponse:
+    await acheck_rate_limit(request)
 
-            scores = list(query[:limit])
-            for score in scores:
-                score.created_at = score.created_at.isoformat()
+    if limit > 1000:
+        raise InvalidLimitException()
 
-            if cursor and cursor["d"] == "prev":
-                scores.reverse()
+    community = await aapi_get_object_or_404(
+        Community, id=scorer_id, account=request.auth
+    )
 
-            domain = request.build_absolute_uri("/")[:-1]
+    try:
+        cursor, created_at = get_history_cursor(token, created_at)
+        query, pagination_sort_fields = get_history_query(
+            community, address, created_at, cursor
+        )
 
-            page_links = get_cursor_tokens_for_results(
-                query,
-                domain,
-                scores,
-                pagination_sort_fields,
-                limit,
-                [scorer_id],
-                endpoint,
+        if not pagination_sort_fields:
+            # The snapshot at a timestamp is returned for the address as requested
+            return get_history_response(
+                [score async for score in query],
+                address=address if created_at else None,
             )
 
-            score_response = []
-            for score in scores:
-                score_data = DetailedScoreResponse(
-                    address=score.address,
-                    score=score.data["score"],
-                    status=Score.Status.DONE,
-                    last_score_timestamp=score.created_at,
-                    evidence=score.data["evidence"],
-                    # below aren't currently stored in the events table, but can be
-                    error=None,
-                    stamp_scores=None,
-                )
-
-                score_response.append(score_data)
-
-            response = CursorPaginatedHistoricalScoreResponse(
-                next=page_links["next"], prev=page_links["prev"], items=score_response
-            )
-            return response
+        scores = [score async for score in query[:limit]]
+        if cursor and cursor["d"] == "prev":
+            scores.reverse()
+
+        page_links = await aget_cursor_tokens_for_results(
+            query,
+            request.build_absolute_uri("/")[:-1],
+            scores,
+            pagination_sort_fields,
+            limit,
+            [scorer_id],
+            "get_score_history",
+        )
+        return get_history_response(scores, page_links)
 
     except Exception as e:
         log.error(
@@ -228,6 +133,102 @@ def get_score_history(
         raise e
 
 
+def get_history_cursor(
+    token: Optional[str], created_at: str
+) -> Tuple[Optional[dict], Optional[datetime]]:
+    cursor = decode_cursor(token) if token else None
+
+    if cursor and "created_at" in cursor:
+        return cursor, datetime.fromisoformat(cursor.get("created_at"))
+    elif created_at:
+        return cursor, datetime.fromisoformat(created_at)
+    return cursor, None
+
+
+def get_history_query(
+    community: Community,
+    address: Optional[str],
+    created_at: Optional[datetime],
+    cursor: Optional[dict],
+) -> Tuple[QuerySet, Optional[List[str]]]:
+    """
+    Return the query of the score events, and the fields it is paginated by
+    (None if the query is not paginated)
+    """
+    base_query = with_read_db(Event).filter(
+        community__id=community.id, action=Event.Action.SCORE_UPDATE
+    )
+
+    # Scenario 1 - Snapshot for 1 addresses
+    # the user has passed in the address, but no created_at
+    # In this case all the scores of the address will be returned
+    if address and not created_at:
+        return base_query.filter(address=address).order_by("-created_at"), None
+
+    # Scenario 2 - Snapshot for 1 addresses and timestamp
+    # the user has passed in the created_at and address
+    # In this case only 1 result will be returned
+    if address and created_at:
+        query = base_query.filter(address=address, created_at__lte=created_at)
+        return query.order_by("-created_at")[:1], None
+
+    # Scenario 3 - Snapshot for all addresses
+    # the user has passed in the created_at, but no address
+    if created_at:
+        pagination_sort_fields = ["address"]
+        filter_condition, field_ordering = get_cursor_query_condition(
+            cursor, pagination_sort_fields
+        )
+
+        field_ordering.append("-created_at")
+        query = (
+            base_query.filter(filter_condition)
+            .order_by(*field_ordering)
+            .distinct("address")
+        )
+        return query, pagination_sort_fields
+
+    # # Scenario 4 - Just return history ...
+    pagination_sort_fields = ["id"]
+    filter_condition, field_ordering = get_cursor_query_condition(
+        cursor, pagination_sort_fields
+    )
+
+    field_ordering.insert(0, "address")
+    query = (
+        base_query.filter(filter_condition)
+        .order_by(*field_ordering)
+        .distinct("address")
+    )
+    return query, pagination_sort_fields
+
+
+def get_history_response(
+    scores: List[Event],
+    page_links: Optional[dict] = None,
+    address: Optional[str] = None,
+) -> CursorPaginatedHistoricalScoreResponse:
+    score_response = []
+    for score in scores:
+        score_data = DetailedScoreResponse(
+            address=address or score.address,
+            score=score.data["score"],
+            status=Score.Status.DONE,
+            last_score_timestamp=score.created_at.isoformat(),
+            evidence=score.data["evidence"],
+            # below aren't currently stored in the events table, but can be
+            error=None,
+            stamp_scores=None,
+        )
+
+        score_response.append(score_data)
+
+    page_links = page_links or {"next": None, "prev": None}
+    return CursorPaginatedHistoricalScoreResponse(
+        next=page_links["next"], prev=page_links["prev"], items=score_response
+    )
+
+
 history_endpoint = {
     "url": "/score/{int:scorer_id}/history",
     "auth": ApiKey(),
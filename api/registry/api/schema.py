@@ -15,6 +15,11 @@ class SubmitPassportPayload(Schema):
     nonce: str = ""
 
 
+class SubmitPassportsPayload(Schema):
+    addresses: List[str]
+    scorer_id: str
+
+
 class ScoreEvidenceResponse(Schema):
     type: str
     success: bool
@@ -115,6 +120,10 @@ class DetailedHistoricalScoreResponse(Schema):
     data: HistoricalScoreData
 
 
+class SubmitPassportsResponse(Schema):
+    items: List[DetailedScoreResponse]
+
+
 class CursorPaginatedScoreResponse(Schema):
     next: Optional[str]
     prev: Optional[str]
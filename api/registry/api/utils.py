@@ -1,20 +1,25 @@
 import functools
 
 import api_logging as logging
+from account.api_key_cache import (
+    aget_verified_api_key,
+    aset_verified_api_key,
+    get_verified_api_key,
+    set_verified_api_key,
+)
 from account.models import Account, AccountAPIKey
+from asgiref.sync import sync_to_async
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.utils.module_loading import import_string
-from django_ratelimit.core import is_ratelimited
-from django_ratelimit.decorators import ALL
 from django_ratelimit.exceptions import Ratelimited
 from ninja.compatibility.request import get_headers
 from ninja.security import APIKeyHeader
 from ninja.security.base import SecuritySchema
+from registry.analytics import arecord_api_key_usage, record_api_key_usage
 from registry.api.schema import SubmitPassportPayload
-from registry.atasks import asave_api_key_analytics
 from registry.exceptions import InvalidScorerIdException, Unauthorized
-from registry.tasks import save_api_key_analytics
+from registry.ratelimit import is_ratelimited_in_window, rate_limiter
 
 log = logging.getLogger(__name__)
 
@@ -37,7 +42,7 @@ def atrack_apikey_usage(track_response=True, payload_param_name=None):
                 error = e
 
             try:
-                await asave_api_key_analytics(
+                await arecord_api_key_usage(
                     request.api_key.id,
                     request.path,
                     request.path.split("/")[
@@ -80,7 +85,7 @@ def track_apikey_usage(track_response=True, payload_param_name=None):
                 error = e
 
             try:
-                save_api_key_analytics(
+                record_api_key_usage(
                     request.api_key.id,
                     request.path,
                     request.path.split("/")[
@@ -129,6 +134,15 @@ class ApiKey(APIKeyHeader):
             except:
                 raise Unauthorized()
 
+        verified_api_key = get_verified_api_key(key)
+        if verified_api_key:
+            # The key may have expired since it was cached
+            if verified_api_key.api_key.has_expired:
+                raise Unauthorized()
+            request.api_key = verified_api_key.api_key
+            request.user = verified_api_key.user
+            return verified_api_key.account
+
         try:
             api_key = AccountAPIKey.objects.get_from_key(key)
             request.api_key = api_key
@@ -136,6 +150,7 @@ class ApiKey(APIKeyHeader):
 
             if user_account:
                 request.user = user_account.user
+                set_verified_api_key(key, api_key, user_account, request.user)
                 return user_account
         except AccountAPIKey.DoesNotExist:
             raise Unauthorized()
@@ -164,6 +179,15 @@ async def aapi_key(request):
     if not key:
         raise Unauthorized()
 
+    verified_api_key = await aget_verified_api_key(key)
+    if verified_api_key:
+        # The key may have expired since it was cached
+        if verified_api_key.api_key.has_expired:
+            raise Unauthorized()
+        request.api_key = verified_api_key.api_key
+        request.user = verified_api_key.user
+        return verified_api_key.account
+
     prefix, _, _ = key.partition(".")
     queryset = AccountAPIKey.objects.get_usable_keys()
 
@@ -179,6 +203,7 @@ async def aapi_key(request):
     user_account = await Account.objects.aget(pk=api_key.account_id)
     if user_account:
         request.user = await get_user_model().objects.aget(pk=user_account.user_id)
+        await aset_verified_api_key(key, api_key, user_account, request.user)
         return user_account
 
     raise Unauthorized()
@@ -192,28 +217,50 @@ aapi_key.openapi_security_schema: SecuritySchema = SecuritySchema(
 )
 
 
-def check_rate_limit(request):
+def check_rate_limit(request, cost: int = 1):
+    """
+    Check the rate limit for the API, the request counts as `cost` requests (e.g. one per address
+    of a batch) and is rejected as a whole if that exceeds the remaining quota.
+    The tokens are leased from redis by the token bucket rate limiter. If redis is not available this
+    falls back to a fixed window counter in the cache
+    """
+    rate = request.api_key.rate_limit
+
+    # Bypass rate limiting if rate is set to None
+    if rate == "" or not settings.RATELIMIT_ENABLE:
+        return
+
+    ratelimited = None
+    if settings.RATELIMIT_LEASE_SIZE:
+        ratelimited = rate_limiter.is_ratelimited(request.api_key.prefix, rate, cost)
+
+    if ratelimited is None:
+        ratelimited = is_ratelimited_in_window(request.api_key.prefix, rate, cost)
+    set_ratelimited(request, ratelimited)
+
+
+async def acheck_rate_limit(request, cost: int = 1):
     """
-    Check the rate limit for the API.
-    This is based on the original ratelimit decorator from django_ratelimit
+    Async version of `check_rate_limit`, the rate limit is checked in a thread if this
+    takes a redis round-trip
     """
-    old_limited = getattr(request, "limited", False)
     rate = request.api_key.rate_limit
 
     # Bypass rate limiting if rate is set to None
     if rate == "":
         return
 
-    ratelimited = is_ratelimited(
-        request=request,
-        group="registry",
-        fn=None,
-        key=lambda _request, _group: request.api_key.prefix,
-        rate=rate,
-        method=ALL,
-        increment=True,
-    )
-    request.limited = ratelimited or old_limited
+    if settings.RATELIMIT_ENABLE and settings.RATELIMIT_LEASE_SIZE:
+        ratelimited = rate_limiter.spend_local_token(request.api_key.prefix, rate, cost)
+        if ratelimited is not None:
+            set_ratelimited(request, ratelimited)
+            return
+
+    await sync_to_async(check_rate_limit, thread_sensitive=False)(request, cost)
+
+
+def set_ratelimited(request, ratelimited: bool):
+    request.limited = ratelimited or getattr(request, "limited", False)
     if ratelimited:
         cls = getattr(settings, "RATELIMIT_EXCEPTION_CLASS", Ratelimited)
         raise (import_string(cls) if isinstance(cls, str) else cls)()
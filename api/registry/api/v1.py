@@ -1,22 +1,26 @@
+import asyncio
 from datetime import datetime
-from typing import List, Optional
-from urllib.parse import urljoin
+from typing import Any, List, Optional
 
 import api_logging as logging
 import django_filters
-import requests
 from account.api import UnauthorizedException, create_community_for_account
 
 # --- Deduplication Modules
 from account.models import Account, Community, Nonce, Rules
+from account.scorer_cache import CompiledScorer, aget_compiled_scorer
 from ceramic_cache.models import CeramicCache
+from ceramic_cache.passport_cache import (
+    aget_current_stamps,
+    get_current_stamps,
+    paginate_current_stamps,
+)
 from django.conf import settings
-from django.core.cache import cache
 from eth_utils import is_checksum_address, is_checksum_formatted_address, is_hex_address
 from gql import Client, gql
 from gql.transport.requests import RequestsHTTPTransport
-from ninja import Router
-from ninja.pagination import paginate
+from ninja import Router, Schema
+from ninja.pagination import LimitOffsetPagination, paginate
 from ninja_extra.exceptions import APIException
 from pydantic import BaseModel
 from registry.api import common
@@ -32,10 +36,13 @@ from registry.api.schema import (
     SigningMessageResponse,
     StampDisplayResponse,
     SubmitPassportPayload,
+    SubmitPassportsPayload,
+    SubmitPassportsResponse,
 )
 from registry.api.utils import (
     ApiKey,
     aapi_key,
+    acheck_rate_limit,
     atrack_apikey_usage,
     check_rate_limit,
     community_requires_signature,
@@ -49,9 +56,11 @@ from registry.exceptions import (
     InvalidAddressException,
     InvalidAPIKeyPermissions,
     InvalidCommunityScoreRequestException,
+    InvalidCursorException,
     InvalidLimitException,
     InvalidNonceException,
     InvalidOrderByFieldException,
+    InvalidScorerIdException,
     InvalidSignerException,
     NotFoundApiException,
     StakingRequestError,
@@ -60,12 +69,18 @@ from registry.exceptions import (
 )
 from registry.filters import GTCStakeEventsFilter
 from registry.models import Event, GTCStakeEvent, Passport, Score, Stamp
+from registry.score_events import ascore_events
+from registry.stamp_metadata import stamp_metadata_cache
 from registry.tasks import score_passport_passport, score_registry_passport
 from registry.utils import (
+    apaginate_with_lookahead,
     decode_cursor,
     encode_cursor,
+    get_keyset_condition,
+    get_keyset_ordering,
     get_signer,
     get_signing_message,
+    paginate_with_lookahead,
     permissions_required,
     reverse_lazy_with_query,
 )
@@ -81,9 +96,6 @@ Examples of valid values for `timestamp`: \n
 - 2023-05-10\n
 """
 
-
-METADATA_URL = urljoin(settings.PASSPORT_PUBLIC_URL, "stampMetadata.json")
-
 log = logging.getLogger(__name__)
 # api = NinjaExtraAPI(urls_namespace="registry")
 router = Router()
@@ -163,7 +175,7 @@ If the status is **PROCESSING**, this means that your passport is being pulled f
 async def a_submit_passport(
     request, payload: SubmitPassportPayload
 ) -> DetailedScoreResponse:
-    check_rate_limit(request)
+    await acheck_rate_limit(request)
     try:
         log.debug("called a_submit_passport, payload=%s", payload)
 
@@ -190,8 +202,9 @@ async def ahandle_submit_passport(
     except Exception as e:
         raise e
 
-    # Get community object
-    user_community = await aget_scorer_by_id(scorer_id, account)
+    # Get community object (and the scorer) from the process-local cache
+    compiled_scorer = await aget_compiled_scorer(scorer_id, account, aget_scorer_by_id)
+    user_community = compiled_scorer.community
 
     # Verify the signer
     if payload.signature or community_requires_signature(user_community):
@@ -203,10 +216,16 @@ async def ahandle_submit_passport(
             log.error("Invalid nonce %s for address %s", payload.nonce, payload.address)
             raise InvalidNonceException()
 
+    return await ascore_address(payload.address, user_community, compiled_scorer)
+
+
+async def ascore_address(
+    address: str, user_community: Community, compiled_scorer: CompiledScorer
+) -> DetailedScoreResponse:
     # Create an empty passport instance, only needed to be able to create a pending Score
     # The passport will be updated by the score_passport task
     db_passport, _ = await Passport.objects.aupdate_or_create(
-        address=payload.address.lower(),
+        address=address.lower(),
         community=user_community,
     )
 
@@ -221,12 +240,78 @@ async def ahandle_submit_passport(
         defaults=dict(score=None, status=Score.Status.PROCESSING),
     )
 
-    await ascore_passport(user_community, db_passport, payload.address, score)
-    await score.asave()
+    async with ascore_events():
+        await ascore_passport(
+            user_community, db_passport, address, score, compiled_scorer
+        )
+        await score.asave()
 
     return DetailedScoreResponse.from_orm(score)
 
 
+async def ahandle_submit_passports(
+    payload: SubmitPassportsPayload, account: Account
+) -> SubmitPassportsResponse:
+    """
+    Score a batch of addresses for one scorer. The scorer is loaded once, and the addresses are scored
+    concurrently (up to BATCH_SUBMIT_PASSPORT_CONCURRENCY at a time).
+    Errors are reported per address, in the `error` field of the score.
+    """
+    max_addresses = settings.BATCH_SUBMIT_PASSPORT_MAX_ADDRESSES
+    if not payload.addresses or len(payload.addresses) > max_addresses:
+        raise InvalidLimitException(
+            f"Between 1 and {max_addresses} addresses can be submitted at once."
+        )
+
+    if not payload.scorer_id:
+        raise InvalidScorerIdException()
+
+    compiled_scorer = await aget_compiled_scorer(
+        payload.scorer_id, account, aget_scorer_by_id
+    )
+    user_community = compiled_scorer.community
+
+    # Signatures can only be checked for single submissions
+    if community_requires_signature(user_community):
+        raise InvalidSignerException()
+
+    semaphore = asyncio.Semaphore(settings.BATCH_SUBMIT_PASSPORT_CONCURRENCY)
+
+    async def ascore_batch_address(address: str) -> DetailedScoreResponse:
+        if not is_valid_address(address):
+            return DetailedScoreResponse(
+                address=address,
+                status=Score.Status.ERROR,
+                error=InvalidAddressException.default_detail,
+            )
+
+        async with semaphore:
+            try:
+                return await ascore_address(address, user_community, compiled_scorer)
+            except APIException as e:
+                error = e.detail
+            except Exception:
+                log.exception("Error submitting passport for address %s", address)
+                error = "Unexpected error while submitting passport"
+
+        return DetailedScoreResponse(
+            address=address, status=Score.Status.ERROR, error=str(error)
+        )
+
+    # Each address is scored once, even if it is submitted multiple times
+    addresses = list(dict.fromkeys(address.lower() for address in payload.addresses))
+    # The score history events of the whole batch are written at once
+    async with ascore_events():
+        scores = await asyncio.gather(
+            *[ascore_batch_address(address) for address in addresses]
+        )
+    scores_by_address = dict(zip(addresses, scores))
+
+    return SubmitPassportsResponse(
+        items=[scores_by_address[address.lower()] for address in payload.addresses]
+    )
+
+
 def is_valid_address(address: str) -> bool:
     return (
         is_checksum_address(address)
@@ -402,6 +487,37 @@ def handle_get_score(
         raise InvalidCommunityScoreRequestException() from e
 
 
+async def ahandle_get_score(
+    address: str, scorer_id: int, account: Account
+) -> DetailedScoreResponse:
+    try:
+        user_community = await aget_scorer_by_id(scorer_id, account)
+    except NotFoundApiException as e:
+        # Keep the error of the sync handler (get_scorer_by_id)
+        raise NotFoundApiException("No Community matches the given query.") from e
+
+    try:
+        lower_address = address.lower()
+
+        if not is_valid_address(lower_address):
+            raise InvalidAddressException()
+
+        score = await Score.objects.select_related("passport").aget(
+            passport__address=lower_address, passport__community=user_community
+        )
+        return DetailedScoreResponse.from_orm(score)
+
+    except NotFoundApiException as e:
+        raise e
+    except Exception as e:
+        log.error(
+            "Error getting passport scores. scorer_id=%s",
+            scorer_id,
+            exc_info=True,
+        )
+        raise InvalidCommunityScoreRequestException() from e
+
+
 class ScoreFilter(django_filters.FilterSet):
     last_score_timestamp__gt = django_filters.IsoDateTimeFilter(
         field_name="last_score_timestamp", lookup_expr="gt"
@@ -418,6 +534,85 @@ class ScoreFilter(django_filters.FilterSet):
         fields = ["last_score_timestamp"]
 
 
+class ScoresPagination(LimitOffsetPagination):
+    """
+    Limit / offset pagination of the `/score/{scorer_id}` API, with an opt-in keyset mode.
+
+    In keyset mode (`cursor=true` for the first page, then the `token` of the `next` link) the
+    page is read by the view with `get_scores_cursor_page`, and the scores are not counted.
+    """
+
+    class Input(LimitOffsetPagination.Input):
+        cursor: bool = False
+        token: str = ""
+
+    class Output(Schema):
+        items: List[Any]
+        count: Optional[int]
+        next: Optional[str]
+
+    def paginate_queryset(self, queryset, pagination: Input, **params):
+        if pagination.cursor or pagination.token:
+            # Already paginated by the view, which needs the request to build the next link
+            return queryset
+        return super().paginate_queryset(queryset, pagination)
+
+
+def get_scores_cursor_page(
+    request, scorer_id: int, scores, pagination: ScoresPagination.Input, query_kwargs
+) -> dict:
+    """
+    Read a page of `scores` after the cursor in `pagination.token`, with a condition on the sort
+    fields of the scores instead of an OFFSET.
+    `query_kwargs` are the query parameters (filters and order) of the next link.
+    """
+    if pagination.offset:
+        raise InvalidCursorException("The offset can't be combined with a cursor.")
+
+    # The pk makes the sort order unique
+    sort_fields = list(scores.query.order_by)
+    if "pk" not in sort_fields:
+        sort_fields.append("pk")
+    scores = scores.order_by(*get_keyset_ordering(scores.model, sort_fields))
+
+    if pagination.token:
+        try:
+            cursor = decode_cursor(pagination.token)
+        except ValueError as e:
+            raise InvalidCursorException() from e
+        # The token is only valid for the same order_by
+        if not isinstance(cursor, dict) or sorted(cursor) != sorted(sort_fields):
+            raise InvalidCursorException()
+        scores = scores.filter(get_keyset_condition(scores.model, sort_fields, cursor))
+
+    limit = pagination.limit
+    page = list(scores[: limit + 1])
+    has_more_scores = len(page) > limit
+    page = page[:limit]
+
+    next_url = None
+    if has_more_scores:
+        next_cursor = {}
+        for field in sort_fields:
+            value = getattr(page[-1], field)
+            next_cursor[field] = (
+                value.isoformat() if isinstance(value, datetime) else value
+            )
+
+        domain = request.build_absolute_uri("/")[:-1]
+        next_url = f"""{domain}{reverse_lazy_with_query(
+            "registry:get_scores",
+            args=[scorer_id],
+            query_kwargs={
+                **query_kwargs,
+                "limit": limit,
+                "token": encode_cursor(**next_cursor),
+            },
+        )}"""
+
+    return {"items": page, "count": None, "next": next_url}
+
+
 @router.get(
     "/score/{int:scorer_id}",
     auth=ApiKey(),
@@ -431,6 +626,8 @@ class ScoreFilter(django_filters.FilterSet):
     description="""Use this endpoint to fetch the scores for all addresses that are associated with a scorer\n
 This API will return a list of `DetailedScoreResponse` objects. The endpoint supports pagination and will return a maximum of 1000 scores per request.\n
 Pass a limit and offset query parameter to paginate the results. For example: `/score/1?limit=100&offset=100` will return the second page of 100 scores.\n
+For large scorers, pass `cursor=true` instead of an offset (the two can't be combined) to paginate with a cursor: the total `count` is not returned, \
+and the `next` field holds the URL of the next page (null on the last page). For example: `/score/1?limit=1000&cursor=true`.\n
 The `last_score_timestamp__gt` and `last_score_timestamp__gte` query parameters are expected to be ISO 8601 formatted timestamps:\n
 - `last_score_timestamp__gt` - will return only results having the timestamp greater than the provided value.\n
 - `last_score_timestamp__gte` - will return only results having the timestamp greater or equal than the provided value.\n
@@ -444,7 +641,7 @@ Please note that while using both parameters (`last_score_timestamp__gt` and `la
 But this generally makes no sense.
 """,
 )
-@paginate(pass_parameter="pagination_info")
+@paginate(ScoresPagination, pass_parameter="pagination_info")
 @track_apikey_usage(track_response=False)
 def get_scores(
     request,
@@ -456,7 +653,8 @@ def get_scores(
     **kwargs,
 ) -> List[DetailedScoreResponse]:
     check_rate_limit(request)
-    if kwargs["pagination_info"].limit > 1000:
+    pagination_info = kwargs["pagination_info"]
+    if pagination_info.limit > 1000:
         raise InvalidLimitException()
 
     if not request.api_key.read_scores:
@@ -493,6 +691,15 @@ def get_scores(
         # filter_values.
         scores = ScoreFilter(filter_values, queryset=scores).qs
 
+        if pagination_info.cursor or pagination_info.token:
+            query_kwargs = {
+                name: value for name, value in filter_values.items() if value
+            }
+            query_kwargs["order_by"] = order_by
+            return get_scores_cursor_page(
+                request, scorer_id, scores, pagination_info, query_kwargs
+            )
+
         return scores
 
     except Exception as e:
@@ -530,6 +737,69 @@ def get_passport_stamps(
 ) -> CursorPaginatedStampCredentialResponse:
     check_rate_limit(request)
 
+    address, direction, id_ = parse_stamps_request(address, token, limit)
+
+    if settings.PASSPORT_CACHE_TTL:
+        # Paginate the (cached) current stamps of the address in memory
+        cacheStamps, has_more_stamps, has_prev_stamps = paginate_current_stamps(
+            get_current_stamps(address), direction, id_, limit
+        )
+    else:
+        cacheStamps, has_more_stamps, has_prev_stamps = paginate_with_lookahead(
+            get_stamps_query(address, direction, id_), direction, limit
+        )
+
+    return get_stamps_response(
+        request,
+        address,
+        limit,
+        cacheStamps,
+        has_more_stamps,
+        has_prev_stamps,
+        fetch_stamp_metadata_for_provider if include_metadata else None,
+    )
+
+
+async def aget_passport_stamps(
+    request,
+    address: str,
+    token: str = "",
+    limit: int = 1000,
+    include_metadata: bool = False,
+) -> CursorPaginatedStampCredentialResponse:
+    await acheck_rate_limit(request)
+
+    address, direction, id_ = parse_stamps_request(address, token, limit)
+
+    if settings.PASSPORT_CACHE_TTL:
+        cacheStamps, has_more_stamps, has_prev_stamps = paginate_current_stamps(
+            await aget_current_stamps(address), direction, id_, limit
+        )
+    else:
+        cacheStamps, has_more_stamps, has_prev_stamps = await apaginate_with_lookahead(
+            get_stamps_query(address, direction, id_), direction, limit
+        )
+
+    get_metadata = None
+    if include_metadata and cacheStamps:
+        get_metadata = (await afetch_stamp_metadata_by_provider()).get
+
+    return get_stamps_response(
+        request,
+        address,
+        limit,
+        cacheStamps,
+        has_more_stamps,
+        has_prev_stamps,
+        get_metadata,
+    )
+
+
+def parse_stamps_request(address: str, token: str, limit: int):
+    """
+    Validate the parameters of the `/stamps/{address}` API.
+    Returns the address, and the direction and id of the cursor
+    """
     if limit > 1000:
         raise InvalidLimitException()
 
@@ -540,44 +810,48 @@ def get_passport_stamps(
     if not is_valid_address(address):
         raise InvalidAddressException()
 
+    cursor = decode_cursor(token) if token else {}
+    return address, cursor.get("d"), cursor.get("id")
+
+
+def get_stamps_query(address: str, direction: Optional[str], id_: Optional[int]):
     query = CeramicCache.objects.order_by("-id").filter(
         address=address, deleted_at__isnull=True
     )
 
-    cursor = decode_cursor(token) if token else {}
-    direction = cursor.get("d")
-    id_ = cursor.get("id")
-
     if direction == "next":
         # note we use lt here because we're querying in descending order
-        cacheStamps = list(query.filter(id__lt=id_)[:limit])
+        query = query.filter(id__lt=id_)
 
     elif direction == "prev":
-        cacheStamps = list(query.filter(id__gt=id_).order_by("id")[:limit])
-        cacheStamps.reverse()
+        query = query.filter(id__gt=id_).order_by("id")
 
-    else:
-        cacheStamps = list(query[:limit])
+    return query
 
-    has_more_stamps = has_prev_stamps = False
-    next_id = prev_id = 0
 
+def get_stamps_response(
+    request,
+    address: str,
+    limit: int,
+    cacheStamps,
+    has_more_stamps: bool,
+    has_prev_stamps: bool,
+    get_metadata=None,
+) -> CursorPaginatedStampCredentialResponse:
+    """
+    Build the response of the `/stamps/{address}` API for a page of stamps.
+    `get_metadata` returns the metadata of a provider, if the metadata is included
+    """
+    next_id = prev_id = 0
     if cacheStamps:
         next_id = cacheStamps[-1].pk
         prev_id = cacheStamps[0].pk
 
-        has_more_stamps = query.filter(id__lt=next_id).exists()
-        has_prev_stamps = query.filter(id__gt=prev_id).exists()
-
     stamps = [
         {
             "version": "1.0.0",
             "credential": cache.stamp,
-            **(
-                {"metadata": fetch_stamp_metadata_for_provider(cache.provider)}
-                if include_metadata
-                else {}
-            ),
+            **({"metadata": get_metadata(cache.provider)} if get_metadata else {}),
         }
         for cache in cacheStamps
     ]
@@ -653,66 +927,24 @@ def create_generic_scorer(request, payload: GenericCommunityPayload):
 
 
 def fetch_all_stamp_metadata() -> List[StampDisplayResponse]:
-    # Try to get the metadata from the cache
-    metadata = cache.get("metadata")
-
-    # If it's not in the cache, fetch it from the external API
-    if metadata is None:
-        try:
-            response = requests.get(METADATA_URL)
-            response.raise_for_status()
-
-            responseJson = response.json()
-
-            # Append base URL to icon URLs
-            metadata = [
-                StampDisplayResponse(
-                    **{
-                        **platformData,
-                        "icon": urljoin(
-                            settings.PASSPORT_PUBLIC_URL, platformData["icon"]
-                        ),
-                    }
-                )
-                for platformData in responseJson
-            ]
-
-            # Store the metadata in the cache, with a timeout of 1 hour
-            cache.set("metadata", metadata, 60 * 60)
-        except:
-            log.exception("Error fetching external metadata")
-
-    if metadata is None:
+    try:
+        return stamp_metadata_cache.get().platforms
+    except:
+        log.exception("Error fetching external metadata")
         raise InternalServerErrorException("Error fetching external stamp metadata")
 
-    return metadata
 
+async def afetch_stamp_metadata_by_provider() -> dict:
+    try:
+        return (await stamp_metadata_cache.aget()).by_provider
+    except:
+        log.exception("Error fetching external metadata")
+        raise InternalServerErrorException("Error fetching external stamp metadata")
 
-def fetch_stamp_metadata_for_provider(provider: str):
-    metadataByProvider = cache.get("metadataByProvider")
 
+def fetch_stamp_metadata_for_provider(provider: str):
     try:
-        if metadataByProvider is None:
-            metadata = fetch_all_stamp_metadata()
-            metadataByProvider = {
-                stamp.name: {
-                    "name": stamp.name,
-                    "description": stamp.description,
-                    "hash": stamp.hash,
-                    "group": group.name,
-                    "platform": {
-                        "name": platform.name,
-                        "id": platform.id,
-                        "icon": platform.icon,
-                        "description": platform.description,
-                        "connectMessage": platform.connectMessage,
-                    },
-                }
-                for platform in metadata
-                for group in platform.groups
-                for stamp in group.stamps
-            }
-            cache.set("metadataByProvider", metadataByProvider, 60 * 60)
+        metadataByProvider = stamp_metadata_cache.get().by_provider
     except:
         log.exception("Error fetching external metadata")
         raise InternalServerErrorException(
@@ -763,3 +995,19 @@ def get_gtc_stake(request, address: str, round_id: int) -> GtcEventsResponse:
         return {"results": [obj for obj in filtered_queryset.values()]}
     except Exception as e:
         raise StakingRequestError()
+
+
+async def ahandle_get_gtc_stake(address: str, round_id: int) -> GtcEventsResponse:
+    address = address.lower()
+
+    if not is_valid_address(address):
+        raise InvalidAddressException()
+
+    params = {"address": address, "round_id": round_id}
+
+    try:
+        queryset = with_read_db(GTCStakeEvent)
+        filtered_queryset = GTCStakeEventsFilter(data=params, queryset=queryset).qs
+        return {"results": [obj async for obj in filtered_queryset.values()]}
+    except Exception as e:
+        raise StakingRequestError()
@@ -5,8 +5,10 @@ import api_logging as logging
 
 # --- Deduplication Modules
 from account.models import Account, Community
+from django.conf import settings
 from django.db.models import Max, Q
 from ninja import Router
+from ninja_extra.exceptions import APIException
 from registry.api import common, v1
 from registry.api.schema import (
     CursorPaginatedHistoricalScoreResponse,
@@ -17,20 +19,25 @@ from registry.api.schema import (
     SigningMessageResponse,
     StampDisplayResponse,
     SubmitPassportPayload,
+    SubmitPassportsPayload,
+    SubmitPassportsResponse,
 )
 from registry.api.utils import (
     ApiKey,
-    check_rate_limit,
-    track_apikey_usage,
+    acheck_rate_limit,
+    atrack_apikey_usage,
     with_read_db,
 )
 from registry.exceptions import (
+    InternalServerErrorException,
     InvalidAddressException,
+    InvalidAPIKeyPermissions,
     InvalidLimitException,
-    api_get_object_or_404,
+    aapi_get_object_or_404,
 )
 from registry.models import Score
 from registry.utils import (
+    apaginate_with_lookahead,
     decode_cursor,
     encode_cursor,
     get_cursor_query_condition,
@@ -80,9 +87,47 @@ async def a_submit_passport(
     return await v1.a_submit_passport(request, payload)
 
 
+@router.post(
+    "/submit-passports",
+    auth=v1.aapi_key,
+    response={
+        200: SubmitPassportsResponse,
+        401: ErrorMessageResponse,
+        400: ErrorMessageResponse,
+        404: ErrorMessageResponse,
+    },
+    summary="Submit a batch of Ethereum addresses to the Scorer",
+    description=f"""Use this API to submit up to {settings.BATCH_SUBMIT_PASSPORT_MAX_ADDRESSES} addresses for scoring with the same scorer.\n
+This API will return a `DetailedScoreResponse` structure for each of the submitted addresses, in the order in which they were submitted.\n
+If an address could not be scored, its status will be **ERROR** and the `error` field will contain the reason.
+Each submitted address counts as one request towards the rate limit of the API key, the batch is rejected if it exceeds the remaining quota.
+""",
+)
+@atrack_apikey_usage(track_response=False, payload_param_name="payload")
+async def a_submit_passports(
+    request, payload: SubmitPassportsPayload
+) -> SubmitPassportsResponse:
+    # Each address is scored, and counts as a request
+    await acheck_rate_limit(request, cost=max(1, len(payload.addresses)))
+    try:
+        log.debug("called a_submit_passports, payload=%s", payload)
+
+        if not request.api_key.submit_passports:
+            raise InvalidAPIKeyPermissions()
+
+        return await v1.ahandle_submit_passports(payload, request.auth)
+    except APIException as e:
+        raise e
+    except Exception as e:
+        log.exception("Error submitting passports: %s", e)
+        raise InternalServerErrorException(
+            "Unexpected error while submitting passports"
+        )
+
+
 @router.get(
     "/score/{int:scorer_id}",
-    auth=ApiKey(),
+    auth=v1.aapi_key,
     response={
         200: CursorPaginatedScoreResponse,
         401: ErrorMessageResponse,
@@ -97,8 +142,8 @@ This endpoint will return a `CursorPaginatedScoreResponse`.\n
 Note: results will be sorted ascending by `["last_score_timestamp", "id"]`
 """,
 )
-@track_apikey_usage(track_response=False)
-def get_scores(
+@atrack_apikey_usage(track_response=False)
+async def get_scores(
     request,
     scorer_id: int,
     address: Optional[str] = None,
@@ -107,13 +152,13 @@ def get_scores(
     token: str = None,
     limit: int = 1000,
 ) -> CursorPaginatedScoreResponse:
-    check_rate_limit(request)
+    await acheck_rate_limit(request)
 
     if limit > 1000:
         raise InvalidLimitException()
 
     # Get community object
-    user_community = api_get_object_or_404(
+    user_community = await aapi_get_object_or_404(
         Community, id=scorer_id, account=request.auth
     )
     try:
@@ -129,7 +174,6 @@ def get_scores(
         sort_fields = ["last_score_timestamp", "id"]
 
         if cursor:
-            cursor = decode_cursor(token)
             cursor["last_score_timestamp"] = datetime.fromisoformat(
                 cursor.get("last_score_timestamp")
             )
@@ -153,15 +197,12 @@ def get_scores(
                     last_score_timestamp__gte=last_score_timestamp__gte
                 )
 
-        has_more_scores = has_prev_scores = False
         next_cursor = prev_cursor = {}
 
         query = base_query.filter(filter_condition).order_by(*field_ordering)
-        scores = query[:limit]
-        scores = list(scores)
-
-        if cursor and cursor["d"] == "prev":
-            scores.reverse()
+        scores, has_more_scores, has_prev_scores = await apaginate_with_lookahead(
+            query, cursor["d"] if cursor else None, limit
+        )
 
         if scores:
             next_id = scores[-1].id
@@ -186,12 +227,6 @@ def get_scores(
                 last_score_timestamp__gte=last_score_timestamp__gte,
             )
 
-            next_filter_cond, _ = get_cursor_query_condition(next_cursor, sort_fields)
-            prev_filter_cond, _ = get_cursor_query_condition(prev_cursor, sort_fields)
-
-            has_more_scores = base_query.filter(next_filter_cond).exists()
-            has_prev_scores = base_query.filter(prev_filter_cond).exists()
-
         domain = request.build_absolute_uri("/")[:-1]
 
         next_url = (
@@ -231,7 +266,7 @@ def get_scores(
 
 @router.get(
     "/stamps/{str:address}",
-    auth=ApiKey(),
+    auth=v1.aapi_key,
     response={
         200: CursorPaginatedStampCredentialResponse,
         400: ErrorMessageResponse,
@@ -244,14 +279,17 @@ This endpoint will return a `CursorPaginatedStampCredentialResponse`.\n
     # This prevents returning {metadata: None} in the response
     exclude_unset=True,
 )
-def get_passport_stamps(
+@atrack_apikey_usage(track_response=False)
+async def get_passport_stamps(
     request,
     address: str,
     token: str = "",
     limit: int = 1000,
     include_metadata: bool = False,
 ) -> CursorPaginatedStampCredentialResponse:
-    return v1.get_passport_stamps(request, address, token, limit, include_metadata)
+    return await v1.aget_passport_stamps(
+        request, address, token, limit, include_metadata
+    )
 
 
 @router.get(
@@ -272,23 +310,23 @@ def stamp_display(request) -> List[StampDisplayResponse]:
     "gtc-stake/{str:address}/{int:round_id}",
     summary="Retrieve GTC stake amounts for the GTC Staking stamp",
     description="Get self and community GTC staking amounts based on address and round ID",
-    auth=ApiKey(),
+    auth=v1.aapi_key,
     response=v1.GtcEventsResponse,
 )
-def get_gtc_stake(request, address: str, round_id: str):
+async def get_gtc_stake(request, address: str, round_id: str):
     if not v1.is_valid_address(address):
         raise InvalidAddressException()
-    return v1.get_gtc_stake(request, address, round_id)
+    return await v1.ahandle_get_gtc_stake(address, round_id)
 
 
 @router.get(
     common.history_endpoint["url"],
-    auth=common.history_endpoint["auth"],
+    auth=v1.aapi_key,
     response=common.history_endpoint["response"],
     summary=common.history_endpoint["summary"],
     description=common.history_endpoint["description"],
 )
-def get_score_history(
+async def get_score_history(
     request,
     scorer_id: int,
     address: Optional[str] = None,
@@ -298,14 +336,14 @@ def get_score_history(
 ) -> CursorPaginatedHistoricalScoreResponse:
     if address and not v1.is_valid_address(address):
         raise InvalidAddressException()
-    return common.history_endpoint["handler"](
+    return await common.aget_score_history(
         request, scorer_id, address, created_at, token, limit
     )
 
 
 @router.get(
     "/score/{int:scorer_id}/{str:address}",
-    auth=ApiKey(),
+    auth=v1.aapi_key,
     response={
         200: DetailedScoreResponse,
         401: ErrorMessageResponse,
@@ -318,5 +356,11 @@ This endpoint will return a `DetailedScoreResponse`. This endpoint will also ret
 {v1.SCORE_TIMESTAMP_FIELD_DESCRIPTION}
 """,
 )
-def get_score(request, address: str, scorer_id: int) -> DetailedScoreResponse:
-    return v1.get_score(request, address, scorer_id)
+@atrack_apikey_usage(track_response=False)
+async def get_score(request, address: str, scorer_id: int) -> DetailedScoreResponse:
+    await acheck_rate_limit(request)
+
+    if not request.api_key.read_scores:
+        raise InvalidAPIKeyPermissions()
+
+    return await v1.ahandle_get_score(address, scorer_id, request.auth)
@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class RegistryConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "registry"
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+
+        from .scoring_metrics import install_query_counter
+
+        connection_created.connect(install_query_counter)
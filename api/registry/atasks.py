@@ -1,17 +1,21 @@
+import asyncio
 import copy
+import time
 from datetime import datetime
-from typing import Dict, List
+from typing import Dict, List, Optional
 
 import api_logging as logging
 from account.deduplication.lifo import alifo
 
 # --- Deduplication Modules
-from account.models import AccountAPIKeyAnalytics, Community, Rules
+from account.models import Community, Rules
+from account.scorer_cache import CompiledScorer, acompile_scorer
 from django.conf import settings
 from ninja_extra.exceptions import APIException
 from reader.passport_reader import aget_passport, get_did
 from registry.exceptions import NoPassportException
 from registry.models import Passport, Score, Stamp
+from registry.scoring_metrics import get_scoring_timer, scoring_timer
 from registry.utils import get_utc_time, validate_credential, verify_issuer
 
 log = logging.getLogger(__name__)
@@ -19,60 +23,6 @@ log = logging.getLogger(__name__)
 Hash = str
 
 
-sensitive_headers_data = {
-    "X-Api-Key",
-    "Cookie",
-    "Authorization",
-    "x-api-key",
-    "cookie",
-    "authorization",
-}
-
-
-async def asave_api_key_analytics(
-    api_key_id,
-    path,
-    path_segments,
-    query_params,
-    headers,
-    payload,
-    response,
-    response_skipped,
-    error,
-):
-    try:
-        if settings.FF_API_ANALYTICS == "on":
-            cleaned_headers = dict(headers)
-            for sensitive_field in sensitive_headers_data:
-                if sensitive_field in cleaned_headers:
-                    cleaned_headers[sensitive_field] = "***"
-
-            await AccountAPIKeyAnalytics.objects.acreate(
-                api_key_id=api_key_id,
-                path=path,
-                path_segments=path_segments,
-                query_params=query_params,
-                payload=payload,
-                headers=cleaned_headers,
-                response=response,
-                response_skipped=response_skipped,
-                error=error,
-            )
-
-    except Exception as e:
-        log.error("Failed to save analytics. Error: '%s'", e, exc_info=True)
-
-
-async def aremove_stale_stamps_from_db(passport: Passport, passport_data: dict):
-    current_hashes = [
-        stamp["credential"]["credentialSubject"]["hash"]
-        for stamp in passport_data["stamps"]
-    ]
-    await Stamp.objects.filter(passport=passport).exclude(
-        hash__in=current_hashes
-    ).adelete()
-
-
 async def aload_passport_data(address: str) -> Dict:
     # Get the passport data from the blockchain or ceramic cache
     passport_data = await aget_passport(address)
@@ -82,15 +32,33 @@ async def aload_passport_data(address: str) -> Dict:
     return passport_data
 
 
-async def acalculate_score(passport: Passport, community_id: int, score: Score):
+def get_providers_for_passport(deduped_passport_data: dict) -> List[str]:
+    """
+    Return the providers of the stamps that `asave_stamps` writes for this passport (1 stamp per hash)
+    """
+    return list(
+        {
+            stamp["credential"]["credentialSubject"]["hash"]: stamp["provider"]
+            for stamp in deduped_passport_data["stamps"]
+        }.values()
+    )
+
+
+async def acalculate_score(
+    passport: Passport,
+    compiled_scorer: CompiledScorer,
+    score: Score,
+    deduped_passport_data: dict,
+):
     log.debug("Scoring")
-    user_community = await Community.objects.aget(pk=community_id)
 
-    scorer = await user_community.aget_scorer()
-    scores = await scorer.acompute_score([passport.id])
+    # Score the in-memory deduplicated passport, the stamps have just been saved
+    # so there is no need to read them back from the DB
+    scoreData = compiled_scorer.compute_score(
+        get_providers_for_passport(deduped_passport_data)
+    )
 
-    log.info("Scores for address '%s': %s", passport.address, scores)
-    scoreData = scores[0]
+    log.info("Score for address '%s': %s", passport.address, scoreData)
 
     score.score = scoreData.score
     score.status = Score.Status.DONE
@@ -148,72 +116,139 @@ async def aprocess_deduplication(passport, community, passport_data, score: Scor
     return deduplicated_passport
 
 
+async def avalidate_stamp(did: str, stamp: dict) -> bool:
+    """
+    Validate a single stamp: checks the expiration date, the issuer and finally verifies
+    the credential with didkit. Returns True if the stamp is valid.
+    """
+    log.debug(
+        "validating credential did='%s' credential='%s'", did, stamp["credential"]
+    )
+    try:
+        # TODO: use some library or https://docs.python.org/3/library/datetime.html#datetime.datetime.fromisoformat to
+        # parse iso timestamps
+        stamp_expiration_date = datetime.strptime(
+            stamp["credential"]["expirationDate"], "%Y-%m-%dT%H:%M:%S.%fZ"
+        )
+    except ValueError:
+        stamp_expiration_date = datetime.strptime(
+            stamp["credential"]["expirationDate"], "%Y-%m-%dT%H:%M:%SZ"
+        )
+
+    is_issuer_verified = verify_issuer(stamp)
+    # check that expiration date is not in the past
+    stamp_is_expired = stamp_expiration_date < datetime.now()
+    stamp_return_errors = []
+    valid = False
+    if not stamp_is_expired and is_issuer_verified:
+        # do expensive operation last
+        verification_started_at = time.perf_counter()
+        stamp_return_errors = await validate_credential(did, stamp["credential"])
+        get_scoring_timer().record_stamp_verification(
+            time.perf_counter() - verification_started_at
+        )
+        if len(stamp_return_errors) == 0:
+            valid = True
+
+    if not valid:
+        log.info(
+            "Stamp not created. Stamp=%s\nReason: errors=%s stamp_is_expired=%s is_issuer_verified=%s",
+            stamp,
+            stamp_return_errors,
+            stamp_is_expired,
+            is_issuer_verified,
+        )
+
+    return valid
+
+
 async def avalidate_credentials(passport: Passport, passport_data) -> dict:
+    """
+    Validate all stamps in the passport. If `CREDENTIAL_VERIFICATION_CONCURRENCY` is greater than 1,
+    the stamps are verified concurrently, with at most that many verifications in flight at once.
+    The order of the stamps in the returned passport is the same as in `passport_data`.
+    """
     log.debug("validating credentials")
 
     validated_passport = copy.deepcopy(passport_data)
     validated_passport["stamps"] = []
 
     did = get_did(passport.address)
+    stamps = passport_data["stamps"]
+    concurrency = settings.CREDENTIAL_VERIFICATION_CONCURRENCY
 
-    for stamp in passport_data["stamps"]:
-        log.debug(
-            "validating credential did='%s' credential='%s'", did, stamp["credential"]
-        )
-        try:
-            # TODO: use some library or https://docs.python.org/3/library/datetime.html#datetime.datetime.fromisoformat to
-            # parse iso timestamps
-            stamp_expiration_date = datetime.strptime(
-                stamp["credential"]["expirationDate"], "%Y-%m-%dT%H:%M:%S.%fZ"
-            )
-        except ValueError:
-            stamp_expiration_date = datetime.strptime(
-                stamp["credential"]["expirationDate"], "%Y-%m-%dT%H:%M:%SZ"
-            )
+    if concurrency > 1:
+        semaphore = asyncio.Semaphore(concurrency)
 
-        is_issuer_verified = verify_issuer(stamp)
-        # check that expiration date is not in the past
-        stamp_is_expired = stamp_expiration_date < datetime.now()
-        stamp_return_errors = []
-        valid = False
-        if not stamp_is_expired and is_issuer_verified:
-            # do expensive operation last
-            stamp_return_errors = await validate_credential(did, stamp["credential"])
-            if len(stamp_return_errors) == 0:
-                valid = True
+        async def abounded_validate_stamp(stamp: dict) -> bool:
+            async with semaphore:
+                return await avalidate_stamp(did, stamp)
 
+        results = await asyncio.gather(
+            *[abounded_validate_stamp(stamp) for stamp in stamps]
+        )
+    else:
+        results = [await avalidate_stamp(did, stamp) for stamp in stamps]
+
+    for stamp, valid in zip(stamps, results):
         if valid:
             validated_passport["stamps"].append(copy.deepcopy(stamp))
-        else:
-            log.info(
-                "Stamp not created. Stamp=%s\nReason: errors=%s stamp_is_expired=%s is_issuer_verified=%s",
-                stamp,
-                stamp_return_errors,
-                stamp_is_expired,
-                is_issuer_verified,
-            )
 
     return validated_passport
 
 
 async def asave_stamps(passport: Passport, deduped_passport_data) -> None:
+    """
+    Synchronise the stamps in the DB with the deduplicated passport.
+    This will use a constant number of queries regardless of the number of stamps:
+    - load the hashes of the existing stamps
+    - insert or update (on conflict) all current stamps in 1 statement
+    - delete the stale stamps (only if there are any)
+    """
     log.debug(
         "saving stamps deduped_passport_data: %s", deduped_passport_data["stamps"]
     )
 
-    for stamp in deduped_passport_data["stamps"]:
-        await Stamp.objects.aupdate_or_create(
-            hash=stamp["credential"]["credentialSubject"]["hash"],
-            passport=passport,
-            defaults={
-                "provider": stamp["provider"],
-                "credential": stamp["credential"],
-            },
+    # Dedupe by hash, a single INSERT ... ON CONFLICT cannot update the same row twice
+    stamps_by_hash = {
+        stamp["credential"]["credentialSubject"]["hash"]: stamp
+        for stamp in deduped_passport_data["stamps"]
+    }
+
+    existing_hashes = {
+        stamp_hash
+        async for stamp_hash in Stamp.objects.filter(passport=passport).values_list(
+            "hash", flat=True
+        )
+    }
+
+    if stamps_by_hash:
+        await Stamp.objects.abulk_create(
+            [
+                Stamp(
+                    hash=stamp_hash,
+                    passport=passport,
+                    provider=stamp["provider"],
+                    credential=stamp["credential"],
+                )
+                for stamp_hash, stamp in stamps_by_hash.items()
+            ],
+            update_conflicts=True,
+            unique_fields=["hash", "passport"],
+            update_fields=["provider", "credential"],
         )
 
+    stale_hashes = existing_hashes - stamps_by_hash.keys()
+    if stale_hashes:
+        await Stamp.objects.filter(passport=passport, hash__in=stale_hashes).adelete()
+
 
 async def ascore_passport(
-    community: Community, passport: Passport, address: str, score: Score
+    community: Community,
+    passport: Passport,
+    address: str,
+    score: Score,
+    compiled_scorer: Optional[CompiledScorer] = None,
 ):
     log.info(
         "score_passport request for community_id=%s, address='%s'",
@@ -221,15 +256,40 @@ async def ascore_passport(
         address,
     )
 
-    try:
-        passport_data = await aload_passport_data(address)
-        validated_passport_data = await avalidate_credentials(passport, passport_data)
-        deduped_passport_data = await aprocess_deduplication(
-            passport, community, validated_passport_data, score
+    with scoring_timer() as timer:
+        await arun_scoring_stages(
+            timer, community, passport, address, score, compiled_scorer
         )
-        await asave_stamps(passport, deduped_passport_data)
-        await aremove_stale_stamps_from_db(passport, deduped_passport_data)
-        await acalculate_score(passport, community.pk, score)
+        timer.finish(score.status, community_id=community.pk, address=address)
+
+
+async def arun_scoring_stages(
+    timer,
+    community: Community,
+    passport: Passport,
+    address: str,
+    score: Score,
+    compiled_scorer: Optional[CompiledScorer],
+):
+    try:
+        with timer.stage("load"):
+            passport_data = await aload_passport_data(address)
+        with timer.stage("validate"):
+            validated_passport_data = await avalidate_credentials(
+                passport, passport_data
+            )
+        with timer.stage("dedup"):
+            deduped_passport_data = await aprocess_deduplication(
+                passport, community, validated_passport_data, score
+            )
+        with timer.stage("save"):
+            await asave_stamps(passport, deduped_passport_data)
+        with timer.stage("score"):
+            if compiled_scorer is None:
+                compiled_scorer = await acompile_scorer(community)
+            await acalculate_score(
+                passport, compiled_scorer, score, deduped_passport_data
+            )
 
     except APIException as e:
         log.error(
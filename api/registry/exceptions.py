@@ -78,6 +78,11 @@ class InvalidOrderByFieldException(APIException):
     default_detail = "Invalid order_by_field value"
 
 
+class InvalidCursorException(APIException):
+    status_code = status.HTTP_400_BAD_REQUEST
+    default_detail = "Invalid pagination token."
+
+
 class StakingRequestError(APIException):
     status_code = status.HTTP_400_BAD_REQUEST
     default_detail = "Error pulling GTC staking data"
@@ -2,10 +2,12 @@ import json
 from datetime import datetime
 
 from account.models import Community
+from account.scorer_cache import invalidate_compiled_scorers
 from django.conf import settings
 from django.core.management.base import BaseCommand
 from django.db.models import Q, QuerySet
 from registry.models import Passport, Score, Stamp
+from registry.score_events import ScoreEventBuffer
 from registry.utils import get_utc_time
 from scorer_weighted.models import BinaryWeightedScorer, RescoreRequest, WeightedScorer
 
@@ -89,6 +91,9 @@ class Command(BaseCommand):
         weighted_scorers.update(weights=weights)
         binary_weighted_scorers.update(weights=weights, threshold=threshold)
 
+        # `update` does not send the post_save signals, so invalidate the cached scorers explicitly
+        invalidate_compiled_scorers(communities.values_list("id", flat=True))
+
         print(
             "Updated scorers:",
             weighted_scorers.count() + binary_weighted_scorers.count(),
@@ -139,6 +144,9 @@ scorer type: {scorer.type}, {type(scorer)}"""
                     calculated_scores = scorer.recompute_score(passport_ids, stamps)
                     scores_to_update = []
                     scores_to_create = []
+                    # bulk_create and bulk_update do not send the pre_save signal, so the
+                    # score history events are recorded here
+                    score_events = ScoreEventBuffer()
 
                     for p, scoreData in zip(passports, calculated_scores):
                         passport_scores = list(p.score.all())
@@ -161,6 +169,7 @@ scorer type: {scorer.type}, {type(scorer)}"""
                         )
                         score.error = None
                         score.stamp_scores = scoreData.stamp_scores
+                        score_events.add(score, p.address, p.community_id)
 
                     if scores_to_create:
                         Score.objects.bulk_create(scores_to_create)
@@ -178,6 +187,8 @@ scorer type: {scorer.type}, {type(scorer)}"""
                             ],
                         )
 
+                    score_events.flush()
+
                 elapsed = datetime.now() - start
                 rate = "-"
                 if count > 0:
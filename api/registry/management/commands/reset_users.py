@@ -1,5 +1,6 @@
 from account.models import Community
 from ceramic_cache.models import CeramicCache
+from ceramic_cache.passport_cache import invalidate_passport_cache
 from django.core.management.base import BaseCommand
 from registry.models import Passport, Score, Stamp
 from registry.utils import get_utc_time
@@ -52,6 +53,7 @@ class Command(BaseCommand):
                 address__in=addresses, deleted_at__isnull=True
             )
             ceramic_cache_entries.update(deleted_at=now, updated_at=now)
+            invalidate_passport_cache(addresses)
 
             passports = Passport.objects.filter(address__in=addresses).order_by(
                 "community"
@@ -81,17 +81,16 @@ class Score(models.Model):
 
 @receiver(pre_save, sender=Score)
 def score_updated(sender, instance, **kwargs):
+    from .score_events import record_score_update
+
     if instance.status != Score.Status.DONE:
         return instance
 
-    Event.objects.create(
-        action=Event.Action.SCORE_UPDATE,
+    # The event is buffered if the score is saved within `score_events` / `ascore_events`
+    record_score_update(
+        instance,
         address=instance.passport.address,
-        community=instance.passport.community,
-        data={
-            "score": float(instance.score) if instance.score != None else 0,
-            "evidence": instance.evidence,
-        },
+        community_id=instance.passport.community_id,
     )
 
     return instance
@@ -0,0 +1,237 @@
+"""
+Token bucket rate limiter for the API keys, shared by all processes through redis.
+
+Checking the rate limit with django_ratelimit takes a redis round-trip for every request. Instead,
+each process leases tokens from the bucket of the API key in redis, in batches with a single script
+call, and spends them locally:
+- the bucket holds up to `limit` tokens and is refilled continuously at `limit / period` tokens per second
+- the lease size starts at 1 and doubles each time a lease is used up within RATELIMIT_LEASE_SECONDS,
+  up to RATELIMIT_LEASE_SIZE tokens and 1/10th of the limit. Busy API keys take a round-trip every
+  few requests, while keys with few requests are not leased more tokens than they need
+- tokens not spent within RATELIMIT_LEASE_SECONDS are returned to the bucket with the next lease, so
+  each process holds at most one lease per API key outside of redis
+- once the bucket is empty, the requests are rejected locally until the next token is due
+- a request may cost several tokens (e.g. one per address of a batch), it is rejected as a whole
+  if the bucket holds fewer tokens than its cost
+
+If redis is unavailable (or the cache is not redis), the rate limit is checked with a fixed window
+counter in the cache (see `is_ratelimited_in_window`).
+"""
+
+import re
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+import api_logging as logging
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.redis import RedisCache
+
+log = logging.getLogger(__name__)
+
+# Delay before redis is used again after a failure
+REDIS_RETRY_SECONDS = 10
+
+# The rate limits are written like "125/15m", the unit defaults to seconds and only its first
+# letter counts (e.g. "3/30seconds")
+RATE_RE = re.compile(r"(\d+)/(\d*)([smhd])?")
+RATE_UNITS = {"s": 1, "m": 60, "h": 60 * 60, "d": 24 * 60 * 60}
+
+# KEYS[1]: bucket
+# ARGV: capacity, period (seconds), requested tokens, returned tokens
+# Returns the number of tokens granted and, if none were granted, the milliseconds until the next token
+LEASE_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local period = tonumber(ARGV[2])
+local requested = tonumber(ARGV[3])
+local returned = tonumber(ARGV[4])
+
+-- Before redis 5, writing after the (non deterministic) TIME requires replicating the effects of the script
+redis.replicate_commands()
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1])
+local ts = tonumber(bucket[2])
+if tokens == nil or ts == nil then
+    tokens = capacity
+    ts = now
+end
+
+tokens = math.min(capacity, tokens + returned + math.max(0, now - ts) * capacity / period)
+local granted = math.min(requested, math.floor(tokens))
+tokens = tokens - granted
+
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+-- The bucket is full again after `period` seconds
+redis.call('EXPIRE', KEYS[1], math.ceil(period))
+
+if granted > 0 then
+    return {granted, 0}
+end
+return {0, math.ceil((1 - tokens) * period / capacity * 1000)}
+"""
+
+
+def split_rate(rate: str) -> Tuple[int, int]:
+    """
+    Return the number of requests and the period in seconds of a rate like "125/15m" (the format
+    of the rate limits of the API keys)
+    """
+    count, multiplier, unit = RATE_RE.match(rate).groups()
+    return int(count), int(multiplier or 1) * RATE_UNITS[unit or "s"]
+
+
+def is_ratelimited_in_window(key: str, rate: str, cost: int = 1) -> bool:
+    """
+    Count `cost` requests of `key` in the current fixed window of `rate`, with a single increment
+    of a counter in the cache. A request that exceeds the remaining quota is rejected as a whole
+    and is not counted, like with the token bucket.
+    """
+    limit, period = split_rate(rate)
+    cache = caches["default"]
+    window_key = f"ratelimit:window:{key}:{period}:{int(time.time()) // period}"
+    try:
+        cache.add(window_key, 0, period)
+        count = cache.incr(window_key, cost)
+        if count > limit:
+            cache.decr(window_key, cost)
+            return True
+        return False
+    except Exception:
+        log.warning(
+            "Failed to count the request in the rate limit window", exc_info=True
+        )
+        return not settings.RATELIMIT_FAIL_OPEN
+
+
+class Lease:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.tokens = 0
+        self.size = 1
+        self.expires_at = 0.0
+        self.denied_until = 0.0
+
+
+class TokenBucketRateLimiter:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._leases: Dict[Tuple[str, str], Lease] = {}
+        self._script = None
+        self._retry_at = 0.0
+
+    def is_ratelimited(self, key: str, rate: str, cost: int = 1) -> Optional[bool]:
+        """
+        Spend `cost` tokens of the bucket `key` (limited to `rate`, e.g. "125/15m").
+        Returns None if redis is unavailable.
+        """
+        if not self.is_available():
+            return None
+
+        limit, period = split_rate(rate)
+        lease = self._get_lease(key, rate)
+
+        with lease.lock:
+            now = time.monotonic()
+            ratelimited = self._spend(lease, now, cost)
+            if ratelimited is not None:
+                return ratelimited
+
+            if now < lease.expires_at:
+                # The lease was used up in time, lease more tokens
+                size = min(lease.size * 2, self.max_lease_size(limit))
+            else:
+                size = 1
+
+            try:
+                granted, wait_ms = self.lease(
+                    key, limit, period, max(size, cost), lease.tokens
+                )
+            except Exception:
+                log.warning("Failed to lease rate limit tokens", exc_info=True)
+                self._retry_at = time.monotonic() + REDIS_RETRY_SECONDS
+                return None
+
+            lease.size = size
+            lease.expires_at = now + settings.RATELIMIT_LEASE_SECONDS
+            if not granted:
+                lease.tokens = 0
+                lease.denied_until = now + wait_ms / 1000
+                return True
+
+            if granted < cost:
+                # Keep the tokens for the next (cheaper) requests
+                lease.tokens = granted
+                return True
+
+            lease.tokens = granted - cost
+            return False
+
+    def spend_local_token(self, key: str, rate: str, cost: int = 1) -> Optional[bool]:
+        """
+        Like `is_ratelimited`, but only if this can be decided without calling redis (or waiting
+        for another thread calling redis). Returns None otherwise.
+        """
+        if not self.is_available():
+            return None
+
+        lease = self._leases.get((key, rate))
+        if lease is None or not lease.lock.acquire(blocking=False):
+            return None
+        try:
+            return self._spend(lease, time.monotonic(), cost)
+        finally:
+            lease.lock.release()
+
+    def _spend(self, lease: Lease, now: float, cost: int) -> Optional[bool]:
+        if now < lease.denied_until:
+            return True
+        if lease.tokens >= cost and now < lease.expires_at:
+            lease.tokens -= cost
+            return False
+        return None
+
+    def is_available(self) -> bool:
+        return time.monotonic() >= self._retry_at and isinstance(
+            caches["default"], RedisCache
+        )
+
+    def max_lease_size(self, limit: int) -> int:
+        return max(1, min(settings.RATELIMIT_LEASE_SIZE, limit // 10))
+
+    def lease(
+        self, key: str, limit: int, period: int, requested: int, returned: int
+    ) -> Tuple[int, int]:
+        """
+        Take up to `requested` tokens from the bucket in redis, after returning the unused ones
+        """
+        cache = caches["default"]
+        bucket = cache.make_key(f"ratelimit:{key}")
+        client = cache._cache.get_client(bucket, write=True)
+        if self._script is None:
+            self._script = client.register_script(LEASE_SCRIPT)
+        granted, wait_ms = self._script(
+            keys=[bucket], args=[limit, period, requested, returned], client=client
+        )
+        return int(granted), int(wait_ms)
+
+    def _get_lease(self, key: str, rate: str) -> Lease:
+        lease = self._leases.get((key, rate))
+        if lease is None:
+            with self._lock:
+                lease = self._leases.setdefault((key, rate), Lease())
+        return lease
+
+    def clear(self):
+        """
+        Drop the local leases
+        """
+        with self._lock:
+            self._leases = {}
+        self._retry_at = 0.0
+
+
+rate_limiter = TokenBucketRateLimiter()
@@ -0,0 +1,106 @@
+"""
+Buffered writer for the SCORE_UPDATE events (the score history).
+
+While a `ScoreEventBuffer` is active (see `score_events` / `ascore_events`) the SCORE_UPDATE events
+are collected in memory, including the ones emitted by the `score_updated` pre_save receiver, and
+are written with a single `bulk_create` when the buffer is closed. Outside of a buffer, the events
+are written immediately.
+"""
+
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import List, Optional
+
+import api_logging as logging
+from registry.models import Event, Score
+
+log = logging.getLogger(__name__)
+
+EVENT_BULK_CREATE_BATCH_SIZE = 1000
+
+_current_buffer: ContextVar[Optional["ScoreEventBuffer"]] = ContextVar(
+    "score_event_buffer", default=None
+)
+
+
+def get_score_update_event(score: Score, address: str, community_id: int) -> Event:
+    return Event(
+        action=Event.Action.SCORE_UPDATE,
+        address=address,
+        community_id=community_id,
+        data={
+            "score": float(score.score) if score.score != None else 0,
+            "evidence": score.evidence,
+        },
+    )
+
+
+class ScoreEventBuffer:
+    def __init__(self):
+        self.events: List[Event] = []
+
+    def add(self, score: Score, address: str, community_id: int):
+        self.events.append(get_score_update_event(score, address, community_id))
+
+    def flush(self):
+        events, self.events = self.events, []
+        if events:
+            Event.objects.bulk_create(events, batch_size=EVENT_BULK_CREATE_BATCH_SIZE)
+
+    async def aflush(self):
+        events, self.events = self.events, []
+        if events:
+            await Event.objects.abulk_create(
+                events, batch_size=EVENT_BULK_CREATE_BATCH_SIZE
+            )
+
+
+@contextmanager
+def score_events():
+    """
+    Buffer the SCORE_UPDATE events emitted in this block, and write them when the block exits.
+    If a buffer is already active, that buffer is used (and written by its owner).
+    """
+    buffer = _current_buffer.get()
+    if buffer is not None:
+        yield buffer
+        return
+
+    buffer = ScoreEventBuffer()
+    token = _current_buffer.set(buffer)
+    try:
+        yield buffer
+    finally:
+        _current_buffer.reset(token)
+        buffer.flush()
+
+
+@asynccontextmanager
+async def ascore_events():
+    """
+    Async version of `score_events`. The buffer is also used by the tasks started in this block
+    and by the code run with `sync_to_async` (e.g. `Score.asave`), as they copy the context.
+    """
+    buffer = _current_buffer.get()
+    if buffer is not None:
+        yield buffer
+        return
+
+    buffer = ScoreEventBuffer()
+    token = _current_buffer.set(buffer)
+    try:
+        yield buffer
+    finally:
+        _current_buffer.reset(token)
+        await buffer.aflush()
+
+
+def record_score_update(score: Score, address: str, community_id: int):
+    """
+    Record a SCORE_UPDATE event for `score`, in the current buffer if there is one
+    """
+    buffer = _current_buffer.get()
+    if buffer is not None:
+        buffer.add(score, address, community_id)
+    else:
+        get_score_update_event(score, address, community_id).save()
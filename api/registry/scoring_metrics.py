@@ -0,0 +1,128 @@
+"""
+Per-stage latency instrumentation for the scoring pipeline (`ascore_passport`).
+
+When `SCORING_METRICS_ENABLED` is set, every scoring run records the duration and the number
+of DB queries of each stage, and the verification time of each stamp. These are logged as
+structured fields at the end of the run, to be aggregated from the logs. When disabled, a no-op
+timer is used.
+"""
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+import api_logging as logging
+from django.conf import settings
+
+log = logging.getLogger(__name__)
+
+_current_timer: ContextVar[Optional["ScoringTimer"]] = ContextVar(
+    "scoring_timer", default=None
+)
+
+
+class ScoringTimer:
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.stage_durations: Dict[str, float] = {}
+        self.stage_queries: Dict[str, int] = {}
+        self.stamp_verification_durations: List[float] = []
+        # Incremented by `count_queries` for the queries run while this timer is the current one
+        self.num_queries = 0
+
+    @contextmanager
+    def stage(self, name: str):
+        started_at = time.perf_counter()
+        num_queries = self.num_queries
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - started_at
+            queries = self.num_queries - num_queries
+            self.stage_durations[name] = duration
+            self.stage_queries[name] = queries
+
+    def record_stamp_verification(self, duration: float):
+        self.stamp_verification_durations.append(duration)
+
+    def finish(self, status: str, **fields):
+        duration = time.perf_counter() - self.started_at
+
+        stamp_durations = self.stamp_verification_durations
+        logging.log_with_fields(
+            log,
+            logging.INFO,
+            "Scoring pipeline timings",
+            **fields,
+            status=status,
+            duration_ms=round(duration * 1000, 3),
+            db_queries=self.num_queries,
+            **{
+                f"{stage}_ms": round(stage_duration * 1000, 3)
+                for stage, stage_duration in self.stage_durations.items()
+            },
+            **{
+                f"{stage}_db_queries": queries
+                for stage, queries in self.stage_queries.items()
+            },
+            stamps_verified=len(stamp_durations),
+            stamp_verification_max_ms=round(max(stamp_durations, default=0) * 1000, 3),
+            stamp_verification_total_ms=round(sum(stamp_durations) * 1000, 3),
+        )
+
+
+class NoopScoringTimer:
+    @contextmanager
+    def stage(self, name: str):
+        yield
+
+    def record_stamp_verification(self, duration: float):
+        pass
+
+    def finish(self, status: str, **fields):
+        pass
+
+
+noop_scoring_timer = NoopScoringTimer()
+
+
+@contextmanager
+def scoring_timer():
+    """
+    Start timing a scoring run. The timer is available to the code called while scoring through `get_scoring_timer`
+    """
+    if not settings.SCORING_METRICS_ENABLED:
+        yield noop_scoring_timer
+        return
+
+    timer = ScoringTimer()
+    token = _current_timer.set(timer)
+    try:
+        yield timer
+    finally:
+        _current_timer.reset(token)
+
+
+def get_scoring_timer():
+    return _current_timer.get() or noop_scoring_timer
+
+
+def count_queries(execute, sql, params, many, context):
+    """
+    DB execute wrapper that counts the queries of the current scoring run.
+    The context (and so the timer) is copied to the threads used by `sync_to_async`, so this also
+    counts the queries of the async ORM.
+    """
+    timer = _current_timer.get()
+    if timer is not None:
+        timer.num_queries += 1
+    return execute(sql, params, many, context)
+
+
+def install_query_counter(connection, **kwargs):
+    """
+    Receiver for the `connection_created` signal, adds `count_queries` to the new connection
+    """
+    if count_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(count_queries)
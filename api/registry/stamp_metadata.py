@@ -0,0 +1,215 @@
+"""
+Cache of the stamp metadata published by the passport app (`stampMetadata.json`).
+
+The metadata is kept in a process-local copy, in front of a copy shared by all processes in the
+django cache (redis):
+- once the metadata is older than STAMP_METADATA_REFRESH_SECONDS it is still served, and refreshed
+  in a background thread (stale-while-revalidate)
+- only one fetch runs at a time in a process, concurrent requests wait for the same fetch (single-flight),
+  and a lock in the django cache keeps the processes from refreshing the shared copy at the same time
+- if the upstream fails, the stale metadata keeps being served for up to STAMP_METADATA_MAX_STALE_SECONDS
+"""
+
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Dict, List, NamedTuple, Optional
+from urllib.parse import urljoin
+
+import api_logging as logging
+import requests
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from registry.api.schema import StampDisplayResponse
+
+log = logging.getLogger(__name__)
+
+STAMP_METADATA_KEY = "stamp_metadata"
+STAMP_METADATA_REFRESH_LOCK_KEY = "stamp_metadata:refresh_lock"
+
+# Delay before a failed background refresh is retried
+REFRESH_RETRY_SECONDS = 60
+
+
+class StampMetadata(NamedTuple):
+    platforms: List[StampDisplayResponse]
+    # The metadata of each stamp, keyed by provider
+    by_provider: Dict[str, dict]
+    fetched_at: float
+
+
+def get_metadata_url() -> str:
+    return urljoin(settings.PASSPORT_PUBLIC_URL, "stampMetadata.json")
+
+
+def fetch_stamp_metadata() -> StampMetadata:
+    response = requests.get(
+        get_metadata_url(), timeout=settings.STAMP_METADATA_FETCH_TIMEOUT
+    )
+    response.raise_for_status()
+
+    # Append base URL to icon URLs
+    platforms = [
+        StampDisplayResponse(
+            **{
+                **platformData,
+                "icon": urljoin(settings.PASSPORT_PUBLIC_URL, platformData["icon"]),
+            }
+        )
+        for platformData in response.json()
+    ]
+
+    by_provider = {
+        stamp.name: {
+            "name": stamp.name,
+            "description": stamp.description,
+            "hash": stamp.hash,
+            "group": group.name,
+            "platform": {
+                "name": platform.name,
+                "id": platform.id,
+                "icon": platform.icon,
+                "description": platform.description,
+                "connectMessage": platform.connectMessage,
+            },
+        }
+        for platform in platforms
+        for group in platform.groups
+        for stamp in group.stamps
+    }
+
+    return StampMetadata(platforms, by_provider, time.time())
+
+
+class StampMetadataCache:
+    def __init__(self, fetch: Callable[[], StampMetadata]):
+        self.fetch = fetch
+        self.local: Optional[StampMetadata] = None
+        self._lock = threading.Lock()
+        self._refresh: Optional[Future] = None
+        self._retry_at = 0.0
+
+    def get(self) -> StampMetadata:
+        """
+        Return the stamp metadata. The upstream is only fetched in the request if there is
+        no usable copy, an exception is raised if that fetch fails.
+        """
+        metadata = self.local
+        if metadata and self.is_fresh(metadata):
+            return metadata
+
+        # The shared copy may have been refreshed by another process
+        shared = self.get_shared()
+        if shared and (metadata is None or shared.fetched_at > metadata.fetched_at):
+            self.local = metadata = shared
+
+        if metadata is None or not self.is_usable(metadata):
+            return self.refresh(background=False).result()
+
+        if not self.is_fresh(metadata) and time.time() >= self._retry_at:
+            self.refresh(background=True)
+
+        return metadata
+
+    async def aget(self) -> StampMetadata:
+        metadata = self.local
+        if metadata and self.is_fresh(metadata):
+            return metadata
+        # Reading the shared copy or fetching the metadata is blocking
+        return await sync_to_async(self.get)()
+
+    def is_fresh(self, metadata: StampMetadata) -> bool:
+        return (
+            time.time() - metadata.fetched_at < settings.STAMP_METADATA_REFRESH_SECONDS
+        )
+
+    def is_usable(self, metadata: StampMetadata) -> bool:
+        return (
+            time.time() - metadata.fetched_at
+            < settings.STAMP_METADATA_MAX_STALE_SECONDS
+        )
+
+    def refresh(self, background: bool = True) -> Future:
+        """
+        Start fetching the metadata in a separate thread, unless a fetch is already running.
+        Returns the future of the running fetch.
+
+        Background refreshes are skipped if another process holds the refresh lock.
+        """
+        with self._lock:
+            if self._refresh is None:
+                self._refresh = Future()
+                threading.Thread(
+                    target=self._run_refresh,
+                    args=(self._refresh, background),
+                    name="stamp-metadata-refresh",
+                    daemon=True,
+                ).start()
+            return self._refresh
+
+    def _run_refresh(self, future: Future, background: bool):
+        try:
+            if (
+                background
+                and self.local
+                and self.is_usable(self.local)
+                and not self.acquire_refresh_lock()
+            ):
+                # Another process is refreshing the shared copy, get() will pick it up
+                self._retry_at = time.time() + settings.STAMP_METADATA_FETCH_TIMEOUT
+                metadata = self.local
+            else:
+                metadata = self.fetch()
+                self.local = metadata
+                self.set_shared(metadata)
+        except Exception as e:
+            log.error("Failed to fetch the stamp metadata", exc_info=True)
+            self._retry_at = time.time() + REFRESH_RETRY_SECONDS
+            with self._lock:
+                self._refresh = None
+            future.set_exception(e)
+        else:
+            with self._lock:
+                self._refresh = None
+            future.set_result(metadata)
+
+    def acquire_refresh_lock(self) -> bool:
+        try:
+            return cache.add(
+                STAMP_METADATA_REFRESH_LOCK_KEY,
+                1,
+                timeout=settings.STAMP_METADATA_FETCH_TIMEOUT,
+            )
+        except Exception:
+            log.warning(
+                "Failed to acquire the stamp metadata refresh lock", exc_info=True
+            )
+            return True
+
+    def get_shared(self) -> Optional[StampMetadata]:
+        try:
+            return cache.get(STAMP_METADATA_KEY)
+        except Exception:
+            log.warning("Failed to read the stamp metadata from cache", exc_info=True)
+            return None
+
+    def set_shared(self, metadata: StampMetadata):
+        try:
+            cache.set(
+                STAMP_METADATA_KEY,
+                metadata,
+                settings.STAMP_METADATA_MAX_STALE_SECONDS,
+            )
+        except Exception:
+            log.warning("Failed to store the stamp metadata in cache", exc_info=True)
+
+    def clear(self):
+        """
+        Drop the process-local copy
+        """
+        self.local = None
+        self._retry_at = 0.0
+
+
+stamp_metadata_cache = StampMetadataCache(fetch_stamp_metadata)
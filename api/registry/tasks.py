@@ -1,11 +1,10 @@
 import api_logging as logging
-from account.models import AccountAPIKeyAnalytics
 from asgiref.sync import async_to_sync
 from celery import shared_task
-from django.conf import settings
+from registry.analytics import get_api_key_analytics
 from registry.models import Passport, Score
 
-from .atasks import ascore_passport, sensitive_headers_data
+from .atasks import ascore_passport
 
 log = logging.getLogger(__name__)
 
@@ -23,23 +22,19 @@ def save_api_key_analytics(
     error,
 ):
     try:
-        if settings.FF_API_ANALYTICS == "on":
-            cleaned_headers = dict(headers)
-            for sensitive_field in sensitive_headers_data:
-                if sensitive_field in cleaned_headers:
-                    cleaned_headers[sensitive_field] = "***"
-
-            AccountAPIKeyAnalytics.objects.create(
-                api_key_id=api_key_id,
-                path=path,
-                path_segments=path_segments,
-                query_params=query_params,
-                payload=payload,
-                headers=cleaned_headers,
-                response=response,
-                response_skipped=response_skipped,
-                error=error,
-            )
+        record = get_api_key_analytics(
+            api_key_id,
+            path,
+            path_segments,
+            query_params,
+            headers,
+            payload,
+            response,
+            response_skipped,
+            error,
+        )
+        if record:
+            record.save()
 
     except Exception as e:
         log.error("Failed to save analytics. Error: '%s'", e, exc_info=True)
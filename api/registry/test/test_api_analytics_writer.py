@@ -0,0 +1,149 @@
+import threading
+import time
+
+import pytest
+from account.models import AccountAPIKey, AccountAPIKeyAnalytics
+from django.test import Client
+from registry.analytics import AnalyticsWriter, get_api_key_analytics
+
+
+@pytest.fixture
+def api_key(scorer_account):
+    return AccountAPIKey.objects.create_key(account=scorer_account, name="Token")
+
+
+@pytest.fixture
+def writer(settings):
+    settings.FF_API_ANALYTICS = "on"
+    settings.API_ANALYTICS_BUFFER_SIZE = 100
+    settings.API_ANALYTICS_BATCH_SIZE = 100
+    settings.API_ANALYTICS_FLUSH_SECONDS = 60
+    settings.API_ANALYTICS_SHUTDOWN_TIMEOUT = 5
+    writer = AnalyticsWriter()
+    yield writer
+    writer.close()
+
+
+def make_record(api_key, path="/registry/score/1"):
+    model, _ = api_key
+    return get_api_key_analytics(
+        model.id,
+        path,
+        path.split("/")[1:],
+        {},
+        {"X-Api-Key": "secret"},
+        None,
+        response=None,
+        response_skipped=True,
+        error=None,
+    )
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "Timed out"
+        time.sleep(0.01)
+
+
+@pytest.mark.django_db(transaction=True)
+class TestAnalyticsWriter:
+    def test_flush_on_batch_size(self, settings, mocker, writer, api_key):
+        settings.API_ANALYTICS_BATCH_SIZE = 3
+        bulk_create = mocker.spy(AccountAPIKeyAnalytics.objects, "bulk_create")
+
+        for _ in range(3):
+            writer.save(make_record(api_key))
+
+        wait_for(lambda: AccountAPIKeyAnalytics.objects.count() == 3)
+        assert bulk_create.call_count == 1
+        assert AccountAPIKeyAnalytics.objects.first().headers == {"X-Api-Key": "***"}
+
+    def test_flush_on_time(self, settings, writer, api_key):
+        settings.API_ANALYTICS_FLUSH_SECONDS = 0.1
+
+        writer.save(make_record(api_key))
+        writer.save(make_record(api_key))
+
+        wait_for(lambda: AccountAPIKeyAnalytics.objects.count() == 2)
+
+    def test_flush_on_close(self, writer, api_key):
+        writer.save(make_record(api_key))
+        writer.save(make_record(api_key))
+        assert AccountAPIKeyAnalytics.objects.count() == 0
+
+        writer.close()
+
+        assert AccountAPIKeyAnalytics.objects.count() == 2
+
+        # Records saved after closing are written right away
+        writer.save(make_record(api_key))
+        assert AccountAPIKeyAnalytics.objects.count() == 3
+
+    def test_drop_when_full(self, settings, mocker, writer, api_key):
+        settings.API_ANALYTICS_BUFFER_SIZE = 2
+        settings.API_ANALYTICS_BATCH_SIZE = 1
+        writing = threading.Event()
+        db_is_slow = threading.Event()
+        bulk_create = AccountAPIKeyAnalytics.objects.bulk_create
+
+        def slow_bulk_create(*args, **kwargs):
+            writing.set()
+            db_is_slow.wait(5)
+            return bulk_create(*args, **kwargs)
+
+        mocker.patch.object(
+            AccountAPIKeyAnalytics.objects, "bulk_create", slow_bulk_create
+        )
+        log = mocker.patch("registry.analytics.log")
+
+        writer.save(make_record(api_key, "/0"))
+        assert writing.wait(5)
+
+        started = time.monotonic()
+        for i in range(1, 5):
+            writer.save(make_record(api_key, f"/{i}"))
+        # Saving does not wait for the DB
+        assert time.monotonic() - started < 1
+        assert writer.dropped == 2
+
+        db_is_slow.set()
+        writer.close()
+
+        paths = AccountAPIKeyAnalytics.objects.values_list("path", flat=True)
+        assert sorted(paths) == ["/0", "/1", "/2"]
+        log.warning.assert_called_once()
+
+    def test_failed_batch_is_dropped(self, mocker, writer, api_key):
+        mocker.patch.object(
+            AccountAPIKeyAnalytics.objects,
+            "bulk_create",
+            side_effect=Exception("DB is down"),
+        )
+        log = mocker.patch("registry.analytics.log")
+
+        writer.save(make_record(api_key))
+        writer.close()
+
+        log.error.assert_called_once()
+
+
+@pytest.mark.django_db
+def test_analytics_are_queued_in_request(settings, mocker, scorer_api_key):
+    settings.FF_API_ANALYTICS = "on"
+    settings.API_ANALYTICS_BUFFER_SIZE = 100
+    put = mocker.patch("registry.analytics.analytics_writer._put")
+
+    response = Client().get(
+        "/registry/v2/score/3", HTTP_AUTHORIZATION="Token " + scorer_api_key
+    )
+
+    assert response.status_code != 401
+    assert AccountAPIKeyAnalytics.objects.count() == 0
+    (record,), _ = put.call_args
+    assert record.path == "/registry/v2/score/3"
+
+
+def test_analytics_disabled(settings):
+    settings.FF_API_ANALYTICS = "off"
+    assert get_api_key_analytics(1, "/", [], {}, {}, None, None, True, None) is None
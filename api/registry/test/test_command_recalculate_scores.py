@@ -5,7 +5,7 @@ from account.models import Community
 from django.conf import settings
 from django.core.management import call_command
 from django.test import override_settings
-from registry.models import Passport, Score, Stamp
+from registry.models import Event, Passport, Score, Stamp
 
 pytestmark = pytest.mark.django_db
 
@@ -487,3 +487,19 @@ class TestRecalculatScores:
         print(captured.out)
         assert "Updated scorers: 2" in captured.out
         assert "Recalculating scores" not in captured.out
+
+    def test_rescoring_records_score_history(
+        self,
+        weighted_scorer_passports,
+        scorer_community_with_weighted_scorer,
+    ):
+        call_command("recalculate_scores")
+
+        events = Event.objects.filter(action=Event.Action.SCORE_UPDATE)
+        assert events.count() == 3
+        for passport in weighted_scorer_passports:
+            event = events.get(address=passport.address)
+            assert event.community_id == scorer_community_with_weighted_scorer.id
+            assert event.data["score"] == float(
+                Score.objects.get(passport=passport).score
+            )
@@ -0,0 +1,40 @@
+import pytest
+from ceramic_cache.models import CeramicCache
+from registry.utils import paginate_with_lookahead
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def stamp_ids():
+    return [
+        CeramicCache.objects.create(address="0x1", provider=f"Provider{i}").pk
+        for i in range(5)
+    ]
+
+
+class TestPaginateWithLookahead:
+    def page(self, direction, id_, limit):
+        query = CeramicCache.objects.order_by("-id")
+        if direction == "next":
+            query = query.filter(id__lt=id_)
+        elif direction == "prev":
+            query = query.filter(id__gt=id_).order_by("id")
+
+        page, has_more, has_prev = paginate_with_lookahead(query, direction, limit)
+        return [stamp.pk for stamp in page], has_more, has_prev
+
+    def test_paginate(self, stamp_ids):
+        s1, s2, s3, s4, s5 = stamp_ids
+
+        assert self.page(None, None, 2) == ([s5, s4], True, False)
+        assert self.page("next", s4, 2) == ([s3, s2], True, True)
+        assert self.page("next", s2, 2) == ([s1], False, True)
+        assert self.page("prev", s1, 2) == ([s3, s2], True, True)
+        assert self.page("prev", s3, 2) == ([s5, s4], True, False)
+        assert self.page(None, None, 10) == ([s5, s4, s3, s2, s1], False, False)
+        assert self.page("next", s1, 2) == ([], False, False)
+
+    def test_single_query(self, stamp_ids, django_assert_num_queries):
+        with django_assert_num_queries(1):
+            self.page("next", stamp_ids[3], 2)
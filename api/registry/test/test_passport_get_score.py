@@ -5,9 +5,12 @@ from account.models import Account, AccountAPIKey, Community
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import Group
+from django.db import connections
 from django.test import Client
+from django.test.utils import CaptureQueriesContext
 from registry.api.v1 import get_scorer_by_id
 from registry.models import Passport, Score
+from registry.utils import encode_cursor
 from web3 import Web3
 
 User = get_user_model()
@@ -440,3 +443,163 @@ class TestPassportGetScore:
         )
         assert response.status_code == 200
         assert len(response.json()["items"]) == len(newer_scores)
+
+
+def get_all_pages(client, url, api_key):
+    items = []
+    while url:
+        response = client.get(url, HTTP_AUTHORIZATION="Token " + api_key)
+        assert response.status_code == 200
+        response_data = response.json()
+        assert response_data["count"] is None
+        items.extend(response_data["items"])
+        url = response_data["next"]
+    return items
+
+
+class TestGetScoresWithCursor:
+    @pytest.mark.parametrize("order_by", ["id", "last_score_timestamp"])
+    def test_pages_match_offset_pages(
+        self, scorer_api_key, scorer_community, paginated_scores, order_by
+    ):
+        # Duplicate and missing timestamps are paginated in the order of the pk
+        paginated_scores[1].last_score_timestamp = paginated_scores[
+            2
+        ].last_score_timestamp = paginated_scores[3].last_score_timestamp
+        paginated_scores[0].last_score_timestamp = None
+        for score in paginated_scores[:3]:
+            score.save()
+
+        client = Client()
+        items = get_all_pages(
+            client,
+            f"/registry/score/{scorer_community.id}?limit=2&cursor=true&order_by={order_by}",
+            scorer_api_key,
+        )
+
+        response = client.get(
+            f"/registry/score/{scorer_community.id}?limit=1000&order_by={order_by}",
+            HTTP_AUTHORIZATION="Token " + scorer_api_key,
+        )
+        assert len(items) == len(paginated_scores)
+        if order_by == "id":
+            assert items == response.json()["items"]
+        else:
+            expected_scores = sorted(
+                paginated_scores,
+                key=lambda score: (
+                    score.last_score_timestamp is None,
+                    score.last_score_timestamp,
+                    score.pk,
+                ),
+            )
+            assert [item["address"] for item in items] == [
+                score.passport.address.lower() for score in expected_scores
+            ]
+
+    def test_nulls_are_sorted_last(
+        self, scorer_api_key, scorer_community, paginated_scores
+    ):
+        # The ORDER BY must match the keyset condition, whatever the default of the database is
+        with CaptureQueriesContext(
+            connections[settings.REGISTRY_API_READ_DB]
+        ) as context:
+            response = Client().get(
+                f"/registry/score/{scorer_community.id}?cursor=true&order_by=last_score_timestamp",
+                HTTP_AUTHORIZATION="Token " + scorer_api_key,
+            )
+
+        assert response.status_code == 200
+        (score_query,) = [
+            query["sql"]
+            for query in context.captured_queries
+            if "registry_score" in query["sql"]
+        ]
+        assert "NULLS LAST" in score_query
+
+    @pytest.mark.parametrize(
+        "pagination", ["cursor=true", f"token={encode_cursor(pk=1).decode()}"]
+    )
+    def test_offset_is_rejected(self, scorer_api_key, scorer_community, pagination):
+        response = Client().get(
+            f"/registry/score/{scorer_community.id}?offset=2&{pagination}",
+            HTTP_AUTHORIZATION="Token " + scorer_api_key,
+        )
+
+        assert response.status_code == 400
+        assert response.json() == {
+            "detail": "The offset can't be combined with a cursor."
+        }
+
+    def test_filters_are_kept(self, scorer_api_key, scorer_community, paginated_scores):
+        since = paginated_scores[2].last_score_timestamp
+
+        items = get_all_pages(
+            Client(),
+            f"/registry/score/{scorer_community.id}?limit=2&cursor=true&last_score_timestamp__gte={since.isoformat()}",
+            scorer_api_key,
+        )
+
+        assert [item["address"] for item in items] == [
+            score.passport.address.lower() for score in paginated_scores[2:]
+        ]
+
+        address = paginated_scores[4].passport.address
+        items = get_all_pages(
+            Client(),
+            f"/registry/score/{scorer_community.id}?cursor=true&address={address}",
+            scorer_api_key,
+        )
+        assert [item["address"] for item in items] == [address.lower()]
+
+    def test_scores_are_not_counted(
+        self, scorer_api_key, scorer_community, paginated_scores
+    ):
+        client = Client()
+        response = client.get(
+            f"/registry/score/{scorer_community.id}?limit=2&cursor=true",
+            HTTP_AUTHORIZATION="Token " + scorer_api_key,
+        )
+        next_url = response.json()["next"]
+
+        with CaptureQueriesContext(
+            connections[settings.REGISTRY_API_READ_DB]
+        ) as context:
+            response = client.get(
+                next_url, HTTP_AUTHORIZATION="Token " + scorer_api_key
+            )
+
+        assert response.status_code == 200
+        assert len(response.json()["items"]) == 2
+        score_queries = [
+            query["sql"]
+            for query in context.captured_queries
+            if "registry_score" in query["sql"]
+        ]
+        assert len(score_queries) == 1
+        assert "COUNT(" not in score_queries[0]
+        assert "OFFSET" not in score_queries[0]
+
+    def test_offset_pagination_is_unchanged(
+        self, scorer_api_key, scorer_community, paginated_scores
+    ):
+        response = Client().get(
+            f"/registry/score/{scorer_community.id}?limit=2",
+            HTTP_AUTHORIZATION="Token " + scorer_api_key,
+        )
+
+        assert response.status_code == 200
+        assert response.json()["count"] == len(paginated_scores)
+        assert response.json()["next"] is None
+
+    @pytest.mark.parametrize(
+        "token", ["invalid", encode_cursor(last_score_timestamp=None, pk=1).decode()]
+    )
+    def test_invalid_token(self, scorer_api_key, scorer_community, token):
+        response = Client().get(
+            f"/registry/score/{scorer_community.id}?token={token}",
+            HTTP_AUTHORIZATION="Token " + scorer_api_key,
+        )
+
+        assert response.status_code == 400
+        assert response.json() == {"detail": "Invalid pagination token."}
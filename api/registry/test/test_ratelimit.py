@@ -95,7 +95,7 @@ def api_path_that_requires_rate_limit(request):
     return request.param
 
 
-@override_settings(RATELIMIT_ENABLE=True)
+@override_settings(RATELIMIT_ENABLE=True, RATELIMIT_LEASE_SIZE=0)
 def test_rate_limit_is_applied(scorer_api_key, api_path_that_requires_rate_limit):
     """
     Test that api rate limit is applied for all required APIs.
@@ -103,7 +103,7 @@ def test_rate_limit_is_applied(scorer_api_key, api_path_that_requires_rate_limit
     method, path, payload = api_path_that_requires_rate_limit
     client = Client()
 
-    with patch("registry.api.utils.is_ratelimited", return_value=True):
+    with patch("registry.api.utils.is_ratelimited_in_window", return_value=True):
         if method == "post":
             response = client.post(
                 path,
@@ -32,3 +32,23 @@ class TestSaveApiKeyAnalytics:
 
         assert created_at_day.day is datetime.now().day
         assert created_at_day.month is datetime.now().month
+
+    def test_sensitive_headers_are_masked(self, scorer_account):
+        (model, secret) = AccountAPIKey.objects.create_key(
+            account=scorer_account, name="Another token for user 1"
+        )
+
+        save_api_key_analytics(
+            model.pk,
+            path,
+            [],
+            {},
+            {"X-Api-Key": secret, "header": "field1"},
+            None,
+            None,
+            response_skipped=True,
+            error=None,
+        )
+
+        obj = AccountAPIKeyAnalytics.objects.get(path=path, api_key_id=model.pk)
+        assert obj.headers == {"X-Api-Key": "***", "header": "field1"}
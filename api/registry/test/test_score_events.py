@@ -0,0 +1,63 @@
+import pytest
+from asgiref.sync import async_to_sync
+from registry.models import Event, Passport, Score
+from registry.score_events import ascore_events, score_events
+
+pytestmark = pytest.mark.django_db
+
+
+def score_update_count():
+    return Event.objects.filter(action=Event.Action.SCORE_UPDATE).count()
+
+
+@pytest.fixture
+def passports(scorer_community, passport_holder_addresses):
+    return [
+        Passport.objects.create(address=a["address"], community=scorer_community)
+        for a in passport_holder_addresses[:3]
+    ]
+
+
+class TestScoreEvents:
+    def test_events_are_written_when_buffer_closes(self, passports):
+        with score_events():
+            for passport in passports:
+                Score.objects.create(passport=passport, score=1, status="DONE")
+            assert score_update_count() == 0
+
+        assert score_update_count() == 3
+        event = Event.objects.get(address=passports[0].address)
+        assert event.community_id == passports[0].community_id
+        assert event.data == {"score": 1.0, "evidence": None}
+
+    def test_nested_buffers_are_written_by_outer_buffer(self, passports):
+        with score_events() as outer:
+            with score_events() as inner:
+                Score.objects.create(passport=passports[0], score=1, status="DONE")
+            assert inner is outer
+            assert score_update_count() == 0
+
+        assert score_update_count() == 1
+
+    def test_async_buffer_is_used_by_asave(self, passports):
+        async def asave_scores():
+            async with ascore_events():
+                for passport in passports:
+                    await Score(passport=passport, score=2, status="DONE").asave()
+                assert await Event.objects.acount() == 0
+
+        async_to_sync(asave_scores)()
+
+        assert score_update_count() == 3
+
+    def test_only_done_scores_are_recorded(self, passports):
+        with score_events():
+            Score.objects.create(passport=passports[0], status="PROCESSING")
+            Score.objects.create(passport=passports[1], status="ERROR")
+
+        assert score_update_count() == 0
+
+    def test_events_are_written_immediately_without_buffer(self, passports):
+        Score.objects.create(passport=passports[0], score=1, status="DONE")
+
+        assert score_update_count() == 1
@@ -1,3 +1,4 @@
+import asyncio
 import json
 import re
 from decimal import Decimal
@@ -8,8 +9,11 @@ from account.models import Account, AccountAPIKey, Community
 from asgiref.sync import async_to_sync
 from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.test import Client, TransactionTestCase
+from django.db import connection
+from django.test import Client, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from registry.api.v2 import SubmitPassportPayload, a_submit_passport, get_score
+from registry.atasks import asave_stamps, avalidate_credentials
 from registry.models import Event, HashScorerLink, Passport, Score, Stamp
 from registry.tasks import score_passport_passport, score_registry_passport
 from web3 import Web3
@@ -383,3 +387,74 @@ class TestScorePassportTestCase(TransactionTestCase):
         assert (
             Event.objects.filter(action=Event.Action.SCORE_UPDATE).count() == count + 1
         )
+
+    @override_settings(CREDENTIAL_VERIFICATION_CONCURRENCY=2)
+    def test_concurrent_validation_keeps_stamp_order(self):
+        passport = Passport.objects.create(
+            address=self.account.address, community_id=self.community.pk
+        )
+        in_flight = 0
+        max_in_flight = 0
+
+        async def slow_validate(did, credential):
+            nonlocal in_flight, max_in_flight
+            in_flight += 1
+            max_in_flight = max(max_in_flight, in_flight)
+            # Finish the first stamps last, to make sure the order is preserved
+            if credential["credentialSubject"]["provider"] == "Ens":
+                await asyncio.sleep(0.05)
+            else:
+                await asyncio.sleep(0.01)
+            in_flight -= 1
+            if credential["credentialSubject"]["provider"] == "Google":
+                return ["Stamp validation failed"]
+            return []
+
+        with patch("registry.atasks.validate_credential", side_effect=slow_validate):
+            validated_passport = async_to_sync(avalidate_credentials)(
+                passport, mock_passport_data
+            )
+
+        assert [s["provider"] for s in validated_passport["stamps"]] == [
+            "Ens",
+            "Gitcoin",
+        ]
+        assert max_in_flight == 2
+
+    def test_save_stamps_uses_constant_number_of_queries(self):
+        passport = Passport.objects.create(
+            address=self.account.address, community_id=self.community.pk
+        )
+        Stamp.objects.create(
+            hash="0x1234",
+            passport=passport,
+            provider="Gitcoin",
+            credential={},
+        )
+        Stamp.objects.create(
+            hash="0x88888",
+            passport=passport,
+            provider="Google",
+            credential={"outdated": True},
+        )
+
+        with CaptureQueriesContext(connection) as captured_queries:
+            async_to_sync(asave_stamps)(passport, mock_passport_data)
+
+        # 1 select for existing hashes, 1 upsert and 1 delete for the stale stamp
+        statements = [
+            q["sql"]
+            for q in captured_queries.captured_queries
+            if q["sql"] not in ("BEGIN", "COMMIT")
+        ]
+        assert len(statements) == 3
+
+        stamps = {s.hash: s for s in Stamp.objects.filter(passport=passport)}
+        assert set(stamps.keys()) == {
+            s["credential"]["credentialSubject"]["hash"]
+            for s in mock_passport_data["stamps"]
+        }
+        assert (
+            stamps["0x88888"].credential
+            == mock_passport_data["stamps"][1]["credential"]
+        )
@@ -0,0 +1,51 @@
+from unittest.mock import patch
+
+import pytest
+from asgiref.sync import async_to_sync
+from registry.atasks import ascore_passport
+from registry.models import Passport, Score
+from registry.test.test_score_passport import mock_passport_data
+
+pytestmark = pytest.mark.django_db
+
+stages = ["load", "validate", "dedup", "save", "score"]
+
+
+def score(community, address):
+    passport = Passport.objects.create(address=address, community=community)
+    score = Score.objects.create(passport=passport)
+    with patch("registry.atasks.aget_passport", return_value=mock_passport_data):
+        with patch("registry.atasks.validate_credential", side_effect=[[], [], []]):
+            async_to_sync(ascore_passport)(community, passport, address, score)
+    return score
+
+
+class TestScoringMetrics:
+    def test_stages_are_recorded(self, settings, scorer_community, scorer_account):
+        settings.SCORING_METRICS_ENABLED = True
+
+        with patch("registry.scoring_metrics.logging.log_with_fields") as log_fields:
+            result = score(scorer_community, scorer_account.address.lower())
+
+        assert result.status == Score.Status.DONE
+        log_fields.assert_called_once()
+        fields = log_fields.call_args.kwargs
+        for stage in stages:
+            assert fields[f"{stage}_ms"] >= 0
+        assert fields["status"] == Score.Status.DONE
+        assert fields["stamps_verified"] == 3
+        assert fields["save_db_queries"] > 0
+        assert fields["load_db_queries"] == 0
+        assert fields["db_queries"] == sum(
+            fields[f"{stage}_db_queries"] for stage in stages
+        )
+
+    def test_nothing_is_recorded_when_disabled(
+        self, settings, scorer_community, scorer_account
+    ):
+        settings.SCORING_METRICS_ENABLED = False
+
+        with patch("registry.scoring_metrics.logging.log_with_fields") as log_fields:
+            score(scorer_community, scorer_account.address.lower())
+
+        log_fields.assert_not_called()
@@ -0,0 +1,159 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from django.core.cache import cache
+from registry.api.v1 import fetch_all_stamp_metadata, fetch_stamp_metadata_for_provider
+from registry.exceptions import InternalServerErrorException
+from registry.stamp_metadata import StampMetadataCache, fetch_stamp_metadata
+
+from .test_passport_get_stamps import mock_stamp_metadata
+
+
+class MetadataServer(ThreadingHTTPServer):
+    """
+    Local stand-in for the passport app, serving `stampMetadata.json`
+    """
+
+    def __init__(self):
+        self.requests = 0
+        self.status = 200
+        self.delay = 0.0
+        self.metadata = mock_stamp_metadata
+        super().__init__(("127.0.0.1", 0), MetadataRequestHandler)
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_port}"
+
+
+class MetadataRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        server = self.server
+        server.requests += 1
+        time.sleep(server.delay)
+        body = json.dumps(server.metadata).encode("utf-8")
+        self.send_response(server.status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def metadata_server(settings):
+    server = MetadataServer()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    settings.PASSPORT_PUBLIC_URL = server.url
+    settings.CACHES = {
+        "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+    }
+    # The local memory caches are shared within the process
+    cache.clear()
+
+    yield server
+
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def metadata_cache(mocker):
+    metadata_cache = StampMetadataCache(fetch_stamp_metadata)
+    mocker.patch("registry.api.v1.stamp_metadata_cache", metadata_cache)
+    return metadata_cache
+
+
+class TestStampMetadataCache:
+    def test_fetch(self, metadata_server, metadata_cache):
+        platforms = fetch_all_stamp_metadata()
+
+        assert platforms[0].id == "TestPlatform"
+        assert platforms[0].icon == f"{metadata_server.url}/assets/test.svg"
+        assert fetch_stamp_metadata_for_provider("Provider1")["platform"]["name"] == (
+            "Test Platform"
+        )
+        assert fetch_stamp_metadata_for_provider("invalid_provider") is None
+        # Fresh metadata is served from the process-local copy
+        assert metadata_server.requests == 1
+
+    def test_single_flight(self, metadata_server, metadata_cache):
+        metadata_server.delay = 0.2
+        results = []
+
+        def get():
+            results.append(metadata_cache.get())
+
+        threads = [threading.Thread(target=get) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert len(results) == 5
+        assert len({id(result) for result in results}) == 1
+        assert metadata_server.requests == 1
+
+    def test_shared_copy(self, metadata_server, metadata_cache):
+        metadata = metadata_cache.get()
+
+        # Another process reads the shared copy
+        other_process_cache = StampMetadataCache(fetch_stamp_metadata)
+        assert other_process_cache.get() == metadata
+        assert metadata_server.requests == 1
+
+    def test_stale_while_revalidate(self, settings, metadata_server, metadata_cache):
+        stale = metadata_cache.get()
+        settings.STAMP_METADATA_REFRESH_SECONDS = 0
+        metadata_server.delay = 0.2
+
+        # The stale metadata is served while it is refreshed in the background
+        assert metadata_cache.get() is stale
+        refreshed = metadata_cache.refresh().result()
+
+        assert refreshed.fetched_at > stale.fetched_at
+        assert metadata_cache.get() is not stale
+        assert metadata_server.requests == 2
+
+    def test_serve_stale_on_upstream_failure(
+        self, settings, metadata_server, metadata_cache
+    ):
+        stale = metadata_cache.get()
+        settings.STAMP_METADATA_REFRESH_SECONDS = 0
+        metadata_server.status = 500
+
+        assert metadata_cache.get() is stale
+        with pytest.raises(Exception):
+            metadata_cache.refresh().result()
+
+        # The failed refresh is not retried by every request
+        assert metadata_cache.get() is stale
+        assert fetch_all_stamp_metadata() == stale.platforms
+        assert metadata_server.requests == 2
+
+    def test_upstream_failure_without_metadata(self, metadata_server, metadata_cache):
+        metadata_server.status = 500
+
+        with pytest.raises(InternalServerErrorException):
+            fetch_all_stamp_metadata()
+
+        with pytest.raises(InternalServerErrorException):
+            fetch_stamp_metadata_for_provider("Provider1")
+
+    def test_expired_metadata_is_not_served(
+        self, settings, metadata_server, metadata_cache
+    ):
+        metadata_cache.get()
+        settings.STAMP_METADATA_REFRESH_SECONDS = 0
+        settings.STAMP_METADATA_MAX_STALE_SECONDS = 0
+        metadata_server.status = 500
+
+        with pytest.raises(Exception):
+            metadata_cache.get()
@@ -0,0 +1,183 @@
+from types import SimpleNamespace
+
+import pytest
+from django.core.cache import cache
+from django_ratelimit.exceptions import Ratelimited
+from registry.api.utils import check_rate_limit
+from registry.ratelimit import (
+    TokenBucketRateLimiter,
+    is_ratelimited_in_window,
+    split_rate,
+)
+
+
+@pytest.fixture
+def limiter(settings):
+    settings.RATELIMIT_LEASE_SIZE = 20
+    settings.RATELIMIT_LEASE_SECONDS = 1
+    return TokenBucketRateLimiter()
+
+
+@pytest.fixture
+def clock(mocker):
+    clock = SimpleNamespace(now=1000.0)
+    mocker.patch("registry.ratelimit.time.monotonic", lambda: clock.now)
+    return clock
+
+
+def grant_requested(key, limit, period, requested, returned):
+    return requested, 0
+
+
+class TestTokenBucketRateLimiter:
+    def test_lease_size_grows_while_used_up(self, mocker, limiter, clock):
+        lease = mocker.patch.object(limiter, "lease", side_effect=grant_requested)
+
+        for _ in range(1 + 2 + 4 + 8 + 12 + 12):
+            assert limiter.is_ratelimited("key", "125/15m") is False
+
+        # The lease size is capped to 1/10th of the limit
+        assert [call.args[3] for call in lease.call_args_list] == [1, 2, 4, 8, 12, 12]
+
+    def test_unused_tokens_are_returned(self, mocker, limiter, clock):
+        lease = mocker.patch.object(limiter, "lease", side_effect=grant_requested)
+        for _ in range(1 + 2):
+            limiter.is_ratelimited("key", "125/15m")
+        # 1 of the 4 tokens of the last lease is used
+        limiter.is_ratelimited("key", "125/15m")
+
+        clock.now += 2
+        assert limiter.is_ratelimited("key", "125/15m") is False
+
+        assert lease.call_args.args == ("key", 125, 900, 1, 3)
+
+    def test_rejected_locally_until_next_token(self, mocker, limiter, clock):
+        lease = mocker.patch.object(limiter, "lease", return_value=(0, 500))
+
+        assert limiter.is_ratelimited("key", "3/30s") is True
+        clock.now += 0.4
+        assert limiter.is_ratelimited("key", "3/30s") is True
+        assert lease.call_count == 1
+
+        lease.return_value = (1, 0)
+        clock.now += 0.2
+        assert limiter.is_ratelimited("key", "3/30s") is False
+        assert lease.call_count == 2
+
+    def test_request_costs_several_tokens(self, mocker, limiter, clock):
+        lease = mocker.patch.object(limiter, "lease", side_effect=grant_requested)
+
+        assert limiter.is_ratelimited("key", "125/15m", cost=5) is False
+        assert lease.call_args.args[3] == 5
+
+        # Not enough tokens for the batch, which is rejected as a whole
+        lease.side_effect = None
+        lease.return_value = (3, 0)
+        assert limiter.is_ratelimited("key", "125/15m", cost=5) is True
+
+        # The tokens are kept for the next requests
+        assert limiter.spend_local_token("key", "125/15m", cost=3) is False
+        assert lease.call_count == 2
+
+    def test_redis_unavailable(self, mocker, limiter, clock):
+        lease = mocker.patch.object(
+            limiter, "lease", side_effect=ConnectionError("redis is down")
+        )
+
+        assert limiter.is_ratelimited("key", "3/30s") is None
+        # Redis is not retried for every request
+        assert limiter.is_ratelimited("key", "3/30s") is None
+        assert lease.call_count == 1
+
+    def test_accurate_across_processes(self, limiter):
+        """
+        The processes share the same bucket in redis
+        """
+        cache.delete("ratelimit:shared-key")
+        processes = [TokenBucketRateLimiter() for _ in range(3)]
+
+        allowed = 0
+        for i in range(300):
+            if not processes[i % 3].is_ratelimited("shared-key", "100/1h"):
+                allowed += 1
+
+        # At most 1 lease (10 tokens) per process may be held locally
+        assert 100 - 3 * 10 <= allowed <= 100
+
+
+@pytest.fixture
+def locmem_cache(settings):
+    settings.CACHES = {
+        "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+    }
+    cache.clear()
+
+
+@pytest.mark.parametrize(
+    "rate, expected",
+    [
+        ("125/15m", (125, 900)),
+        ("3/30seconds", (3, 30)),
+        ("10/h", (10, 3600)),
+        ("5/60", (5, 60)),
+    ],
+)
+def test_split_rate(rate, expected):
+    assert split_rate(rate) == expected
+
+
+class TestFixedWindowRateLimiter:
+    def test_rejected_request_is_not_counted(self, locmem_cache):
+        assert is_ratelimited_in_window("key", "3/30s", cost=2) is False
+
+        # The batch exceeds the remaining quota and is rejected as a whole
+        assert is_ratelimited_in_window("key", "3/30s", cost=2) is True
+
+        # The rejected batch did not use up the quota
+        assert is_ratelimited_in_window("key", "3/30s") is False
+        assert is_ratelimited_in_window("key", "3/30s") is True
+
+    def test_cache_unavailable(self, settings, mocker):
+        settings.RATELIMIT_FAIL_OPEN = True
+        mocker.patch(
+            "registry.ratelimit.caches",
+            {"default": mocker.Mock(**{"add.side_effect": ConnectionError})},
+        )
+
+        assert is_ratelimited_in_window("key", "3/30s") is False
+
+
+@pytest.fixture
+def request_with_api_key():
+    return SimpleNamespace(api_key=SimpleNamespace(prefix="key", rate_limit="3/30s"))
+
+
+class TestCheckRateLimit:
+    def test_token_bucket(self, settings, mocker, request_with_api_key):
+        settings.RATELIMIT_ENABLE = True
+        mocker.patch(
+            "registry.api.utils.rate_limiter.is_ratelimited", return_value=True
+        )
+        is_ratelimited_in_window = mocker.patch(
+            "registry.api.utils.is_ratelimited_in_window"
+        )
+
+        with pytest.raises(Ratelimited):
+            check_rate_limit(request_with_api_key)
+
+        assert request_with_api_key.limited
+        is_ratelimited_in_window.assert_not_called()
+
+    def test_fallback_without_redis(self, settings, mocker, request_with_api_key):
+        settings.RATELIMIT_ENABLE = True
+        mocker.patch(
+            "registry.api.utils.rate_limiter.is_ratelimited", return_value=None
+        )
+        is_ratelimited_in_window = mocker.patch(
+            "registry.api.utils.is_ratelimited_in_window", return_value=True
+        )
+
+        with pytest.raises(Ratelimited):
+            check_rate_limit(request_with_api_key)
+
+        is_ratelimited_in_window.assert_called_once_with("key", "3/30s", 1)
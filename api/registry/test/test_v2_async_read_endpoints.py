@@ -0,0 +1,156 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.test import Client
+from django_ratelimit.exceptions import Ratelimited
+from registry.api import v2
+from registry.api.utils import acheck_rate_limit
+from registry.stamp_metadata import StampMetadata, StampMetadataCache
+
+from .test_passport_get_stamps import paginated_stamps
+
+pytestmark = pytest.mark.django_db
+
+user_address = "0x00ac00000e4abe2d293586a1f4f9c73e5512121e"
+
+
+@pytest.mark.parametrize(
+    "endpoint",
+    [
+        v2.get_scores,
+        v2.get_score,
+        v2.get_passport_stamps,
+        v2.get_score_history,
+        v2.get_gtc_stake,
+    ],
+)
+def test_read_endpoints_are_async(endpoint):
+    assert asyncio.iscoroutinefunction(endpoint)
+
+
+class TestGetPassportStampsV2:
+    @pytest.mark.parametrize("passport_cache_ttl", [0, 60])
+    def test_pages_match_v1(
+        self,
+        settings,
+        scorer_api_key,
+        passport_holder_addresses,
+        paginated_stamps,
+        passport_cache_ttl,
+    ):
+        settings.PASSPORT_CACHE_TTL = passport_cache_ttl
+        settings.CACHES = {
+            "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+        }
+        cache.clear()
+        address = passport_holder_addresses[0]["address"]
+        client = Client()
+
+        v1_url = f"/registry/stamps/{address}?limit=3"
+        v2_url = f"/registry/v2/stamps/{address}?limit=3"
+        for _ in range(4):
+            v1_response = client.get(
+                v1_url, HTTP_AUTHORIZATION="Token " + scorer_api_key
+            ).json()
+            v2_response = client.get(
+                v2_url, HTTP_AUTHORIZATION="Token " + scorer_api_key
+            ).json()
+
+            assert v2_response == v1_response
+            if not v1_response["next"]:
+                break
+            v1_url = v2_url = v1_response["next"]
+
+        assert v1_response["next"] is None
+        assert v1_response["prev"] is not None
+
+    def test_include_metadata(
+        self, mocker, scorer_api_key, passport_holder_addresses, paginated_stamps
+    ):
+        metadata = {
+            "name": "Provider0",
+            "description": "Tested",
+            "hash": "0x0",
+            "group": "Test",
+            "platform": {
+                "name": "Test Platform",
+                "id": "TestPlatform",
+                "icon": "test.svg",
+                "description": "Platform for testing",
+                "connectMessage": "Verify Account",
+            },
+        }
+        metadata_cache = StampMetadataCache(fetch=None)
+        metadata_cache.local = StampMetadata([], {"Provider0": metadata}, time.time())
+        mocker.patch("registry.api.v1.stamp_metadata_cache", metadata_cache)
+
+        address = passport_holder_addresses[0]["address"]
+        response = Client().get(
+            f"/registry/v2/stamps/{address}?include_metadata=true",
+            HTTP_AUTHORIZATION="Token " + scorer_api_key,
+        )
+
+        assert response.status_code == 200
+        items = response.json()["items"]
+        assert items[-1]["metadata"] == metadata
+        assert items[0]["metadata"] is None
+
+
+def test_gtc_stake_matches_v1(scorer_api_key, gtc_staking_response):
+    client = Client()
+
+    v1_response = client.get(
+        f"/registry/gtc-stake/{user_address}/1",
+        HTTP_AUTHORIZATION="Token " + scorer_api_key,
+    )
+    v2_response = client.get(
+        f"/registry/v2/gtc-stake/{user_address}/1",
+        HTTP_AUTHORIZATION="Token " + scorer_api_key,
+    )
+
+    assert v2_response.status_code == 200
+    assert v2_response.json() == v1_response.json()
+    assert v2_response.json()["results"]
+
+
+@pytest.fixture
+def request_with_api_key(settings):
+    settings.RATELIMIT_ENABLE = True
+    return SimpleNamespace(api_key=SimpleNamespace(prefix="key", rate_limit="3/30s"))
+
+
+class TestAsyncCheckRateLimit:
+    def test_local_tokens_are_spent_in_the_event_loop(
+        self, mocker, request_with_api_key
+    ):
+        mocker.patch(
+            "registry.api.utils.rate_limiter.spend_local_token", return_value=False
+        )
+        check_rate_limit = mocker.patch("registry.api.utils.check_rate_limit")
+
+        async_to_sync(acheck_rate_limit)(request_with_api_key)
+
+        assert not request_with_api_key.limited
+        check_rate_limit.assert_not_called()
+
+    def test_rejected_locally(self, mocker, request_with_api_key):
+        mocker.patch(
+            "registry.api.utils.rate_limiter.spend_local_token", return_value=True
+        )
+
+        with pytest.raises(Ratelimited):
+            async_to_sync(acheck_rate_limit)(request_with_api_key)
+
+    def test_redis_round_trip_in_thread(self, mocker, request_with_api_key):
+        mocker.patch(
+            "registry.api.utils.rate_limiter.spend_local_token", return_value=None
+        )
+        check_rate_limit = mocker.patch("registry.api.utils.check_rate_limit")
+
+        async_to_sync(acheck_rate_limit)(request_with_api_key)
+
+        check_rate_limit.assert_called_once_with(request_with_api_key, 1)
@@ -0,0 +1,144 @@
+import json
+from unittest.mock import patch
+
+import pytest
+from account.models import AccountAPIKey
+from django.core.cache import cache
+from django.test import Client
+from registry.api.v1 import aget_scorer_by_id
+from registry.models import Event, Passport
+from registry.test.test_passport_submission import mock_passport, mock_passport_google
+
+pytestmark = pytest.mark.django_db
+
+address_1 = "0x71ad3e3057ca74967239c66ca6d3a9c2a43a58fc"
+address_2 = "0x0000000000000000000000000000000000000002"
+address_without_passport = "0x0000000000000000000000000000000000000003"
+
+passports = {
+    address_1: mock_passport,
+    address_2: mock_passport_google,
+}
+
+
+async def mock_aget_passport(address):
+    return passports.get(address)
+
+
+async def mock_validate_credential(did, credential):
+    return []
+
+
+def submit_passports(api_key, scorer_id, addresses):
+    return Client().post(
+        "/registry/v2/submit-passports",
+        json.dumps({"scorer_id": str(scorer_id), "addresses": addresses}),
+        content_type="application/json",
+        HTTP_AUTHORIZATION=f"Token {api_key}",
+    )
+
+
+@pytest.fixture(autouse=True)
+def mock_passport_loading():
+    with patch("registry.atasks.aget_passport", side_effect=mock_aget_passport):
+        with patch(
+            "registry.atasks.validate_credential",
+            side_effect=mock_validate_credential,
+        ):
+            yield
+
+
+class TestSubmitPassports:
+    def test_submit_passports(self, scorer_api_key, scorer_community):
+        with patch(
+            "registry.api.v1.aget_scorer_by_id", side_effect=aget_scorer_by_id
+        ) as aget_scorer:
+            response = submit_passports(
+                scorer_api_key,
+                scorer_community.id,
+                [address_1, address_2.upper().replace("0X", "0x"), address_1],
+            )
+
+        assert response.status_code == 200
+        items = response.json()["items"]
+        assert [item["address"] for item in items] == [address_1, address_2, address_1]
+        assert [item["status"] for item in items] == ["DONE", "DONE", "DONE"]
+        assert items[0] == items[2]
+
+        # The scorer is only loaded once for the batch, and duplicate addresses are scored once
+        assert aget_scorer.call_count == 1
+        assert Passport.objects.filter(community=scorer_community).count() == 2
+        assert Passport.objects.get(address=address_1).stamps.count() == 2
+        assert Passport.objects.get(address=address_2).stamps.count() == 1
+        assert Event.objects.filter(action=Event.Action.SCORE_UPDATE).count() == 2
+
+    def test_errors_are_reported_per_address(self, scorer_api_key, scorer_community):
+        response = submit_passports(
+            scorer_api_key,
+            scorer_community.id,
+            [address_1, "0xinvalid", address_without_passport],
+        )
+
+        assert response.status_code == 200
+        items = response.json()["items"]
+        assert items[0]["status"] == "DONE"
+        assert items[1]["status"] == "ERROR"
+        assert items[1]["error"] == "Invalid address."
+        assert items[2]["status"] == "ERROR"
+        assert items[2]["error"] == "No Passport found for this address."
+
+    def test_too_many_addresses(self, settings, scorer_api_key, scorer_community):
+        settings.BATCH_SUBMIT_PASSPORT_MAX_ADDRESSES = 1
+
+        response = submit_passports(
+            scorer_api_key, scorer_community.id, [address_1, address_2]
+        )
+
+        assert response.status_code == 400
+        assert Passport.objects.count() == 0
+
+    def test_each_address_counts_for_the_rate_limit(
+        self, settings, scorer_api_key, scorer_community
+    ):
+        settings.RATELIMIT_ENABLE = True
+        settings.CACHES = {
+            "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+        }
+        cache.clear()
+
+        # The rate limit of the API key is 3 calls/30 seconds
+        response = submit_passports(
+            scorer_api_key, scorer_community.id, [address_1, address_2]
+        )
+        assert response.status_code == 200
+
+        # The whole batch is rejected (Ratelimited is a PermissionDenied)
+        response = submit_passports(
+            scorer_api_key, scorer_community.id, [address_1, address_2]
+        )
+        assert response.status_code == 403
+
+        # The rejected batch is not charged, there is room for one more address
+        response = submit_passports(scorer_api_key, scorer_community.id, [address_1])
+        assert response.status_code == 200
+
+    def test_no_addresses(self, scorer_api_key, scorer_community):
+        response = submit_passports(scorer_api_key, scorer_community.id, [])
+
+        assert response.status_code == 400
+
+    def test_unknown_scorer(self, scorer_api_key):
+        response = submit_passports(scorer_api_key, 123456, [address_1])
+
+        assert response.status_code == 404
+
+    def test_api_key_without_permissions(self, scorer_account, scorer_community):
+        (_, secret) = AccountAPIKey.objects.create_key(
+            account=scorer_account,
+            name="Token without submit permission",
+            submit_passports=False,
+        )
+
+        response = submit_passports(secret, scorer_community.id, [address_1])
+
+        assert response.status_code == 403
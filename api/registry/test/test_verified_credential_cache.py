@@ -0,0 +1,92 @@
+import json
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from registry.utils import (
+    get_credential_cache_key,
+    validate_credential,
+    verified_credential_cache,
+)
+
+did = "did:pkh:eip155:1:0x0000000000000000000000000000000000000001"
+
+credential = {
+    "type": ["VerifiableCredential"],
+    "credentialSubject": {
+        "id": did,
+        "hash": "v0.0.0:1Vzw/OyM9CBUkVi/3mb+BiwFnHzsSRZhVH1gaQIyHvM=",
+        "provider": "Ens",
+    },
+    "issuer": "did:key:GlMY_1zkc0i11O-wMBWbSiUfIkZiXzFLlAQ89pdfyBA",
+    "issuanceDate": "2023-02-06T23:22:58.848Z",
+    "expirationDate": "2099-02-06T23:22:58.848Z",
+    "proof": {"jws": "proof-1"},
+}
+
+
+@pytest.fixture(autouse=True)
+def clear_caches(settings):
+    settings.CACHES = {
+        "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+    }
+    cache.clear()
+    verified_credential_cache.clear()
+    yield
+    verified_credential_cache.clear()
+
+
+class TestVerifiedCredentialCache:
+    def test_successful_verification_is_cached(self):
+        verify = AsyncMock(return_value=json.dumps({"errors": []}))
+        with patch("registry.utils.didkit.verify_credential", verify):
+            assert async_to_sync(validate_credential)(did, credential) == []
+            assert async_to_sync(validate_credential)(did, credential) == []
+
+        assert verify.call_count == 1
+
+    def test_django_cache_is_used_when_local_cache_is_empty(self):
+        verify = AsyncMock(return_value=json.dumps({"errors": []}))
+        with patch("registry.utils.didkit.verify_credential", verify):
+            async_to_sync(validate_credential)(did, credential)
+            verified_credential_cache.clear()
+            async_to_sync(validate_credential)(did, credential)
+
+        assert verify.call_count == 1
+        assert cache.get(get_credential_cache_key(credential)) is True
+
+    def test_different_proof_is_verified_again(self):
+        verify = AsyncMock(return_value=json.dumps({"errors": []}))
+        other_credential = {**credential, "proof": {"jws": "proof-2"}}
+        with patch("registry.utils.didkit.verify_credential", verify):
+            async_to_sync(validate_credential)(did, credential)
+            async_to_sync(validate_credential)(did, other_credential)
+
+        assert verify.call_count == 2
+
+    def test_failed_verification_is_not_cached(self):
+        verify = AsyncMock(return_value=json.dumps({"errors": ["invalid proof"]}))
+        with patch("registry.utils.didkit.verify_credential", verify):
+            errors = async_to_sync(validate_credential)(did, credential)
+            async_to_sync(validate_credential)(did, credential)
+
+        assert errors == ["Stamp validation failed: ['invalid proof']"]
+        assert verify.call_count == 2
+
+    def test_expired_credential_is_not_cached(self):
+        verify = AsyncMock(return_value=json.dumps({"errors": []}))
+        expired_credential = {**credential, "expirationDate": "2020-01-01T00:00:00Z"}
+        with patch("registry.utils.didkit.verify_credential", verify):
+            async_to_sync(validate_credential)(did, expired_credential)
+            async_to_sync(validate_credential)(did, expired_credential)
+
+        assert verify.call_count == 2
+
+    def test_did_mismatch_is_checked_for_cached_credentials(self):
+        verify = AsyncMock(return_value=json.dumps({"errors": []}))
+        with patch("registry.utils.didkit.verify_credential", verify):
+            async_to_sync(validate_credential)(did, credential)
+            errors = async_to_sync(validate_credential)("did:pkh:other", credential)
+
+        assert errors == ["Did mismatch"]
@@ -1,14 +1,19 @@
 import base64
+import hashlib
 import json
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime, timezone
 from functools import wraps
-from typing import Tuple
+from typing import Any, Optional, Tuple
 from urllib.parse import unquote, urlencode
 
 import api_logging as logging
 import didkit
 from django.conf import settings
-from django.db.models import Q
+from django.core.cache import cache
+from django.db.models import F, Q
 from django.forms.models import model_to_dict
 from django.shortcuts import render
 from django.urls import reverse_lazy
@@ -53,16 +58,122 @@ async def validate_credential(did, credential):
     if did != stamp_did:
         stamp_return_errors.append("Did mismatch")
 
+    verification_errors = await averify_credential(credential)
+
+    if verification_errors:
+        stamp_return_errors.append(f"Stamp validation failed: {verification_errors}")
+
+    return stamp_return_errors
+
+
+class ExpiringLRUCache:
+    """
+    A small, thread safe, in-process LRU cache where every entry expires at its own timestamp.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+
+            value, expires_at = entry
+            if expires_at <= time.time():
+                del self._data[key]
+                return None
+
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any, expires_at: float):
+        if self.maxsize <= 0:
+            return
+
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+# In-process tier of the verified credential cache. The second tier is the django cache (redis)
+verified_credential_cache = ExpiringLRUCache(settings.VERIFIED_CREDENTIAL_CACHE_SIZE)
+
+
+def get_credential_cache_key(credential: dict) -> str:
+    """
+    The key is a digest of the entire credential, which includes the proof.
+    """
+    digest = hashlib.sha256(
+        json.dumps(credential, sort_keys=True, separators=(",", ":")).encode("utf-8")
+    ).hexdigest()
+    return f"verified_credential:{digest}"
+
+
+def get_credential_expiration_timestamp(credential: dict) -> Optional[float]:
+    try:
+        return datetime.fromisoformat(credential["expirationDate"]).timestamp()
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+async def averify_credential(credential: dict) -> list:
+    """
+    Verify the credential with didkit and return the list of verification errors.
+    Successful verifications are cached (in-process and in the django cache) until the
+    credential expires, so that re-submitting unchanged stamps does not re-run didkit.
+    """
+    if not settings.VERIFIED_CREDENTIAL_CACHE_ENABLED:
+        return await adidkit_verify_credential(credential)
+
+    key = get_credential_cache_key(credential)
+
+    if verified_credential_cache.get(key):
+        return []
+
+    expires_at = get_credential_expiration_timestamp(credential)
+
+    try:
+        if await cache.aget(key):
+            if expires_at:
+                verified_credential_cache.set(key, True, expires_at)
+            return []
+    except Exception:
+        log.warning("Failed to read verified credential from cache", exc_info=True)
+
+    verification_errors = await adidkit_verify_credential(credential)
+
+    if not verification_errors and expires_at:
+        ttl = expires_at - time.time()
+        if ttl > 0:
+            verified_credential_cache.set(key, True, expires_at)
+            try:
+                await cache.aset(key, True, int(ttl))
+            except Exception:
+                log.warning(
+                    "Failed to store verified credential in cache", exc_info=True
+                )
+
+    return verification_errors
+
+
+async def adidkit_verify_credential(credential: dict) -> list:
     # pylint: disable=no-member
     verification = await didkit.verify_credential(
         json.dumps(credential), '{"proofPurpose":"assertionMethod"}'
     )
     verification = json.loads(verification)
 
-    if verification["errors"]:
-        stamp_return_errors.append(f"Stamp validation failed: {verification['errors']}")
-
-    return stamp_return_errors
+    return verification["errors"]
 
 
 def get_duplicate_passport(did, stamp_hash):
@@ -155,42 +266,120 @@ def get_utc_time():
     return datetime.now(timezone.utc)
 
 
+def paginate_with_lookahead(query, direction: Optional[str], limit: int):
+    """
+    Return a page of at most `limit` rows of `query`, and whether there are more rows after
+    (has_more) and before (has_prev) the page.
+
+    `query` must be filtered and ordered for the `direction` of the cursor ("next", "prev" or None
+    for the first page), the rows of "prev" pages are read in reverse order and are returned in the
+    order of the pages. One more row than the limit is read to know whether there is another page
+    in the direction of the cursor, in the other direction there is at least the row of the cursor.
+
+    Returns a tuple (page, has_more, has_prev).
+    """
+    return get_lookahead_page(list(query[: limit + 1]), direction, limit)
+
+
+async def apaginate_with_lookahead(query, direction: Optional[str], limit: int):
+    return get_lookahead_page(
+        [row async for row in query[: limit + 1]], direction, limit
+    )
+
+
+def get_lookahead_page(rows: list, direction: Optional[str], limit: int):
+    has_another_page = len(rows) > limit
+    rows = rows[:limit]
+
+    if not rows:
+        return rows, False, False
+
+    if direction == "prev":
+        rows.reverse()
+        return rows, True, has_another_page
+
+    return rows, has_another_page, direction == "next"
+
+
 def get_cursor_tokens_for_results(
     base_query, domain, scores, sort_fields, limit, http_query_args, endpoint
 ):
-    prev_url = None
-    next_url = None
-    has_more_scores = None
-    has_prev_scores = None
+    has_more_scores = has_prev_scores = None
+    next_cursor, prev_cursor = get_page_cursors(scores, sort_fields)
+
+    if scores:
+        next_filter_cond, _ = get_cursor_query_condition(next_cursor, sort_fields)
+        prev_filter_cond, _ = get_cursor_query_condition(prev_cursor, sort_fields)
+
+        has_more_scores = base_query.filter(next_filter_cond).exists()
+        has_prev_scores = base_query.filter(prev_filter_cond).exists()
+
+    return get_page_links(
+        domain,
+        next_cursor if has_more_scores else None,
+        prev_cursor if has_prev_scores else None,
+        limit,
+        http_query_args,
+        endpoint,
+    )
+
+
+async def aget_cursor_tokens_for_results(
+    base_query, domain, scores, sort_fields, limit, http_query_args, endpoint
+):
+    has_more_scores = has_prev_scores = None
+    next_cursor, prev_cursor = get_page_cursors(scores, sort_fields)
+
+    if scores:
+        next_filter_cond, _ = get_cursor_query_condition(next_cursor, sort_fields)
+        prev_filter_cond, _ = get_cursor_query_condition(prev_cursor, sort_fields)
+
+        has_more_scores = await base_query.filter(next_filter_cond).aexists()
+        has_prev_scores = await base_query.filter(prev_filter_cond).aexists()
+
+    return get_page_links(
+        domain,
+        next_cursor if has_more_scores else None,
+        prev_cursor if has_prev_scores else None,
+        limit,
+        http_query_args,
+        endpoint,
+    )
+
+
+def get_page_cursors(scores, sort_fields) -> Tuple[dict, dict]:
+    """
+    Return the cursors of the pages after and before `scores`
+    """
+    next_cursor = dict(d="next")
+    prev_cursor = dict(d="prev")
 
     if scores:
         prev_values = model_to_dict(scores[0])
         next_values = model_to_dict(scores[-1])
 
-        next_cursor = dict(
-            d="next",
-        )
-        prev_cursor = dict(
-            d="prev",
-        )
-
         for field_name in sort_fields:
             next_cursor[field_name] = next_values[field_name]
             prev_cursor[field_name] = prev_values[field_name]
 
-        next_filter_cond, _ = get_cursor_query_condition(next_cursor, sort_fields)
-        prev_filter_cond, _ = get_cursor_query_condition(prev_cursor, sort_fields)
+    return next_cursor, prev_cursor
 
-        has_more_scores = base_query.filter(next_filter_cond).exists()
-        has_prev_scores = base_query.filter(prev_filter_cond).exists()
 
+def get_page_links(
+    domain,
+    next_cursor: Optional[dict],
+    prev_cursor: Optional[dict],
+    limit,
+    http_query_args,
+    endpoint,
+):
     next_url = (
         f"""{domain}{reverse_lazy_with_query(
             f"registry_v2:{endpoint}",
             args=http_query_args,
             query_kwargs={"token": encode_cursor(**next_cursor), "limit": limit},
         )}"""
-        if has_more_scores
+        if next_cursor
         else None
     )
 
@@ -200,7 +389,7 @@ def get_cursor_tokens_for_results(
             args=http_query_args,
             query_kwargs={"token": encode_cursor(**prev_cursor), "limit": limit},
         )}"""
-        if has_prev_scores
+        if prev_cursor
         else None
     )
 
@@ -268,3 +457,48 @@ def get_cursor_query_condition(cursor, sort_fields):
     field_ordering = [f"{'-' if not is_next else ''}{field}" for field in sort_fields]
 
     return (filter_condition, field_ordering)
+
+
+def is_nullable(model, field: str) -> bool:
+    return field != "pk" and model._meta.get_field(field).null
+
+
+def get_keyset_ordering(model, sort_fields) -> list:
+    """
+    Return the ordering matching `get_keyset_condition`: ascending by `sort_fields`, with the NULL
+    values of nullable fields last whatever the default of the database is.
+    """
+    return [
+        F(field).asc(nulls_last=True) if is_nullable(model, field) else field
+        for field in sort_fields
+    ]
+
+
+def get_keyset_condition(model, sort_fields, cursor: dict) -> Q:
+    """
+    Return the condition selecting the rows after `cursor` (the values of the last row of the
+    previous page for each of the `sort_fields`), when the rows are sorted in ascending order by
+    `sort_fields`. The last sort field must be unique.
+
+    Assuming the sort fields are a and b, this is the equivalent of this SQL WHERE clause:
+
+    WHERE (a > cursor_a) OR (a = cursor_a AND b > cursor_b)
+
+    NULL values of nullable fields are sorted last, see `get_keyset_ordering`.
+    """
+    condition = Q()
+    preceding = Q()
+    for field in sort_fields:
+        value = cursor[field]
+        if value is None:
+            # Only NULL values come after NULL, and they are all equal
+            preceding &= Q(**{f"{field}__isnull": True})
+            continue
+
+        after = Q(**{f"{field}__gt": value})
+        if is_nullable(model, field):
+            after |= Q(**{f"{field}__isnull": True})
+        condition |= preceding & after
+        preceding &= Q(**{field: value})
+
+    return condition
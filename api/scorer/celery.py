@@ -19,6 +19,8 @@ app.autodiscover_tasks()
 app.conf.task_routes = {
     "registry.tasks.score_registry_passport": {"queue": "score_registry_passport"},
     "registry.tasks.score_passport_passport": {"queue": "score_passport_passport"},
+    # Run by the workers of the passport scoring queue
+    "ceramic_cache.tasks.rescore_passport": {"queue": "score_passport_passport"},
 }
 
 
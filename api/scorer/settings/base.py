@@ -403,8 +403,34 @@ CERAMIC_CACHE_CONVERT_STAMP_TO_V2_URL = env(
     default="http://localhost:8003/api/v0.0.0/convert",
 )
 
+# When enabled, the stamp write endpoints of the ceramic cache return the score with the PROCESSING status
+# and the address is rescored by a celery task, once no write has been received for
+# CERAMIC_CACHE_RESCORE_DEBOUNCE_SECONDS
+CERAMIC_CACHE_DEFERRED_RESCORING = env.bool(
+    "CERAMIC_CACHE_DEFERRED_RESCORING", default=False
+)
+CERAMIC_CACHE_RESCORE_DEBOUNCE_SECONDS = env.float(
+    "CERAMIC_CACHE_RESCORE_DEBOUNCE_SECONDS", default=3.0
+)
+
+# Max. age in seconds of the current stamps of an address cached in the django cache. The entries are invalidated
+# by the ceramic cache write handlers, so this must be enabled for all the services writing to the ceramic cache.
+# A value of 0 disables the cache
+PASSPORT_CACHE_TTL = env.int("PASSPORT_CACHE_TTL", default=0)
+
 PASSPORT_PUBLIC_URL = env("PASSPORT_PUBLIC_URL", default="http://localhost:80")
 
+# The stamp metadata is refreshed in the background once it is older than this
+STAMP_METADATA_REFRESH_SECONDS = env.int(
+    "STAMP_METADATA_REFRESH_SECONDS", default=60 * 60
+)
+# Stale stamp metadata is served for up to this long if it cannot be refreshed
+STAMP_METADATA_MAX_STALE_SECONDS = env.int(
+    "STAMP_METADATA_MAX_STALE_SECONDS", default=24 * 60 * 60
+)
+# Timeout of the requests fetching the stamp metadata
+STAMP_METADATA_FETCH_TIMEOUT = env.float("STAMP_METADATA_FETCH_TIMEOUT", default=10.0)
+
 # Deprecated in favour of TRUSTED_IAM_ISSUERS which will store a list of trusted issuers
 TRUSTED_IAM_ISSUER = env(
     "TRUSTED_IAM_ISSUER", default="did:key:GlMY_1zkc0i11O-wMBWbSiUfIkZiXzFLlAQ89pdfyBA"
@@ -3,3 +3,9 @@ from .env import env
 
 RATELIMIT_FAIL_OPEN = True
 RATELIMIT_ENABLE = env.bool("RATELIMIT_ENABLE", default=False)
+
+# Each process leases up to RATELIMIT_LEASE_SIZE tokens at a time from the rate limit of an API key in redis,
+# and returns the tokens it has not used within RATELIMIT_LEASE_SECONDS. A lease size of 0 checks the rate
+# limit in redis for every request (fixed window)
+RATELIMIT_LEASE_SIZE = env.int("RATELIMIT_LEASE_SIZE", default=20)
+RATELIMIT_LEASE_SECONDS = env.float("RATELIMIT_LEASE_SECONDS", default=1.0)
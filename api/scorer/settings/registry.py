@@ -1,3 +1,51 @@
 from .env import env
 
 REGISTRY_API_READ_DB = env("REGISTRY_API_READ_DB", default="default")
+
+# Maximum number of stamps verified concurrently when validating a passport.
+# A value of 1 verifies the stamps sequentially.
+CREDENTIAL_VERIFICATION_CONCURRENCY = env.int(
+    "CREDENTIAL_VERIFICATION_CONCURRENCY", default=1
+)
+
+# Successful credential verifications are cached until the credential expires.
+# VERIFIED_CREDENTIAL_CACHE_SIZE is the max. number of entries kept in the in-process tier
+VERIFIED_CREDENTIAL_CACHE_ENABLED = env.bool(
+    "VERIFIED_CREDENTIAL_CACHE_ENABLED", default=True
+)
+VERIFIED_CREDENTIAL_CACHE_SIZE = env.int(
+    "VERIFIED_CREDENTIAL_CACHE_SIZE", default=10000
+)
+
+# Max. age in seconds of the compiled scorers cached in each process (community, scorer and parsed weights).
+# Entries are also invalidated when the community or scorer is saved. A value of 0 disables the cache
+COMPILED_SCORER_CACHE_TTL = env.int("COMPILED_SCORER_CACHE_TTL", default=300)
+
+# Number of seconds verified API keys (with their account and user) are cached, so that the key does
+# not need to be hashed and loaded on every request. Entries are deleted when the API key is saved or
+# deleted. A value of 0 disables the cache
+API_KEY_CACHE_TTL = env.int("API_KEY_CACHE_TTL", default=60)
+
+# Max. number of addresses that can be submitted to the batch submit-passports API,
+# and the number of those addresses that are scored concurrently
+BATCH_SUBMIT_PASSPORT_MAX_ADDRESSES = env.int(
+    "BATCH_SUBMIT_PASSPORT_MAX_ADDRESSES", default=100
+)
+BATCH_SUBMIT_PASSPORT_CONCURRENCY = env.int(
+    "BATCH_SUBMIT_PASSPORT_CONCURRENCY", default=10
+)
+
+# Record the duration and DB queries of each stage of the scoring pipeline. These are logged as
+# structured fields for each passport scored
+SCORING_METRICS_ENABLED = env.bool("SCORING_METRICS_ENABLED", default=False)
+
+# The API key analytics are queued in each process and written in batches of up to API_ANALYTICS_BATCH_SIZE
+# records, at least every API_ANALYTICS_FLUSH_SECONDS. At most API_ANALYTICS_BUFFER_SIZE records are queued,
+# further records are dropped until the queue is written. A buffer size of 0 writes the analytics in the request
+API_ANALYTICS_BUFFER_SIZE = env.int("API_ANALYTICS_BUFFER_SIZE", default=10000)
+API_ANALYTICS_BATCH_SIZE = env.int("API_ANALYTICS_BATCH_SIZE", default=500)
+API_ANALYTICS_FLUSH_SECONDS = env.float("API_ANALYTICS_FLUSH_SECONDS", default=1.0)
+# Max. number of seconds spent writing the queued analytics when the process exits
+API_ANALYTICS_SHUTDOWN_TIMEOUT = env.float(
+    "API_ANALYTICS_SHUTDOWN_TIMEOUT", default=5.0
+)
@@ -6,3 +6,5 @@ from .env import env
 S3_DATA_AWS_SECRET_KEY_ID = env("S3_DATA_AWS_SECRET_KEY_ID", default=None)
 S3_DATA_AWS_SECRET_ACCESS_KEY = env("S3_DATA_AWS_SECRET_ACCESS_KEY", default=None)
 S3_WEEKLY_BACKUP_BUCKET_NAME = env("S3_WEEKLY_BACKUP_BUCKET_NAME", default=None)
+# Endpoint of an S3 compatible service (like minio or localstack) to use instead of AWS S3
+S3_ENDPOINT_URL = env("S3_ENDPOINT_URL", default=None)
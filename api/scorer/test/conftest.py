@@ -19,6 +19,12 @@ pytestmark = pytest.mark.django_db
 my_mnemonic = settings.TEST_MNEMONIC
 
 
+@pytest.fixture(autouse=True)
+def api_analytics_in_request(settings):
+    # The analytics writer thread uses its own DB connection, which cannot see the data of the test
+    settings.API_ANALYTICS_BUFFER_SIZE = 0
+
+
 @pytest.fixture
 def scorer_user():
     user = User.objects.create_user(username="testuser-1", password="12345")
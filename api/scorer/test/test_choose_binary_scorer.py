@@ -144,8 +144,8 @@ def test_get_score_of_000000():
 def _(scorer_community_with_binary_scorer, scorer_api_key):
     """I submit a passport that yields a weighted score less than the threshold."""
     with patch(
-        "scorer_weighted.computation.acalculate_weighted_score",
-        return_value=[{"sum_of_weights": Decimal("70"), "earned_points": {}}],
+        "scorer_weighted.computation.calculate_weighted_score_for_providers",
+        return_value={"sum_of_weights": Decimal("70"), "earned_points": {}},
     ):
         with patch(
             "registry.atasks.aget_passport", return_value=mock_passport
@@ -206,8 +206,8 @@ def _(scorer_community_with_binary_scorer, scorer_api_key):
 
     with patch("registry.atasks.get_utc_time", return_value=mock_utc_timestamp):
         with patch(
-            "scorer_weighted.computation.acalculate_weighted_score",
-            return_value=[{"sum_of_weights": Decimal("90"), "earned_points": {}}],
+            "scorer_weighted.computation.calculate_weighted_score_for_providers",
+            return_value={"sum_of_weights": Decimal("90"), "earned_points": {}},
         ) as calculate_weighted_score:
             with patch("registry.atasks.aget_passport", return_value=mock_passport):
                 with patch("registry.atasks.validate_credential", side_effect=[[], []]):
@@ -1,13 +1,18 @@
+import math
 from datetime import datetime
 from decimal import Decimal
-from typing import Dict, List
+from typing import Dict, List, Optional, Tuple
 
 import api_logging as logging
+import numpy as np
 from registry.models import Stamp
 from scorer_weighted.models import WeightedScorer
 
 log = logging.getLogger(__name__)
 
+# Largest number of decimal places for which the weights are converted to int64 fixed point values
+MAX_FIXED_POINT_SCALE = 18
+
 
 def calculate_weighted_score(
     scorer: WeightedScorer, passport_ids: List[int]
@@ -55,29 +60,173 @@ def calculate_weighted_score(
 
 
 def recalculate_weighted_score(
-    scorer: WeightedScorer, passport_ids: List[int], stamps: Dict[int, List[Stamp]]
+    scorer: WeightedScorer,
+    passport_ids: List[int],
+    stamps: Dict[int, List[Stamp]],
+    threshold: Optional[Decimal] = None,
 ) -> List[dict]:
+    """
+    Calculate the weighted score for a batch of passports, given their stamps that are already loaded.
+
+    This is the vectorized engine used for rescoring: the providers in the batch are mapped to column
+    indexes, and a sparse passport x provider incidence matrix (in coordinate format) is built from the
+    stamps. Duplicate providers within a passport are dropped from the matrix, and the sums of the
+    weights (and the threshold checks) are computed with array operations.
+    The weights are converted to fixed point integers so that the sums are exact. Decimal values are
+    only created for the output, which is the same as `recalculate_weighted_score_decimal` produces.
+
+    Args:
+        scorer (WeightedScorer): The scorer to use for calculating the weighted score.
+        passport_ids (List[int]): A list of passport IDs to calculate the weighted score for.
+        stamps (Dict[int, List[Stamp]]): The stamps of each passport, keyed by passport ID.
+        threshold (Decimal, optional): If set, `passes_threshold` will be included in the results.
+
+    Returns:
+        A list of dicts containing the `sum_of_weights` and the `earned_points` for each passport.
+    """
+    if not passport_ids:
+        return []
+
+    weights = scorer.weights or {}
+
+    # Map the providers to column indexes and collect the coordinates of the non-zero entries
+    provider_columns: Dict[str, int] = {}
+    rows: List[int] = []
+    columns: List[int] = []
+    for row, passport_id in enumerate(passport_ids):
+        for stamp in stamps.get(passport_id, []):
+            rows.append(row)
+            columns.append(
+                provider_columns.setdefault(stamp.provider, len(provider_columns))
+            )
+
+    column_weights = [
+        Decimal(weights.get(provider, 0)) for provider in provider_columns
+    ]
+    fixed_point_weights = to_fixed_point(column_weights)
+    if fixed_point_weights is None:
+        log.debug("Weights of scorer %s cannot be vectorized", scorer)
+        return recalculate_weighted_score_decimal(
+            scorer, passport_ids, stamps, threshold
+        )
+    scaled_weights, scale, weight_exponents = fixed_point_weights
+
+    num_rows = len(passport_ids)
+    num_columns = len(provider_columns)
+    row_index = np.array(rows, dtype=np.int64)
+    column_index = np.array(columns, dtype=np.int64)
+
+    # Only the first stamp for a provider is scored in each passport
+    _, first_index = np.unique(
+        row_index * num_columns + column_index, return_index=True
+    )
+    is_scored = np.zeros(len(rows), dtype=bool)
+    is_scored[first_index] = True
+    scored_rows = row_index[is_scored]
+    scored_columns = column_index[is_scored]
+
+    sums = np.zeros(num_rows, dtype=np.int64)
+    np.add.at(sums, scored_rows, scaled_weights[scored_columns])
+
+    # The exponent of a sum of decimals is the smallest exponent of its terms (the sum starts at 0)
+    exponents = np.zeros(num_rows, dtype=np.int64)
+    np.minimum.at(exponents, scored_rows, weight_exponents[scored_columns])
+    coefficients = sums // np.power(10, scale + exponents, dtype=np.int64)
+
+    if threshold is not None:
+        # The sums are integers, so comparing with the ceiling of the scaled threshold is exact
+        scaled_threshold = math.ceil(Decimal(threshold).scaleb(scale))
+        if scaled_threshold >= 2**63:
+            passes_threshold = np.zeros(num_rows, dtype=bool)
+        else:
+            passes_threshold = sums >= max(scaled_threshold, -(2**63))
+
+    column_points = [str(weight) for weight in column_weights]
+    zero_points = str(Decimal(0))
+    providers = list(provider_columns)
+
+    ret: List[dict] = [
+        {
+            "sum_of_weights": Decimal(int(coefficient)).scaleb(int(exponent)),
+            "earned_points": {},
+        }
+        for coefficient, exponent in zip(coefficients, exponents)
+    ]
+    for row, column, scored in zip(rows, columns, is_scored.tolist()):
+        ret[row]["earned_points"][providers[column]] = (
+            column_points[column] if scored else zero_points
+        )
+    if threshold is not None:
+        for result, passes in zip(ret, passes_threshold.tolist()):
+            result["passes_threshold"] = passes
+
+    return ret
+
+
+def to_fixed_point(
+    values: List[Decimal],
+) -> Optional[Tuple[np.ndarray, int, np.ndarray]]:
+    """
+    Convert the decimals to int64 values, all scaled by 10**scale.
+
+    Returns a tuple of (scaled values, scale, exponents of the values), or None if the values cannot
+    be represented exactly, or if summing all of them could overflow an int64.
+    """
+    exponents = []
+    for value in values:
+        exponent = value.as_tuple().exponent
+        if not isinstance(exponent, int):
+            # NaN or Infinity
+            return None
+        exponents.append(exponent)
+
+    scale = max([0] + [-e for e in exponents])
+    if scale > MAX_FIXED_POINT_SCALE:
+        return None
+
+    scaled = [int(value.scaleb(scale)) for value in values]
+    if sum(abs(v) for v in scaled) >= 2**63:
+        return None
+
+    return (
+        np.array(scaled, dtype=np.int64),
+        scale,
+        np.array(exponents, dtype=np.int64),
+    )
+
+
+def recalculate_weighted_score_decimal(
+    scorer: WeightedScorer,
+    passport_ids: List[int],
+    stamps: Dict[int, List[Stamp]],
+    threshold: Optional[Decimal] = None,
+) -> List[dict]:
+    """
+    Reference implementation of `recalculate_weighted_score`, that computes the scores with Decimal
+    arithmetic. It is used for weights that cannot be converted to fixed point.
+    """
     ret: List[dict] = []
-    weights = scorer.weights
+    weights = scorer.weights or {}
     for passport_id in passport_ids:
         stamp_list = stamps.get(passport_id, [])
         sum_of_weights: Decimal = Decimal(0)
-        scored_providers = []
+        scored_providers = set()
         earned_points = {}
         for stamp in stamp_list:
             if stamp.provider not in scored_providers:
                 weight = Decimal(weights.get(stamp.provider, 0))
                 sum_of_weights += weight
-                scored_providers.append(stamp.provider)
+                scored_providers.add(stamp.provider)
                 earned_points[stamp.provider] = str(weight)
             else:
                 earned_points[stamp.provider] = str(Decimal(0))
-        ret.append(
-            {
-                "sum_of_weights": sum_of_weights,
-                "earned_points": earned_points,
-            }
-        )
+        result = {
+            "sum_of_weights": sum_of_weights,
+            "earned_points": earned_points,
+        }
+        if threshold is not None:
+            result["passes_threshold"] = sum_of_weights >= threshold
+        ret.append(result)
     return ret
 
 
@@ -126,3 +275,45 @@ async def acalculate_weighted_score(
             }
         )
     return ret
+
+
+def calculate_weighted_score_for_providers(
+    scorer: WeightedScorer,
+    providers: List[str],
+    weights: Optional[Dict[str, Decimal]] = None,
+) -> dict:
+    """
+    Calculate the weighted score for a single passport, given the list of providers of its stamps.
+
+    This produces the same result as `acalculate_weighted_score` but works on data that is already
+    in memory (for example the deduplicated passport while it is being scored), so the DB is not queried.
+
+    Args:
+        scorer (WeightedScorer): The scorer to use for calculating the weighted score.
+        providers (List[str]): The providers of all the stamps in the passport.
+        weights (Dict[str, Decimal], optional): Weights already parsed to Decimal. If not set,
+            the weights of the scorer are used.
+
+    Returns:
+        A dict containing the `sum_of_weights` and the `earned_points` for the passport.
+    """
+    sum_of_weights: Decimal = Decimal(0)
+    scored_providers = set()
+    earned_points = {}
+    for provider in providers:
+        if provider not in scored_providers:
+            weight = (
+                weights.get(provider, Decimal(0))
+                if weights is not None
+                else Decimal(scorer.weights.get(provider, 0))
+            )
+            sum_of_weights += weight
+            scored_providers.add(provider)
+            earned_points[provider] = float(weight)
+        else:
+            earned_points[provider] = float(Decimal(0))
+
+    return {
+        "sum_of_weights": sum_of_weights,
+        "earned_points": earned_points,
+    }
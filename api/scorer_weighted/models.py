@@ -2,7 +2,7 @@
 # pylint: disable=import-outside-toplevel
 import json
 from decimal import Decimal
-from typing import List, Optional, Union
+from typing import Dict, List, Optional, Union
 
 import api_logging as logging
 from django.conf import settings
@@ -136,6 +136,21 @@ class WeightedScorer(Scorer):
             for s in scores
         ]
 
+    def compute_score_for_providers(
+        self, providers: List[str], weights: Optional[Dict[str, Decimal]] = None
+    ) -> ScoreData:
+        """
+        Compute the weighted score for a single passport from the providers of its (deduplicated) stamps.
+        Note: this does not read the stamps from the DB, the caller shall pass in the providers of all the
+        stamps that are saved for the passport. `weights` can be used to pass in weights already parsed to Decimal
+        """
+        from .computation import calculate_weighted_score_for_providers
+
+        s = calculate_weighted_score_for_providers(self, providers, weights)
+        return ScoreData(
+            score=s["sum_of_weights"], evidence=None, points=s["earned_points"]
+        )
+
     def __str__(self):
         return f"WeightedScorer #{self.id}"
 
@@ -186,10 +201,11 @@ class BinaryWeightedScorer(Scorer):
         """
         from .computation import recalculate_weighted_score
 
-        rawScores = recalculate_weighted_score(self, passport_ids, stamps)
+        rawScores = recalculate_weighted_score(
+            self, passport_ids, stamps, threshold=self.threshold
+        )
         binaryScores = [
-            Decimal(1) if s["sum_of_weights"] >= self.threshold else Decimal(0)
-            for s in rawScores
+            Decimal(1) if s["passes_threshold"] else Decimal(0) for s in rawScores
         ]
 
         return list(
@@ -241,6 +257,33 @@ class BinaryWeightedScorer(Scorer):
             )
         )
 
+    def compute_score_for_providers(
+        self, providers: List[str], weights: Optional[Dict[str, Decimal]] = None
+    ) -> ScoreData:
+        """
+        Compute the binary score for a single passport from the providers of its (deduplicated) stamps.
+        Note: this does not read the stamps from the DB, the caller shall pass in the providers of all the
+        stamps that are saved for the passport. `weights` can be used to pass in weights already parsed to Decimal
+        """
+        from .computation import calculate_weighted_score_for_providers
+
+        rawScore = calculate_weighted_score_for_providers(self, providers, weights)
+        binaryScore = (
+            Decimal(1) if rawScore["sum_of_weights"] >= self.threshold else Decimal(0)
+        )
+
+        return ScoreData(
+            score=binaryScore,
+            evidence=[
+                ThresholdScoreEvidence(
+                    threshold=Decimal(str(self.threshold)),
+                    rawScore=Decimal(rawScore["sum_of_weights"]),
+                    success=bool(binaryScore),
+                )
+            ],
+            points=rawScore["earned_points"],
+        )
+
     def __str__(self):
         return f"BinaryWeightedScorer #{self.id}, threshold='{self.threshold}'"
 
@@ -1,5 +1,6 @@
 # pylint: disable=unused-import
 from scorer.test.conftest import (
+    api_analytics_in_request,
     passport_holder_addresses,
     scorer_account,
     scorer_community_with_binary_scorer,
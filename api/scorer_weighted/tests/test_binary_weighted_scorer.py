@@ -1,8 +1,9 @@
 from decimal import Decimal
 
 import pytest
+from asgiref.sync import async_to_sync
 from registry.models import Passport, Stamp
-from scorer_weighted.models import BinaryWeightedScorer
+from scorer_weighted.models import BinaryWeightedScorer, WeightedScorer
 
 pytestmark = pytest.mark.django_db
 
@@ -100,3 +101,21 @@ class TestBinaraWeightedScorer:
 
         scores = [s.score for s in scorer.compute_score([weighted_scorer_passports[0]])]
         assert scores == [Decimal(0)]
+
+    @pytest.mark.parametrize("scorer_class", [BinaryWeightedScorer, WeightedScorer])
+    def test_compute_score_for_providers_matches_db_score(
+        self, weighted_scorer_passports, scorer_class
+    ):
+        scorer = scorer_class(weights={"FirstEthTxnProvider": 1, "Google": 1.5})
+        if scorer_class is BinaryWeightedScorer:
+            scorer.threshold = 2
+        scorer.save()
+
+        for passport in weighted_scorer_passports:
+            providers = [s.provider for s in passport.stamps.all()]
+            from_db = async_to_sync(scorer.acompute_score)([passport.id])[0]
+            from_providers = scorer.compute_score_for_providers(providers)
+
+            assert from_providers.score == from_db.score
+            assert from_providers.stamp_scores == from_db.stamp_scores
+            assert repr(from_providers.evidence) == repr(from_db.evidence)
@@ -0,0 +1,77 @@
+import random
+from decimal import Decimal
+
+import pytest
+from registry.models import Stamp
+from scorer_weighted.computation import (
+    recalculate_weighted_score,
+    recalculate_weighted_score_decimal,
+)
+from scorer_weighted.models import WeightedScorer
+
+weights = {
+    "Brightid": "0.709878",
+    "CivicCaptchaPass": "0.510878",
+    "Ens": "2.2",
+    "Google": "1",
+    "Negative": "-0.5",
+    "Zero": "0",
+}
+
+
+def get_random_stamps(num_passports):
+    rng = random.Random(42)
+    providers = list(weights.keys()) + ["NotWeighted"]
+    stamps = {}
+    for passport_id in range(num_passports):
+        # Leave some passports without stamps, and add some duplicate providers
+        stamps[passport_id] = [
+            Stamp(provider=rng.choice(providers)) for _ in range(rng.randint(0, 10))
+        ]
+    return stamps
+
+
+def assert_same_results(actual, expected):
+    assert len(actual) == len(expected)
+    for a, e in zip(actual, expected):
+        assert a["sum_of_weights"] == e["sum_of_weights"]
+        # The same exponent as with Decimal arithmetic, as this ends up in the score evidence
+        assert str(a["sum_of_weights"]) == str(e["sum_of_weights"])
+        assert list(a["earned_points"].items()) == list(e["earned_points"].items())
+        assert a.get("passes_threshold") == e.get("passes_threshold")
+
+
+class TestRecalculateWeightedScore:
+    @pytest.mark.parametrize("threshold", [None, Decimal("1.5"), Decimal("2.20001")])
+    def test_vectorized_score_matches_decimal_score(self, threshold):
+        scorer = WeightedScorer(weights=weights)
+        stamps = get_random_stamps(200)
+        passport_ids = list(stamps.keys()) + [1000]
+
+        assert_same_results(
+            recalculate_weighted_score(scorer, passport_ids, stamps, threshold),
+            recalculate_weighted_score_decimal(scorer, passport_ids, stamps, threshold),
+        )
+
+    def test_duplicate_provider_is_scored_once(self):
+        scorer = WeightedScorer(weights=weights)
+        stamps = {1: [Stamp(provider="Google"), Stamp(provider="Google")]}
+
+        result = recalculate_weighted_score(scorer, [1], stamps)
+
+        assert result == [
+            {"sum_of_weights": Decimal(1), "earned_points": {"Google": "0"}}
+        ]
+
+    def test_weights_that_cannot_be_vectorized_use_decimals(self):
+        scorer = WeightedScorer(weights={"Google": 0.1, "Ens": 1e-30})
+        stamps = {1: [Stamp(provider="Google"), Stamp(provider="Ens")]}
+
+        assert_same_results(
+            recalculate_weighted_score(scorer, [1], stamps, Decimal("0.1")),
+            recalculate_weighted_score_decimal(scorer, [1], stamps, Decimal("0.1")),
+        )
+
+    def test_empty_batch(self):
+        scorer = WeightedScorer(weights=weights)
+        assert recalculate_weighted_score(scorer, [], {}) == []